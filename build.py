@@ -1,17 +1,54 @@
 """
 TODO:
 - インデックスの生成
+
+ビルドの情報は MANIFEST_PATH に保存する。
+
+- files : ファイルごとの (mtime_ns, size, sha256) 。 stat が変わっていなければ
+  ハッシュを計算しなおさない。
+- pages : markdown ごとに、依存ファイルのハッシュと pandoc の引数。
+
+依存ファイルは markdown 、 template.html 、 pandocfilter.lua 、 some.theme と、
+markdown から参照している画像などのローカルファイル。どれかの内容か pandoc の引数が
+変わったページだけを再ビルドする。
+
+変換した HTML は、依存ファイルのハッシュ、 pandoc の引数とバージョン、日付をキーに
+して CACHE_DIR にも保存する。編集を元に戻したときなどはキャッシュをコピーするだけで
+pandoc を呼ばない。 --rebuild と --input ではキャッシュを使わない。
+
+--watch では、ファイルの変更を待って、変更が DEBOUNCE_SECONDS 秒止まったら古いページを
+再ビルドする。 watchdog がインストールされていれば inotify などで監視し、なければ
+POLL_SECONDS 秒ごとに stat で確認する。
 """
 
 import argparse
+import hashlib
+import json
 import os
 import re
+import shutil
 import subprocess
+import threading
 import time
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+MANIFEST_PATH = Path(".build_manifest.json")
+MANIFEST_VERSION = 1
+CACHE_DIR = Path(".build_cache")
+CACHE_SIZE = 512
+DEBOUNCE_SECONDS = 0.2
+POLL_SECONDS = 0.5
+LUA_FILTER_PATH = Path("pandocfilter.lua")
+THEME_PATH = Path("some.theme")
+IGNORED_MARKDOWN = ["readme.md", "scratch.md", "todo.md"]
+
+# ![alt](path "title") と src="path" 。
+LINK_PATTERN = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)>?[^)]*\)")
+SRC_PATTERN = re.compile(r"""\ssrc\s*=\s*["']([^"']+)["']""")
+
 
 def gather_markdown(paths: list[Path]):
     if len(paths) >= 1:
@@ -25,10 +62,8 @@ def gather_markdown(paths: list[Path]):
     return mds
 
 
-def is_source_modified(md, html):
-    if not html.exists():
-        return True
-    return os.path.getmtime(md) > os.path.getmtime(html)
+def is_page(md: Path):
+    return md.suffix == ".md" and md.name.lower() not in IGNORED_MARKDOWN
 
 
 def getMathjaxRelativePath(html: Path, online=False):
@@ -39,51 +74,382 @@ def getMathjaxRelativePath(html: Path, online=False):
     return "=" + "/".join(Path(mathjax_rel_path).parts[1:])
 
 
-def pandoc_md_to_html5(md: Path, template_path: Path, rebuild=False, online=False):
-    if md.suffix != ".md":
-        return
-
-    for ignore in ["readme.md", "scratch.md", "todo.md"]:
-        if str(md.name).lower() == ignore:
-            return
+def pandoc_command(md: Path, template_path: Path, online=False):
+    """
+    日付は pandoc_md_to_html5 で追加する。ここで返す引数はマニフェストに保存して、
+    変わったときに再ビルドする。
+    """
+    html = md.with_suffix(".html")
+    return [
+        "pandoc",
+        "--lua-filter",
+        f"./{LUA_FILTER_PATH}",
+        "--standalone",
+        "--toc",
+        "--toc-depth=6",
+        "--metadata",
+        f"title={md.stem}",
+        "--metadata",
+        "lang=ja",
+        f"--syntax-highlighting={THEME_PATH}",
+        f"--template={str(template_path)}",
+        "--from=markdown",
+        "--to=html5",
+        f"--mathjax{getMathjaxRelativePath(html, online)}",
+        f"--output={html}",
+        str(md),
+    ]
 
-    html = md.parent / Path(md.stem + ".html")
-    if not is_source_modified(md, html) and not rebuild:
-        return
 
+def pandoc_md_to_html5(md: Path, template_path: Path, online=False, date=None):
+    """
+    pandoc の終了コードと標準エラー出力を返す。
+    """
     print("Processing " + str(md))
 
+    if date is None:
+        date = time.strftime("%F")
+    command = pandoc_command(md, template_path, online)
+    command[-1:-1] = ["--metadata", f"date={date}"]
     result = subprocess.run(
-        [
-            "pandoc",
-            "--lua-filter",
-            "./pandocfilter.lua",
-            "--standalone",
-            "--toc",
-            "--toc-depth=6",
-            "--metadata",
-            f"title={md.stem}",
-            "--metadata",
-            f"date={time.strftime('%F')}",
-            "--metadata",
-            "lang=ja",
-            "--syntax-highlighting=some.theme",
-            f"--template={str(template_path)}",
-            "--from=markdown",
-            "--to=html5",
-            f"--mathjax{getMathjaxRelativePath(html, online)}",
-            f"--output={md.with_suffix('.html')}",
-            md,
-        ],
+        command,
         stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
         encoding="utf-8",
     )
+    return result.returncode, result.stderr
+
+
+def pandoc_version():
+    """
+    `pandoc --version` の出力。 pandoc が見つからないときは空の文字列。
+    """
+    try:
+        result = subprocess.run(
+            ["pandoc", "--version"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+        )
+    except OSError:
+        return ""
+    return result.stdout
+
+
+def render_key(command: list[str], deps: dict, date: str, version: str):
+    text = json.dumps([command, deps, date, version], sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def render_page(md: Path, template_path: Path, online: bool, key: str, date: str,
+                use_cache=True):
+    """
+    キャッシュがあればコピーして、なければ pandoc で変換してキャッシュに保存する。
+    use_cache が False のときは必ず pandoc で変換して、キャッシュを上書きする。
+    pandoc_md_to_html5 と同じく (終了コード, 標準エラー出力) を返す。
+    """
+    html = md.with_suffix(".html")
+    cached = CACHE_DIR / f"{key}.html"
+    if use_cache and cached.exists():
+        print("Cached " + str(md))
+        shutil.copyfile(cached, html)
+        os.utime(cached)
+        return 0, ""
+
+    returncode, stderr = pandoc_md_to_html5(md, template_path, online, date)
+    if returncode == 0 and html.exists():
+        CACHE_DIR.mkdir(exist_ok=True)
+        tmp_path = cached.with_name(cached.name + ".tmp")
+        shutil.copyfile(html, tmp_path)
+        os.replace(tmp_path, cached)
+    return returncode, stderr
+
+
+def prune_cache(size: int = CACHE_SIZE):
+    """
+    使われた時刻が新しい size 個を残してキャッシュを消す。
+    """
+    if not CACHE_DIR.exists():
+        return
+    entries = sorted(CACHE_DIR.glob("*.html"), key=lambda path: path.stat().st_mtime)
+    for path in entries[:-size]:
+        path.unlink(missing_ok=True)
+
+
+def find_local_references(md: Path, text: str):
+    """
+    markdown から参照している、存在するローカルファイルのパスを返す。
+    """
+    references = set()
+    for pattern in [LINK_PATTERN, SRC_PATTERN]:
+        for target in pattern.findall(text):
+            if re.match(r"^[a-zA-Z][a-zA-Z0-9+.-]*:|^#|^/", target):
+                continue
+            path = md.parent / target.split("#")[0].split("?")[0]
+            if path.is_file():
+                references.add(path.as_posix())
+    return sorted(references)
+
+
+class FileHasher:
+    def __init__(self, cache: dict):
+        self.old = cache
+        self.cache = {}
+
+    def digest(self, path):
+        """
+        ファイルの sha256 を返す。ファイルがないときは None 。
+        """
+        key = Path(path).as_posix()
+        if key in self.cache:
+            return self.cache[key][2]
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+
+        old = self.old.get(key)
+        if old is not None and old[0] == stat.st_mtime_ns and old[1] == stat.st_size:
+            self.cache[key] = old
+            return old[2]
+
+        with open(key, "rb") as fi:
+            digest = hashlib.sha256(fi.read()).hexdigest()
+        self.cache[key] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+
+def load_manifest(path: Path = MANIFEST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as fi:
+            manifest = json.load(fi)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "files": {}, "pages": {}}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "files": {}, "pages": {}}
+    return manifest
+
+
+def save_manifest(manifest: dict, path: Path = MANIFEST_PATH):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fi:
+        json.dump(manifest, fi, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def shared_dependencies(template_path: Path):
+    return [Path(template_path).as_posix(), LUA_FILTER_PATH.as_posix(),
+            THEME_PATH.as_posix()]
+
+
+def page_dependencies(md: Path, template_path: Path, hasher: FileHasher):
+    with open(md, "r", encoding="utf-8") as fi:
+        text = fi.read()
+    paths = [md.as_posix()] + shared_dependencies(template_path)
+    paths += find_local_references(md, text)
+    return {path: hasher.digest(path) for path in paths}
+
+
+def is_stale(md: Path, page: dict | None, command: list[str], hasher: FileHasher):
+    if page is None or page["command"] != command:
+        return True
+    if not md.with_suffix(".html").exists():
+        return True
+    return any(hasher.digest(path) != digest for path, digest in page["deps"].items())
+
+
+def build(mds: list[Path], template_path: Path, rebuild=False, online=False,
+          jobs=None, executor=None):
+    """
+    古いページだけを変換する。 pandoc は別プロセスなので、スレッドから呼び出して
+    同時に jobs 個まで実行する。 jobs が None のときは CPU の数。 --watch では
+    executor を使いまわす。
+
+    変換したページのリストを返す。
+    """
+    manifest = load_manifest()
+    hasher = FileHasher(manifest["files"])
+    pages = manifest["pages"]
+
+    # 依存ファイルは変換の前に読む。変換中に編集されたときは、次のビルドで古いと
+    # 判定される。
+    stale = []
+    for md in mds:
+        if not is_page(md) or not md.exists():
+            continue
+        command = pandoc_command(md, template_path, online)
+        if rebuild or is_stale(md, pages.get(md.as_posix()), command, hasher):
+            stale.append((md, command, page_dependencies(md, template_path, hasher)))
+
+    date = time.strftime("%F")
+    version = pandoc_version() if len(stale) > 0 else ""
+
+    built = []
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=jobs or os.cpu_count())
+    try:
+        futures = {
+            executor.submit(
+                render_page,
+                md,
+                template_path,
+                online,
+                render_key(command, deps, date, version),
+                date,
+                not rebuild,
+            ): (md, command, deps)
+            for md, command, deps in stale
+        }
+        for future in as_completed(futures):
+            md, command, deps = futures[future]
+            returncode, stderr = future.result()
+            if stderr:
+                print(stderr, end="")
+            if returncode != 0:
+                print(f"Failed {md} (exit code {returncode})")
+                pages.pop(md.as_posix(), None)
+                continue
+            pages[md.as_posix()] = {"command": command, "deps": deps}
+            built.append(md)
+    finally:
+        if own_executor:
+            executor.shutdown()
+        # 中断したときも、変換が終わったページは保存する。何もしなかったときは
+        # 書き込まない。
+        files = {**manifest["files"], **hasher.cache}
+        if len(stale) > 0 or files != manifest["files"]:
+            manifest["files"] = files
+            save_manifest(manifest)
+    if len(built) > 0:
+        prune_cache()
+    return built
+
+
+def is_watched_path(path: str):
+    """
+    ビルドの出力や、ビルドで書き込むファイルの変更は無視する。 .html の削除は
+    再ビルドが必要なので監視する。
+    """
+    parts = Path(os.path.relpath(path)).parts
+    if len(parts) == 0 or any(part.startswith(".") for part in parts):
+        return False
+    return parts[-1] != "_config.yml"
+
+
+def wait_with_watchdog(changed: threading.Event):
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            paths = [event.src_path, getattr(event, "dest_path", "")]
+            for path in paths:
+                if not path or not is_watched_path(path):
+                    continue
+                if path.endswith(".html") and event.event_type != "deleted":
+                    continue
+                changed.set()
+
+    observer = Observer()
+    observer.schedule(Handler(), ".", recursive=True)
+    observer.start()
+    return observer
+
+
+def snapshot_tree():
+    """
+    ポーリング用。 watch するファイルの (パス, mtime_ns, size) の集合を返す。
+    """
+    manifest = load_manifest()
+    paths = set(list_markdown_tree())
+    for page in manifest["pages"].values():
+        paths.update(page["deps"].keys())
+    paths.update(Path(md).with_suffix(".html").as_posix() for md in manifest["pages"])
+
+    snapshot = set()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if not path.endswith(".html"):
+            snapshot.add((path, stat.st_mtime_ns, stat.st_size))
+        else:
+            snapshot.add((path, 0, 0))
+    return snapshot
+
+
+def watch(template_path: Path, online=False, jobs=None):
+    """
+    Ctrl+C で終了する。
+    """
+    changed = threading.Event()
+    try:
+        observer = wait_with_watchdog(changed)
+    except ImportError:
+        observer = None
+        print("watchdog is not installed. Polling for changes.")
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        build(gather_markdown([]), template_path, online=online, executor=executor)
+        print("Watching for changes.")
+        snapshot = snapshot_tree() if observer is None else None
+        try:
+            while True:
+                if observer is None:
+                    time.sleep(POLL_SECONDS)
+                    current = snapshot_tree()
+                    if current == snapshot:
+                        continue
+                else:
+                    changed.wait()
+
+                # 保存が続くあいだは待つ。
+                changed.clear()
+                time.sleep(DEBOUNCE_SECONDS)
+                while changed.is_set():
+                    changed.clear()
+                    time.sleep(DEBOUNCE_SECONDS)
+
+                dump_config_yml()
+                build(gather_markdown([]), template_path, online=online,
+                      executor=executor)
+                if observer is None:
+                    snapshot = snapshot_tree()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+def list_markdown_tree():
+    """
+    ドットで始まるディレクトリを除いて、すべての .md を返す。
+    """
+    md_list = []
+    for root, dirs, files in os.walk("."):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in files:
+            if name.endswith(".md"):
+                md_list.append(Path(root, name).as_posix())
+    return sorted(md_list)
 
 
 def dump_config_yml():
-    md_list = sorted([str(md.as_posix()) for md in Path(".").glob("**/*.md")])
-    with open("_config.yml", "w") as outfile:
-        yaml.dump({"exclude": md_list}, outfile, default_flow_style=False)
+    """
+    内容が変わったときだけ _config.yml を書き込む。
+    """
+    content = yaml.dump({"exclude": list_markdown_tree()}, default_flow_style=False)
+    config_path = Path("_config.yml")
+    if config_path.exists() and config_path.read_text() == content:
+        return
+    with open(config_path, "w") as outfile:
+        outfile.write(content)
 
 
 if __name__ == "__main__":
@@ -104,6 +470,19 @@ if __name__ == "__main__":
         action="store_true",
         help="Change MathJax link to default CDN link provided by pandoc.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of parallel pandoc processes. Default is the number of CPUs.",
+    )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="Rebuild changed pages until interrupted.",
+    )
     args = parser.parse_args()
 
     if len(args.input) >= 1:
@@ -111,6 +490,9 @@ if __name__ == "__main__":
 
     dump_config_yml()
 
+    if args.watch:
+        watch(Path("template.html"), args.online, args.jobs)
+        raise SystemExit()
+
     mds = gather_markdown(args.input)
-    for md in mds:
-        pandoc_md_to_html5(md, "template.html", args.rebuild, args.online)
+    build(mds, Path("template.html"), args.rebuild, args.online, args.jobs)
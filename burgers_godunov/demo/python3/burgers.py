@@ -1,5 +1,14 @@
+import os
+import sys
 import numpy
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../../waveequationimplicit/demo",
+    ))
+from timehistory import TimeHistory
+
 class Burgers1D:
     """
     dx = 1, dt = 1 で固定した inviscid Burgers' equation 。
@@ -7,7 +16,7 @@ class Burgers1D:
 
     def __init__(self, length):
         """length はシミュレーションする波の配列の長さ。"""
-        self.wave = numpy.zeros((2, length))
+        self.wave = TimeHistory(2, length)
         self.reset()
 
     def u_star(self, u, v):
@@ -18,12 +27,14 @@ class Burgers1D:
         )
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
 
         last = self.wave.shape[1] - 1
 
-        wave_l = numpy.roll(self.wave[1], 1)
-        wave_r = numpy.roll(self.wave[1], -1)
+        # Neighbours outside of the field are 0. They only affect both ends, which are
+        # overwritten below.
+        wave_l = self.wave.backward(1)
+        wave_r = self.wave.forward(1)
         u_star_l = self.u_star(self.wave[1], wave_r)
         u_star_r = self.u_star(wave_l, self.wave[1])
         self.wave[0] = self.wave[1] - (u_star_l * u_star_l - u_star_r * u_star_r) / 2
@@ -34,6 +45,18 @@ class Burgers1D:
         if self.pick_y != 0:
             self.wave[0][self.pick_x] = self.pick_y
 
+    def advance(self, n_steps, out=None):
+        """
+        描画せずに n_steps だけ進めて、各ステップの後の波を out に書き込む。
+        out の形は (n_steps, length) 。 numpy.memmap も使える。
+        """
+        if out is None:
+            out = numpy.empty((n_steps, self.wave.shape[1]))
+        for index in range(n_steps):
+            self.step()
+            out[index] = self.wave[0]
+        return out
+
     def reset(self):
         self.wave.fill(0)
 
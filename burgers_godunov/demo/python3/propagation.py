@@ -10,11 +10,20 @@ import argparse
 import functools
 import multiprocessing
 import numpy
+import os
 import scipy.signal
 import soundfile
 import subprocess
+import sys
 from pathlib import Path
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../../waveequationimplicit/demo",
+    ))
+from timehistory import TimeHistory
+
 class Burgers1D:
     """
     dx = 1, dt = 1 で固定した inviscid Burgers' equation 。
@@ -22,14 +31,14 @@ class Burgers1D:
 
     def __init__(self, length):
         """length はシミュレーションする波の配列の長さ。"""
-        self.wave = numpy.zeros((2, length))
+        self.wave = TimeHistory(2, length)
         self.last = self.wave.shape[1] - 1
 
     def step(self, pick_y, read_index):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         wave_m = self.wave[1]
-        wave_l = numpy.roll(wave_m, 1)
-        wave_r = numpy.roll(wave_m, -1)
+        wave_l = self.wave.backward(1)
+        wave_r = self.wave.forward(1)
         u_star_l = numpy.where(
             wave_m >= wave_r,
             numpy.where((wave_m + wave_r) * 0.5 > 0, wave_m, wave_r),
@@ -0,0 +1,278 @@
+"""
+CPU load benchmark of the convolution schemes.
+
+`overlapAddNaive`, `overlapSave` and `minimumCost` in `reducedlatency.py` process a whole
+signal at once. To measure the load per host block, `UniformConvolver` runs the same
+partitioning as a stream:
+
+- `overlapAddNaive`, `overlapSave`: 1 partition of the FIR length. Latency is FIR length.
+- `minimumCost`: 2 partitions of half the FIR length. Latency is half the FIR length.
+
+`PartitionedConvolver` is added with several schedules for comparison. The offline
+functions are also run once to check their output and throughput.
+
+Results are written to `data/cpuload.json`, and the time of each block is written to
+`data/cpuload.npz` with the same `id`. `comparecpuload.py` plots them.
+"""
+
+import argparse
+import gc
+import json
+import numpy as np
+import scipy.signal as signal
+import time
+from pathlib import Path
+
+from partitionedconvolver import PartitionedConvolver
+from reducedlatency import minimumCost, overlapAddNaive, overlapSave
+
+
+class UniformConvolver:
+    def __init__(self, fir, blockSize, nChannel=1, method="save"):
+        """
+        Uniformly partitioned convolution. Output is delayed by `blockSize` samples.
+        `method` is `"save"` for overlap-save, or `"add"` for overlap-add.
+        """
+        if method not in ["save", "add"]:
+            raise ValueError(f"Method must be save or add, not {method}.")
+
+        fir = np.asarray(fir, dtype=np.float64)
+        self.blockSize = blockSize
+        self.nChannel = nChannel
+        self.method = method
+        self.latency = blockSize
+
+        count = -(-len(fir) // blockSize)
+        segment = np.zeros(count * blockSize)
+        segment[:len(fir)] = fir
+        self.spectra = np.fft.rfft(
+            segment.reshape(count, blockSize), 2 * blockSize, axis=-1)
+        self.reset()
+
+    def reset(self):
+        count = len(self.spectra)
+        self.delayLine = np.zeros(
+            (count, self.nChannel, self.blockSize + 1), dtype=complex)
+        self.head = 0
+        self.inputBuffer = np.zeros((self.nChannel, 2 * self.blockSize))
+        self.filled = 0
+        self.overlap = np.zeros((self.nChannel, self.blockSize))
+        self.outputBuffer = np.zeros((self.nChannel, self.blockSize))
+
+    def _processBlock(self):
+        count = len(self.spectra)
+        self.head = (self.head + 1) % count
+        if self.method == "save":
+            buffer = self.inputBuffer
+        else:
+            buffer = np.zeros_like(self.inputBuffer)
+            buffer[:, :self.blockSize] = self.inputBuffer[:, self.blockSize:]
+        self.delayLine[self.head] = np.fft.rfft(buffer, axis=-1)
+
+        order = (self.head - np.arange(count)) % count
+        spectrum = np.einsum("jcf,jf->cf", self.delayLine[order], self.spectra)
+        output = np.fft.irfft(spectrum, axis=-1)
+        if self.method == "save":
+            self.outputBuffer = output[:, self.blockSize:]
+        else:
+            self.outputBuffer = self.overlap + output[:, :self.blockSize]
+            self.overlap = output[:, self.blockSize:]
+
+        self.inputBuffer[:, :self.blockSize] = self.inputBuffer[:, self.blockSize:]
+
+    def process(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        isMono = block.ndim == 1
+        block = np.atleast_2d(block)
+        output = np.empty_like(block)
+
+        position = 0
+        while position < block.shape[1]:
+            step = min(block.shape[1] - position, self.blockSize - self.filled)
+            start = self.blockSize + self.filled
+            self.inputBuffer[:, start:start + step] = block[:, position:position + step]
+            output[:, position:position + step] = self.outputBuffer[
+                :, self.filled:self.filled + step]
+            self.filled += step
+            position += step
+            if self.filled == self.blockSize:
+                self._processBlock()
+                self.filled = 0
+
+        return output[0] if isMono else output
+
+
+# name -> (constructor of streaming convolver, offline function or None).
+schemes = {
+    "overlapAddNaive": (
+        lambda fir, nChannel: UniformConvolver(fir, len(fir), nChannel, "add"),
+        overlapAddNaive,
+    ),
+    "overlapSave": (
+        lambda fir, nChannel: UniformConvolver(fir, len(fir), nChannel, "save"),
+        overlapSave,
+    ),
+    "minimumCost": (
+        lambda fir, nChannel: UniformConvolver(fir, len(fir) // 2, nChannel, "save"),
+        minimumCost,
+    ),
+    "gardner64": (
+        lambda fir, nChannel: PartitionedConvolver(fir, nChannel, 64, nPerSize=2),
+        None,
+    ),
+    "gardner64x4": (
+        lambda fir, nChannel: PartitionedConvolver(fir, nChannel, 64, nPerSize=4),
+        None,
+    ),
+    "gardner256": (
+        lambda fir, nChannel: PartitionedConvolver(fir, nChannel, 256, nPerSize=2),
+        None,
+    ),
+}
+
+
+def checkOffline(function, fir, source, target):
+    """
+    Returns `(maxError, seconds)`. Offline functions pad the signal to a multiple of
+    the FFT size, so `source` should end with enough zeros.
+    """
+    start = time.perf_counter()
+    output = function(source, fir, 48000)
+    elapsed = time.perf_counter() - start
+    length = min(len(output), len(source))
+    return float(np.max(np.abs(output[:length] - target[:length]))), elapsed
+
+
+def runStream(convolver, source, hostBlockSize, nWarmup=4):
+    """
+    Returns `(output, blockTime)`. `blockTime[i]` is the time in seconds to process
+    block `i`. GC is disabled while measuring, because its pause isn't from the
+    convolver.
+    """
+    warmup = np.zeros((source.shape[0], hostBlockSize))
+    for _ in range(nWarmup):
+        convolver.process(warmup)
+    convolver.reset()
+
+    nBlock = source.shape[1] // hostBlockSize
+    output = np.empty((source.shape[0], nBlock * hostBlockSize))
+    blockTime = np.empty(nBlock)
+    gc.disable()
+    try:
+        for index in range(nBlock):
+            block = source[:, index * hostBlockSize:(index + 1) * hostBlockSize]
+            start = time.perf_counter()
+            output[:, index * hostBlockSize:(index + 1) * hostBlockSize] = (
+                convolver.process(block))
+            blockTime[index] = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return output, blockTime
+
+
+def runBenchmark(
+    irLengths=(2**10, 2**13, 2**16),
+    hostBlockSizes=(64, 256, 1024),
+    schemeNames=None,
+    nChannel=8,
+    duration=2.0,
+    sampleRate=48000,
+    outputDir=Path("data"),
+    seed=0,
+):
+    """
+    Runs all combinations of `irLengths`, `hostBlockSizes` and `schemeNames`, and
+    returns list of result dict. Each signal is `duration` seconds, but at least 4
+    times of the IR length, so that the largest partition is processed several times.
+    """
+    if schemeNames is None:
+        schemeNames = list(schemes.keys())
+
+    rng = np.random.default_rng(seed)
+    results = []
+    blockTimes = {}
+    for irLength in irLengths:
+        fir = rng.uniform(-1, 1, irLength) * np.exp(-np.arange(irLength) / irLength)
+        length = max(int(duration * sampleRate), 4 * irLength)
+        source = np.zeros((nChannel, length + 2 * irLength))
+        source[:, :length] = rng.uniform(-1, 1, (nChannel, length))
+        target = signal.fftconvolve(source, fir[np.newaxis, :], axes=-1)
+        scale = np.max(np.abs(target))
+
+        for name in schemeNames:
+            makeConvolver, offline = schemes[name]
+            offlineError, offlineTime = (None, None)
+            if offline is not None:
+                offlineError, offlineTime = checkOffline(
+                    offline, fir, source[0], target[0])
+                offlineError /= scale
+
+            for hostBlockSize in hostBlockSizes:
+                convolver = makeConvolver(fir, nChannel)
+                latency = getattr(convolver, "latency", 0)
+                output, blockTime = runStream(convolver, source, hostBlockSize)
+
+                n = output.shape[1] - latency
+                error = np.max(np.abs(output[:, latency:] - target[:, :n])) / scale
+                budget = hostBlockSize / sampleRate
+                result = {
+                    "id": len(results),
+                    "scheme": name,
+                    "irLength": irLength,
+                    "hostBlockSize": hostBlockSize,
+                    "nChannel": nChannel,
+                    "sampleRate": sampleRate,
+                    "latency": latency,
+                    "maxError": float(error),
+                    "worstBlockTime": float(np.max(blockTime)),
+                    "p99BlockTime": float(np.percentile(blockTime, 99)),
+                    "meanBlockTime": float(np.mean(blockTime)),
+                    "worstLoad": float(np.max(blockTime) / budget),
+                    "meanLoad": float(np.mean(blockTime) / budget),
+                    "throughput": float(output.size / np.sum(blockTime)),
+                    "offlineError": offlineError,
+                    "offlineTime": offlineTime,
+                }
+                results.append(result)
+                blockTimes[str(result["id"])] = blockTime
+                printResult(result)
+
+    outputDir = Path(outputDir)
+    outputDir.mkdir(parents=True, exist_ok=True)
+    with open(outputDir / "cpuload.json", "w", encoding="utf-8") as fi:
+        json.dump(results, fi, indent=2)
+    np.savez(outputDir / "cpuload.npz", **blockTimes)
+    return results
+
+
+def printResult(result):
+    status = "ok" if result["maxError"] < 1e-9 else "MISMATCH"
+    offline = ""
+    if result["offlineError"] is not None:
+        offline = f", offline error {result['offlineError']:.1e}"
+    print(
+        f"{result['scheme']:16} ir {result['irLength']:6} "
+        f"block {result['hostBlockSize']:5}: "
+        f"worst {result['worstLoad']:7.3f}, mean {result['meanLoad']:6.3f} of real time, "
+        f"{result['throughput'] / 1e6:7.2f} Msample/s, latency {result['latency']:6}, "
+        f"{status}{offline}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ir", type=int, nargs="+", default=[2**10, 2**13, 2**16])
+    parser.add_argument("--block", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--scheme", nargs="+", choices=list(schemes.keys()))
+    parser.add_argument("--channel", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--output", type=Path, default=Path("data"))
+    args = parser.parse_args()
+
+    runBenchmark(
+        args.ir,
+        args.block,
+        args.scheme,
+        args.channel,
+        args.duration,
+        outputDir=args.output,
+    )
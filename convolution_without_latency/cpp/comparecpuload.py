@@ -1,28 +1,91 @@
+import argparse
+import json
 import numpy as np
 import matplotlib.pyplot as plt
 import soundfile
+from pathlib import Path
 
-length = 2**15
-timeImmediate, fs = soundfile.read("snd/time_ImmediateConvolver.wav")
-timeSplit, fs = soundfile.read("snd/time_SplitConvolver16_11.wav")
-
-fig, ax = plt.subplots(2, 1)
-ax[0].set_title("Concentrated Load")
-ax[0].plot(timeImmediate[:length], color="black")
-# ax[0].plot(timeImmediate[:length], color="blue", alpha=0.5, lw=1)
-# ax[0].plot(timeSplit[:length], color="red", alpha=0.25, lw=1)
-ax[0].set_ylabel("CPU Time Spent [ms]")
-
-ax[1].set_title("Distributed Load")
-ax[1].plot(timeSplit[:length], color="black")
-ax[1].set_ylabel("CPU Time Spent [ms]")
-ax[1].set_xlabel("Audio Time [sample]")
-# ax[1].set_ylim((-0.002, 0.082))
-
-for axis in ax:
-    axis.set_ylim((-0.02, 1.02))
-    axis.grid(color="#f8f8f8")
-
-fig.set_size_inches((6, 6))
-plt.tight_layout()
-plt.show()
+def plotCppLoad():
+    length = 2**15
+    timeImmediate, fs = soundfile.read("snd/time_ImmediateConvolver.wav")
+    timeSplit, fs = soundfile.read("snd/time_SplitConvolver16_11.wav")
+
+    fig, ax = plt.subplots(2, 1)
+    ax[0].set_title("Concentrated Load")
+    ax[0].plot(timeImmediate[:length], color="black")
+    # ax[0].plot(timeImmediate[:length], color="blue", alpha=0.5, lw=1)
+    # ax[0].plot(timeSplit[:length], color="red", alpha=0.25, lw=1)
+    ax[0].set_ylabel("CPU Time Spent [ms]")
+
+    ax[1].set_title("Distributed Load")
+    ax[1].plot(timeSplit[:length], color="black")
+    ax[1].set_ylabel("CPU Time Spent [ms]")
+    ax[1].set_xlabel("Audio Time [sample]")
+    # ax[1].set_ylim((-0.002, 0.082))
+
+    for axis in ax:
+        axis.set_ylim((-0.02, 1.02))
+        axis.grid(color="#f8f8f8")
+
+    fig.set_size_inches((6, 6))
+    plt.tight_layout()
+    plt.show()
+
+def plotBenchmark(dataDir=Path("data"), irLength=None, hostBlockSize=None):
+    """
+    Plots the output of `benchmark.py`. Top is the load of each block for each scheme,
+    bottom is the worst and mean load. Load 1 is the real time limit.
+    """
+    with open(Path(dataDir) / "cpuload.json", "r", encoding="utf-8") as fi:
+        results = json.load(fi)
+    blockTimes = np.load(Path(dataDir) / "cpuload.npz")
+
+    if irLength is None:
+        irLength = max(result["irLength"] for result in results)
+    if hostBlockSize is None:
+        hostBlockSize = min(result["hostBlockSize"] for result in results)
+    results = [
+        result for result in results
+        if result["irLength"] == irLength and result["hostBlockSize"] == hostBlockSize
+    ]
+
+    fig, ax = plt.subplots(2, 1)
+    ax[0].set_title(f"IR Length {irLength}, Host Block Size {hostBlockSize}")
+    for result in results:
+        budget = result["hostBlockSize"] / result["sampleRate"]
+        load = blockTimes[str(result["id"])] / budget
+        ax[0].plot(load, lw=1, alpha=0.75, label=result["scheme"])
+    ax[0].axhline(1, color="black", ls="--", lw=1)
+    ax[0].set_ylabel("Load")
+    ax[0].set_xlabel("Block")
+    ax[0].set_yscale("log")
+    ax[0].legend()
+
+    x = np.arange(len(results))
+    ax[1].bar(x - 0.2, [r["worstLoad"] for r in results], 0.4, label="worst")
+    ax[1].bar(x + 0.2, [r["meanLoad"] for r in results], 0.4, label="mean")
+    ax[1].axhline(1, color="black", ls="--", lw=1)
+    ax[1].set_xticks(x, [r["scheme"] for r in results], rotation=30)
+    ax[1].set_ylabel("Load")
+    ax[1].set_yscale("log")
+    ax[1].legend()
+
+    for axis in ax:
+        axis.grid(color="#f8f8f8")
+
+    fig.set_size_inches((8, 8))
+    plt.tight_layout()
+    plt.show()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cpp", action="store_true", help="Plot timings from C++.")
+    parser.add_argument("--data", type=Path, default=Path("data"))
+    parser.add_argument("--ir", type=int)
+    parser.add_argument("--block", type=int)
+    args = parser.parse_args()
+
+    if args.cpp:
+        plotCppLoad()
+    else:
+        plotBenchmark(args.data, args.ir, args.block)
@@ -0,0 +1,405 @@
+"""
+Streaming convolver with non-uniform partitions, after Gardner's "Efficient Convolution
+Without Latency".
+
+- First `headLength` samples of FIR are convolved directly in time domain.
+- The rest is split into partitions of `blockSize` starting at `offset`. Each block size
+  has its own frequency-domain delay line (FDL), and uses uniformly partitioned
+  overlap-save with FFT size `2 * blockSize`.
+- A partition of `blockSize` must start at `offset >= blockSize`. Then the output of a
+  block is only needed after the block is complete, and no latency is added.
+- The output of a block is needed `offset - blockSize` samples after the block is
+  complete. Large partitions use this slack: the FFT, the spectral multiply-add and the
+  inverse FFT are split into steps, and the steps are spread over the sub-blocks of
+  `headLength` until the output is needed. Otherwise all sizes would be processed in the
+  same host block at every multiple of the largest block size, and that block would take
+  several times of the mean. The FFTs are split by the four-step algorithm
+  (`fftSplit`).
+
+```python
+convolver = PartitionedConvolver(fir, nChannel=2)
+for block in blocks:  # `block.shape` is (2, anyLength).
+    output = convolver.process(block)
+```
+"""
+
+import numpy as np
+import scipy.signal as signal
+import time
+
+
+def gardnerSchedule(irLength, headLength=64, maxBlockSize=8192, nPerSize=2):
+    """
+    Returns list of `(blockSize, offset, count)`. Block sizes are doubled every
+    `nPerSize` partitions, as `N, N, 2N, 2N, 4N, 4N, ...` in Gardner's paper. The last
+    size is `maxBlockSize` or smaller, and it covers the rest of FIR.
+    """
+    schedule = []
+    size = headLength
+    offset = headLength
+    while offset < irLength:
+        remaining = -(-(irLength - offset) // size)
+        count = remaining if size >= maxBlockSize else min(nPerSize, remaining)
+        schedule.append((size, offset, count))
+        offset += size * count
+        size = min(2 * size, maxBlockSize)
+    return schedule
+
+
+def fftFlops(fftSize):
+    """Rough flop count of a real FFT. Only used to compare the schemes."""
+    return 2.5 * fftSize * np.log2(fftSize)
+
+
+def fftSplit(fftSize):
+    """
+    Returns `(P, L)` of the four-step FFT, where `P * L == fftSize` and `P` is a power
+    of 2 close to `sqrt(fftSize)`. Size `fftSize` FFT is computed as `P` FFTs of size
+    `L`, then `L` FFTs of size `P`.
+    """
+    P = 1
+    while P * P < fftSize and fftSize % (2 * P) == 0:
+        P *= 2
+    return P, fftSize // P
+
+
+class FrequencyDelayLine:
+    def __init__(self, fir, blockSize, offset, count, nChannel, headLength):
+        self.blockSize = blockSize
+        self.offset = offset
+        self.count = count
+
+        segment = np.zeros(count * blockSize)
+        part = fir[offset:offset + count * blockSize]
+        segment[:len(part)] = part
+        self.spectra = np.fft.rfft(
+            segment.reshape(count, blockSize), 2 * blockSize, axis=-1)
+
+        self.delayLine = np.zeros((count, nChannel, blockSize + 1), dtype=complex)
+        self.head = 0
+
+        # A block can be processed at `nSlot` sub-block boundaries of `headLength`,
+        # from the end of the block to `offset - blockSize` samples later. 5 stages
+        # (FFT in 2 stages, multiply-add, inverse FFT in 2 stages) are split into
+        # `nSplit` steps each. `nSplit == 1` processes the block at once.
+        N = 2 * blockSize
+        P, L = fftSplit(N)
+        self.nSlot = (offset - blockSize) // headLength + 1
+        self.nSplit = min(self.nSlot // 5, P // 2 + 1, L // 2 + 1)
+        if P < 2 or self.nSplit < 2:
+            self.nSplit = 1
+            self.nStep = 1
+            return
+        self.nStep = 5 * self.nSplit
+        self.P, self.L = P, L
+
+        r = np.arange(P)[:, np.newaxis]
+        self.forwardTwiddle = np.exp(-2j * np.pi * r * np.arange(L // 2 + 1) / N)
+        self.inverseTwiddle = np.exp(2j * np.pi * r[:P // 2 + 1] * np.arange(L) / N)
+
+        # Bin `k` of the rfft is `X[k % L, k // L]` of the second stage, or its
+        # conjugate at `N - k` when `k % L > L // 2`.
+        k = np.arange(blockSize + 1)
+        self.binConj = k % L > L // 2
+        source = np.where(self.binConj, N - k, k)
+        self.binIndex = (source % L, source // L)
+
+    @property
+    def flopsPerBlock(self):
+        """One forward and one inverse FFT, and `count` complex multiply-adds."""
+        return 2 * fftFlops(2 * self.blockSize) + 8 * self.count * (self.blockSize + 1)
+
+    def process(self, buffer):
+        """
+        `buffer` is the last `2 * blockSize` input samples, shape is
+        `(nChannel, 2 * blockSize)`. Returns `blockSize` output samples to be added
+        from `offset - blockSize` samples after the end of `buffer`.
+        """
+        self.head = (self.head + 1) % self.count
+        self.delayLine[self.head] = np.fft.rfft(buffer, axis=-1)
+        order = (self.head - np.arange(self.count)) % self.count
+        spectrum = np.einsum("jcf,jf->cf", self.delayLine[order], self.spectra)
+        return np.fft.irfft(spectrum, axis=-1)[:, self.blockSize:]
+
+    def steps(self, buffer):
+        """
+        Generator of the `nStep` steps of `process(buffer)`. Each step yields `None`,
+        except the last one yields the output of `process`.
+        """
+        if self.nSplit == 1:
+            yield self.process(buffer)
+            return
+
+        nChannel = buffer.shape[0]
+        B, P, L = self.blockSize, self.P, self.L
+
+        # FFT. `x[r::P]` is `xr[:, r]`.
+        xr = buffer.reshape(nChannel, L, P).transpose(0, 2, 1)
+        Y = np.empty((nChannel, P, L // 2 + 1), dtype=complex)
+        for group in np.array_split(np.arange(P), self.nSplit):
+            Y[:, group] = np.fft.rfft(xr[:, group], axis=-1)
+            yield None
+        X = np.empty((nChannel, L // 2 + 1, P), dtype=complex)
+        for group in np.array_split(np.arange(L // 2 + 1), self.nSplit):
+            Z = Y[:, :, group] * self.forwardTwiddle[:, group]
+            X[:, group] = np.fft.fft(Z, axis=1).transpose(0, 2, 1)
+            yield None
+        spectrum = X[:, self.binIndex[0], self.binIndex[1]]
+        spectrum[:, self.binConj] = np.conj(spectrum[:, self.binConj])
+
+        self.head = (self.head + 1) % self.count
+        self.delayLine[self.head] = spectrum
+        order = (self.head - np.arange(self.count)) % self.count
+        for group in np.array_split(np.arange(B + 1), self.nSplit):
+            start, end = group[0], group[-1] + 1
+            spectrum[:, start:end] = np.einsum(
+                "jcf,jf->cf",
+                self.delayLine[order, :, start:end],
+                self.spectra[:, start:end],
+            )
+            yield None
+
+        # Inverse FFT. Only the second half is needed, that is `n2 >= P // 2` of
+        # `n = n1 + L * n2`.
+        full = np.concatenate((spectrum, np.conj(spectrum[:, B - 1:0:-1])), axis=-1)
+        fr = full.reshape(nChannel, L, P).transpose(0, 2, 1)
+        V = np.empty((nChannel, P // 2 + 1, L), dtype=complex)
+        for group in np.array_split(np.arange(P // 2 + 1), self.nSplit):
+            V[:, group] = np.fft.ifft(fr[:, group], axis=-1)
+            yield None
+        output = np.empty((nChannel, P // 2, L))
+        for index, group in enumerate(np.array_split(np.arange(L), self.nSplit)):
+            Z = V[:, :, group] * self.inverseTwiddle[:, group]
+            output[:, :, group] = np.fft.irfft(Z, P, axis=1)[:, P // 2:]
+            yield output.reshape(nChannel, B) if index == self.nSplit - 1 else None
+
+
+class PartitionedConvolver:
+    def __init__(
+        self,
+        fir,
+        nChannel=1,
+        headLength=64,
+        maxBlockSize=8192,
+        nPerSize=2,
+        schedule=None,
+    ):
+        """
+        `schedule` is list of `(blockSize, offset, count)`. If `None`, it's made by
+        `gardnerSchedule`. Partitions must be contiguous from `headLength`.
+        """
+        fir = np.asarray(fir, dtype=np.float64)
+        if schedule is None:
+            schedule = gardnerSchedule(len(fir), headLength, maxBlockSize, nPerSize)
+
+        end = headLength
+        for blockSize, offset, count in schedule:
+            if offset != end:
+                raise ValueError(f"Partition at {offset} doesn't start at {end}.")
+            if offset < blockSize:
+                raise ValueError(
+                    f"Partition of size {blockSize} at {offset} adds latency.")
+            if blockSize % headLength != 0:
+                raise ValueError(f"{blockSize} isn't a multiple of {headLength}.")
+            end = offset + blockSize * count
+        if end < len(fir):
+            raise ValueError(f"Schedule covers {end} of {len(fir)} samples.")
+
+        self.nChannel = nChannel
+        self.headLength = headLength
+        self.schedule = schedule
+        self.head = np.zeros(headLength)
+        self.head[:min(headLength, len(fir))] = fir[:headLength]
+        self.levels = [
+            FrequencyDelayLine(fir, blockSize, offset, count, nChannel, headLength)
+            for blockSize, offset, count in schedule
+        ]
+
+        maxSize = max([headLength] + [level.blockSize for level in self.levels])
+        # Input is appended to a buffer twice as long as needed, and the last
+        # `2 * maxSize` samples are moved to the front only when it's full.
+        self.inputLength = 2 * maxSize
+        self.outputLength = 1 << int(np.ceil(np.log2(end + maxSize)))
+        self.blockFftFlops = 0.0
+        self.reset()
+
+    def reset(self):
+        self.time = 0
+        self.zi = np.zeros((self.nChannel, self.headLength - 1))
+        self.inputBuffer = np.zeros((self.nChannel, 2 * self.inputLength))
+        self.inputEnd = self.inputLength
+        self.outputBuffer = np.zeros((self.nChannel, self.outputLength))
+        # List of `[level, steps, remaining, outputStart]` of blocks in progress.
+        self.jobs = []
+        for level in self.levels:
+            level.delayLine.fill(0)
+            level.head = 0
+
+    def costReport(self):
+        """
+        Returns `(report, worst)`. `report` is list of dict per partition size, and
+        `flopsPerSample` is the average cost per channel. `worst` is an upper bound of
+        the FFT cost in a sub-block of `headLength` samples, where the steps of all
+        sizes run at once. `nStep` is the number of steps a block of the size is split
+        into.
+        """
+        report = [{
+            "blockSize": 1,
+            "offset": 0,
+            "count": self.headLength,
+            "flopsPerSample": 2.0 * self.headLength,
+            "nStep": 1,
+        }]
+        for level in self.levels:
+            report.append({
+                "blockSize": level.blockSize,
+                "offset": level.offset,
+                "count": level.count,
+                "flopsPerSample": level.flopsPerBlock / level.blockSize,
+                "nStep": level.nStep,
+            })
+        worst = sum(
+            level.flopsPerBlock * -(-level.nStep // level.nSlot) / level.nStep
+            for level in self.levels)
+        return report, worst
+
+    def _writeInput(self, block):
+        n = block.shape[1]
+        if self.inputEnd + n > self.inputBuffer.shape[1]:
+            start = self.inputEnd - self.inputLength
+            self.inputBuffer[:, :self.inputLength] = self.inputBuffer[
+                :, start:self.inputEnd]
+            self.inputEnd = self.inputLength
+        self.inputBuffer[:, self.inputEnd:self.inputEnd + n] = block
+        self.inputEnd += n
+
+    def _addOutput(self, start, data):
+        index = (start + np.arange(data.shape[1])) % self.outputLength
+        self.outputBuffer[:, index] += data
+
+    def _readOutput(self, n):
+        index = (self.time + np.arange(n)) % self.outputLength
+        output = self.outputBuffer[:, index]
+        self.outputBuffer[:, index] = 0
+        return output
+
+    def process(self, block):
+        """
+        `block` is 1D when `nChannel == 1`, otherwise shape is `(nChannel, length)`.
+        Length can be anything. Output has the same shape as `block`, and output sample
+        `i` only depends on input up to sample `i`.
+
+        `self.blockFftFlops` is set to the estimated FFT cost of this call.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        isMono = block.ndim == 1
+        block = np.atleast_2d(block)
+        output = np.empty_like(block)
+
+        self.blockFftFlops = 0.0
+        position = 0
+        while position < block.shape[1]:
+            step = min(
+                block.shape[1] - position,
+                self.headLength - self.time % self.headLength,
+            )
+            segment = block[:, position:position + step]
+            direct, self.zi = signal.lfilter(self.head, 1, segment, zi=self.zi)
+            output[:, position:position + step] = direct + self._readOutput(step)
+            self._writeInput(segment)
+            self.time += step
+            position += step
+
+            if self.time % self.headLength == 0:
+                self._startJobs()
+                self._runJobs()
+
+        return output[0] if isMono else output
+
+    def _startJobs(self):
+        for level in self.levels:
+            if self.time % level.blockSize != 0:
+                continue
+            buffer = self.inputBuffer[
+                :, self.inputEnd - 2 * level.blockSize:self.inputEnd].copy()
+            outputStart = self.time - level.blockSize + level.offset
+            self.jobs.append([level, level.steps(buffer), level.nStep, outputStart])
+
+    def _runJobs(self):
+        """
+        Runs the steps of each block evenly over the sub-blocks left until its output
+        is needed at `outputStart`.
+        """
+        running = []
+        for job in self.jobs:
+            level, steps, remaining, outputStart = job
+            nSlot = (outputStart - self.time) // self.headLength + 1
+            done = -(-remaining // nSlot)
+            for _ in range(done):
+                result = next(steps)
+            self.blockFftFlops += level.flopsPerBlock * done / level.nStep
+            job[2] = remaining - done
+            if job[2] == 0:
+                self._addOutput(outputStart, result)
+            else:
+                running.append(job)
+        self.jobs = running
+
+
+def testPartitionedConvolver(nTest=16, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(nTest):
+        irLength = int(rng.integers(1, 20000))
+        nChannel = int(rng.integers(1, 4))
+        headLength = int(2 ** rng.integers(2, 8))
+        fir = rng.uniform(-1, 1, irLength)
+        source = rng.uniform(-1, 1, (nChannel, 3 * irLength + 1000))
+
+        convolver = PartitionedConvolver(
+            fir, nChannel, headLength, maxBlockSize=int(2 ** rng.integers(8, 13)))
+        output = []
+        position = 0
+        while position < source.shape[1]:
+            length = int(rng.integers(1, 3000))
+            output.append(convolver.process(source[:, position:position + length]))
+            position += length
+        output = np.hstack(output)
+
+        target = signal.fftconvolve(source, fir[np.newaxis, :], axes=-1)
+        target = target[:, :source.shape[1]]
+        error = np.max(np.abs(output - target)) / np.max(np.abs(target))
+        if error > 1e-9:
+            print(f"Test failed: irLength={irLength}, headLength={headLength}, "
+                  f"error={error}")
+
+
+def printCostReport(irLength=48000 * 3, nChannel=128, hostBlockSize=256):
+    fir = np.random.default_rng(0).uniform(-1, 1, irLength)
+    convolver = PartitionedConvolver(fir, nChannel)
+    report, worst = convolver.costReport()
+
+    print(f"IR length {irLength}, {nChannel} channels")
+    print(f"{'block size':>10} | {'offset':>8} | {'count':>5} | {'flops/sample':>12} | "
+          f"{'steps':>5}")
+    for row in report:
+        print(f"{row['blockSize']:10} | {row['offset']:8} | {row['count']:5} | "
+              f"{row['flopsPerSample']:12.1f} | {row['nStep']:5}")
+    total = sum(row["flopsPerSample"] for row in report)
+    print(f"Average: {total:.1f} flops/sample/channel. "
+          f"Worst sub-block: {worst:.3e} flops/channel.")
+
+    source = np.zeros((nChannel, hostBlockSize))
+    nBlock = 2 * convolver.outputLength // hostBlockSize
+    elapsed = np.empty(nBlock)
+    for index in range(nBlock):
+        start = time.perf_counter()
+        convolver.process(source)
+        elapsed[index] = time.perf_counter() - start
+    realtime = hostBlockSize / 48000
+    print(f"Host block {hostBlockSize}: mean {np.mean(elapsed) / realtime:.2f}, "
+          f"max {np.max(elapsed) / realtime:.2f} of real time at 48 kHz.")
+
+
+if __name__ == "__main__":
+    testPartitionedConvolver()
+    printCostReport()
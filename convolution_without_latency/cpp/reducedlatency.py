@@ -127,28 +127,29 @@ def minimumCost(sig, coefficient, fs):
 
     return output
 
-coefficient = signal.firwin(2047, 1000, window="nuttall", fs=48000)
-coefficient = np.hstack([firlp2hp(coefficient), [0]])
-
-sigA, fs = generateSin(1000, 0.1)
-sigB, fs = generateSin(100, 0.1)
-sig = sigA + sigB
-
-# fs = 48000
-# sig = np.hstack([np.zeros(len(coefficient) - 1), np.ones(int(1.0 * fs))])
-
-add = overlapAddNaive(sig, coefficient, fs)
-# save = overlapSave(sig, coefficient, fs)
-minCost = minimumCost(sig, coefficient, fs)
-scipy_convolve = signal.convolve(sig, coefficient)
-# naive = naiveConvolve(sig, coefficient)
-
-# plt.plot(sig, alpha=0.5, label="input")
-# plt.plot(add, alpha=0.5, label="add")
-# plt.plot(save, alpha=0.5, label="save")
-plt.plot(minCost, alpha=0.5, label="minCost")
-plt.plot(scipy_convolve, alpha=0.5, label="SciPy")
-# plt.plot(naive, alpha=0.5, label="naive")
-plt.grid()
-plt.legend()
-plt.show()
+if __name__ == "__main__":
+    coefficient = signal.firwin(2047, 1000, window="nuttall", fs=48000)
+    coefficient = np.hstack([firlp2hp(coefficient), [0]])
+
+    sigA, fs = generateSin(1000, 0.1)
+    sigB, fs = generateSin(100, 0.1)
+    sig = sigA + sigB
+
+    # fs = 48000
+    # sig = np.hstack([np.zeros(len(coefficient) - 1), np.ones(int(1.0 * fs))])
+
+    add = overlapAddNaive(sig, coefficient, fs)
+    # save = overlapSave(sig, coefficient, fs)
+    minCost = minimumCost(sig, coefficient, fs)
+    scipy_convolve = signal.convolve(sig, coefficient)
+    # naive = naiveConvolve(sig, coefficient)
+
+    # plt.plot(sig, alpha=0.5, label="input")
+    # plt.plot(add, alpha=0.5, label="add")
+    # plt.plot(save, alpha=0.5, label="save")
+    plt.plot(minCost, alpha=0.5, label="minCost")
+    plt.plot(scipy_convolve, alpha=0.5, label="SciPy")
+    # plt.plot(naive, alpha=0.5, label="naive")
+    plt.grid()
+    plt.legend()
+    plt.show()
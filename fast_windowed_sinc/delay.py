@@ -4,7 +4,9 @@ import matplotlib.pyplot as plt
 import soundfile
 import math
 import json
+import time
 import tqdm
+from functools import lru_cache
 from pathlib import Path
 from collections import deque
 
@@ -42,11 +44,71 @@ class SosFilter:
             x0 = y0
         return x0
 
+    def processBlock(self, x: np.ndarray, sos) -> np.ndarray:
+        """
+        Same as calling `process()` for each sample of `x` with the same `sos`, up to
+        rounding. Each section runs `signal.lfilter`, of which the initial state is
+        converted from the direct form I state of this filter.
+        """
+        for i, co in enumerate(sos):
+            b = co[:3]
+            a = co[3:]
+            zi = [
+                b[1] * self.x1[i]
+                + b[2] * self.x2[i]
+                - a[1] * self.y1[i]
+                - a[2] * self.y2[i],
+                b[2] * self.x1[i] - a[2] * self.y1[i],
+            ]
+            y, _ = signal.lfilter(b, a, x, zi=zi)
+
+            if len(x) >= 2:
+                self.x2[i] = x[-2]
+                self.y2[i] = y[-2]
+            else:
+                self.x2[i] = self.x1[i]
+                self.y2[i] = self.y1[i]
+            self.x1[i] = x[-1]
+            self.y1[i] = y[-1]
+
+            x = y
+        return x
+
+
+def writeRingBlock(buf: np.ndarray, wptr: int, block: np.ndarray):
+    """
+    Writes `block` to the ring buffer `buf` after `wptr`. Returns `(extended, wptr)`.
+
+    `extended` is the unrolled buffer before the write followed by `block`. The sample
+    written `lag` samples before `block[i]` is `extended[len(buf) + i - lag]`, for `lag`
+    in `[0, len(buf))`.
+    """
+    size: int = len(buf)
+    extended = np.hstack([np.roll(buf, -(wptr + 1)), block])
+
+    nWrite = min(len(block), size)
+    index = wptr + 1 + np.arange(len(block) - nWrite, len(block))
+    buf[index % size] = block[len(block) - nWrite :]
+    return (extended, (wptr + len(block)) % size)
+
+
+@lru_cache(maxsize=4096)
+def butterSos(order: int, cutoff: float):
+    """Memoized `signal.butter`. `cutoff` is normalized frequency in [0, 0.5)."""
+    return signal.butter(order, cutoff, output="sos", fs=1)
+
 
 class DelayAaIir:
     iirOrder = 16
 
-    def __init__(self, maxTimeSample: int):
+    def __init__(self, maxTimeSample: int, cutoffStepsPerOctave: int | None = 64):
+        """
+        `cutoffStepsPerOctave` quantizes the cutoff of anti-aliasing lowpass on the
+        logarithmic scale, so that the SOS coefficients can be reused from the cache of
+        `butterSos()`. 64 steps per octave is about 1% of error in cutoff. Set `None` to
+        design the filter at the exact cutoff.
+        """
+        self.cutoffStepsPerOctave = cutoffStepsPerOctave
         self.prevTime: float = 0
         self.holdingPitch: float = 1
         self.lowpass = SosFilter(self.iirOrder // 2)
@@ -58,11 +120,8 @@ class DelayAaIir:
         self.minTimeSample: int = 1
         self.maxTimeSample: int = maxTimeSample
 
-    def process(self, input: float, timeInSample: float):
-        size: int = len(self.buf)
-
-        clamped: float = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
-
+    def updatePitch(self, clamped: float):
+        """Returns input pitch. `self.holdingPitch` is updated."""
         inputPitch = self.prevTime - clamped + 1
         self.pitch.append(inputPitch)
         self.prevTime = clamped
@@ -82,10 +141,26 @@ class DelayAaIir:
             else:
                 self.holdingPitch = 1
                 break
+        return inputPitch
 
-        cutoff: float = 0.5 if self.holdingPitch <= 1 else 2.0 ** (-self.holdingPitch)
-        cutoff = min(cutoff, 0.45)
-        sos = signal.butter(self.iirOrder, cutoff, output="sos", fs=1)
+    def quantizeCutoff(self, cutoff):
+        if self.cutoffStepsPerOctave is None:
+            return cutoff
+        step = self.cutoffStepsPerOctave
+        return 2.0 ** (np.round(np.log2(cutoff) * step) / step)
+
+    def lowpassCutoff(self, holdingPitch):
+        cutoff = np.where(holdingPitch <= 1, 0.5, 2.0 ** (-np.maximum(holdingPitch, 1)))
+        return self.quantizeCutoff(np.minimum(cutoff, 0.45))
+
+    def process(self, input: float, timeInSample: float):
+        size: int = len(self.buf)
+
+        clamped: float = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
+
+        self.updatePitch(clamped)
+        cutoff = float(self.lowpassCutoff(self.holdingPitch))
+        sos = butterSos(self.iirOrder, cutoff)
         lp = self.lowpass.process(input, sos)
 
         # Write to buffer.
@@ -107,32 +182,50 @@ class DelayAaIir:
 
         return self.buf[rptr0] + fraction * (self.buf[rptr1] - self.buf[rptr0])
 
-    def debug(self, input: float, timeInSample: float):
-        clamped: float = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
+    def processBlock(self, input: np.ndarray, timeInSample: np.ndarray | float):
+        """
+        Block version of `process()`. `timeInSample` is an array of the same length as
+        `input`, or a scalar. Output is the same as calling `process()` for each sample
+        up to rounding.
 
-        inputPitch = self.prevTime - clamped + 1
-        self.pitch.append(inputPitch)
-        self.prevTime = clamped
-        carry = 1
-        while True:
-            self.pitch[0] -= carry
+        Only the update of holding pitch runs per sample. Lowpass is applied by
+        `SosFilter.processBlock()` for each run of the same cutoff.
+        """
+        input = np.asarray(input, dtype=np.float64)
+        clamped = np.clip(
+            np.broadcast_to(timeInSample, input.shape),
+            self.minTimeSample,
+            self.maxTimeSample,
+        )
+        if len(input) == 0:
+            return np.empty(0)
 
-            carry = -self.pitch[0]
-            if carry <= 0:
-                if len(self.pitch) == 1:
-                    self.holdingPitch = inputPitch
-                break
+        holdingPitch = np.empty(len(input))
+        for i, clampedTime in enumerate(clamped):
+            self.updatePitch(clampedTime)
+            holdingPitch[i] = self.holdingPitch
+        cutoff = self.lowpassCutoff(holdingPitch)
 
-            self.pitch.popleft()
-            if len(self.pitch) > 0:
-                self.holdingPitch = self.pitch[0]
-            else:
-                self.holdingPitch = 1
-                break
+        lp = np.empty(len(input))
+        edges = np.flatnonzero(np.diff(cutoff)) + 1
+        for start, end in zip(np.hstack([0, edges]), np.hstack([edges, len(input)])):
+            sos = butterSos(self.iirOrder, float(cutoff[start]))
+            lp[start:end] = self.lowpass.processBlock(input[start:end], sos)
+
+        size: int = len(self.buf)
+        extended, self.wptr = writeRingBlock(self.buf, self.wptr, lp)
 
-        cutoff: float = 0.5 if self.holdingPitch <= 1 else 2.0 ** (-self.holdingPitch)
-        cutoff = min(cutoff, 0.45)
-        sos = signal.butter(self.iirOrder, cutoff, output="sos", fs=1)
+        timeInt = clamped.astype(np.int64)
+        fraction = clamped - timeInt
+        rptr0 = size + np.arange(len(lp)) - timeInt
+        return extended[rptr0] + fraction * (extended[rptr0 - 1] - extended[rptr0])
+
+    def debug(self, input: float, timeInSample: float):
+        clamped: float = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
+
+        inputPitch = self.updatePitch(clamped)
+        cutoff = float(self.lowpassCutoff(self.holdingPitch))
+        sos = butterSos(self.iirOrder, cutoff)
         input = self.lowpass.process(input, sos)
 
         return [inputPitch, self.holdingPitch, cutoff, input]
@@ -140,6 +233,7 @@ class DelayAaIir:
 
 class Delay:
     maxTap = 256
+    blockSize = 4096
     maxCutoffOctave: int = int(np.round(np.log2(maxTap)))
     recursiveOscFractionMrgin = 1024 * np.finfo(np.float64).eps
 
@@ -693,6 +787,253 @@ class Delay:
                 rptr = 0
         return sig
 
+    def processBlock(
+        self,
+        input: np.ndarray,
+        timeInSample: np.ndarray | float,
+        method: str = "processSincRectFullEven",
+        **kwargs,
+    ):
+        """
+        Block version of the `process*` methods. `method` is the name of the per-sample
+        method, and `kwargs` are passed to it. `timeInSample` is an array of the same
+        length as `input`, or a scalar. Output is the same as calling `method` for each
+        sample up to rounding.
+
+        The FIR filters of `self.blockSize` samples are computed at once by the
+        `kernel*` method of the same suffix, as an array of shape `(block, taps)`. Then
+        the taps are gathered from the unrolled buffer and reduced by one `np.einsum`.
+
+        `processSincRectFullOdd` doesn't have block version, because it writes the input
+        twice when `timeInSample < 1`.
+        """
+        kernel = getattr(self, method.replace("process", "kernel", 1), None)
+        if not method.startswith("process") or kernel is None:
+            raise ValueError(f"{method} doesn't have block version.")
+
+        input = np.asarray(input, dtype=np.float64)
+        timeInSample = np.broadcast_to(
+            np.asarray(timeInSample, dtype=np.float64), input.shape
+        )
+
+        size: int = len(self.buf)
+        output = np.empty(len(input))
+        for start in range(0, len(input), self.blockSize):
+            end = start + self.blockSize
+            block = input[start:end]
+            extended, self.wptr = writeRingBlock(self.buf, self.wptr, block)
+
+            # `offset` is the lag of the first tap, same as `rptr = self.wptr - offset`
+            # in the per-sample methods.
+            offset, fir = kernel(timeInSample[start:end], **kwargs)
+            first = size + np.arange(len(block)) - offset
+            index = first[:, np.newaxis] + np.arange(fir.shape[1])
+            taps = extended[np.minimum(index, len(extended) - 1)]
+            output[start:end] = np.einsum("ij,ij->i", fir, taps)
+        return output
+
+    def blockCutoff(self, clamped: np.ndarray):
+        """Cutoff of anti-aliasing for each sample. `self.prevTime` is updated."""
+        prevTime = np.hstack([self.prevTime, clamped[:-1]])
+        self.prevTime = clamped[-1]
+        timeDiff = np.abs(prevTime - clamped + 1)
+        return np.where(timeDiff <= 1, 0.5, 2.0 ** (-timeDiff))
+
+    def blockEven(self, timeInSample: np.ndarray):
+        """
+        Parameters of even length FIR. Returns
+        `(localTap, halfTap, timeInt, fraction, cutoff)`.
+        """
+        localTap = np.clip(2 * timeInSample.astype(np.int64), 2, self.maxTap)
+        halfTap = localTap // 2
+        clamped = np.clip(timeInSample, halfTap - 1, self.maxTimeSample)
+        timeInt = clamped.astype(np.int64)
+        cutoff = self.blockCutoff(clamped)
+        return (localTap, halfTap, timeInt, clamped - timeInt, cutoff)
+
+    def blockBypass(self, timeInSample, offset, fir, cutoff):
+        """Rows of `timeInSample <= 0` output `input * modifiedSinc(0, cutoff)`."""
+        bypass = timeInSample <= 0
+        offset[bypass] = 0
+        fir[bypass] = 0
+        fir[bypass, 0] = modifiedSinc(0, cutoff[bypass])
+        return (offset, fir)
+
+    def blockMargin(self, fraction: np.ndarray):
+        margin = self.recursiveOscFractionMrgin
+        fraction = np.where(fraction >= 1 - margin, 1, fraction)
+        return np.where(fraction <= margin, 0, fraction)
+
+    def kernelLinear(self, timeInSample: np.ndarray):
+        clamped = np.clip(timeInSample, 0, len(self.buf) - 2)
+        timeInt = clamped.astype(np.int64)
+        rFraction = clamped - timeInt
+        return (timeInt + 1, np.stack([rFraction, 1 - rFraction], axis=1))
+
+    def kernelCubic(self, timeInSample: np.ndarray):
+        clamped = np.clip(timeInSample - 1, 1, len(self.buf) - 4)
+        timeInt = clamped.astype(np.int64)
+
+        # Lagrange basis of `lagrange3Interp`, in the reversed order of `y0, ..., y3`.
+        u = 1 + (clamped - timeInt)
+        fir = np.stack(
+            [
+                u * (u - 1) * (u - 2) / 6,
+                -u * (u - 1) * (u - 3) / 2,
+                u * (u - 2) * (u - 3) / 2,
+                -(u - 1) * (u - 2) * (u - 3) / 6,
+            ],
+            axis=1,
+        )
+        return (timeInt + 3, fir)
+
+    def kernelSincRectNaive(self, timeInSample: np.ndarray):
+        clamped = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
+        timeInt = clamped.astype(np.int64)
+        localTap = np.full(len(clamped), self.maxTap)
+        cutoff = np.full(len(clamped), 0.5)
+        fir = lowpassFirReversedBlock(localTap, cutoff, clamped - timeInt, self.maxTap)
+        return (timeInt + self.minTimeSample + 1, fir)
+
+    def kernelSincRectFixedTap(self, timeInSample: np.ndarray):
+        clamped = np.clip(timeInSample, self.minTimeSample, self.maxTimeSample)
+        timeInt = clamped.astype(np.int64)
+        localTap = np.full(len(clamped), self.maxTap)
+        cutoff = self.blockCutoff(clamped)
+        fir = lowpassFirReversedBlock(localTap, cutoff, clamped - timeInt, self.maxTap)
+        return (timeInt + self.minTimeSample + 1, fir)
+
+    def kernelSincRectFullExp2(self, timeInSample: np.ndarray):
+        exponent = np.clip(np.frexp(timeInSample)[1], 0, 62)
+        localTap = np.clip(np.left_shift(1, exponent), 2, self.maxTap)
+        halfTap = localTap // 2
+        clamped = np.clip(timeInSample, halfTap - 1, self.maxTimeSample)
+        timeInt = clamped.astype(np.int64)
+        cutoff = self.blockCutoff(clamped)
+        fir = lowpassFirReversedBlock(localTap, cutoff, clamped - timeInt, self.maxTap)
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelSincRectFullEven(self, timeInSample: np.ndarray):
+        localTap, halfTap, timeInt, fraction, cutoff = self.blockEven(timeInSample)
+        fir = lowpassFirReversedBlock(localTap, cutoff, fraction, self.maxTap)
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelSincRectFullEven2(self, timeInSample: np.ndarray, slewRate: float = 8):
+        # Slew rate limiting depends on the previous time, so it runs per sample.
+        limited = np.empty(len(timeInSample))
+        prevTime = self.prevTime
+        for i, limitedTime in enumerate(timeInSample):
+            td = limitedTime - prevTime
+            if td > slewRate:
+                limitedTime = prevTime + slewRate
+            elif td < -slewRate:
+                limitedTime = prevTime - slewRate
+            limited[i] = limitedTime
+
+            localTap = min(max(2 * int(limitedTime), 2), self.maxTap)
+            prevTime = min(max(limitedTime, localTap // 2 - 1), self.maxTimeSample)
+        return self.kernelSincRectFullEven(limited)
+
+    def kernelSincRectFullEvenNormalized(self, timeInSample: np.ndarray):
+        localTap, halfTap, timeInt, fraction, cutoff = self.blockEven(timeInSample)
+        fir = lowpassFirReversedBlock(localTap, cutoff, fraction, self.maxTap)
+        gain = np.sum(fir, axis=1)
+        fir /= np.where(cutoff != 0, gain, 1)[:, np.newaxis]
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelSincRectFullEvenBiquadSine(self, timeInSample: np.ndarray):
+        localTap, halfTap, timeInt, fraction, cutoff = self.blockEven(timeInSample)
+
+        # Same recursion as the per-sample method, vectorized over samples.
+        mid = self.blockMargin(fraction) - halfTap
+        omega = 2 * np.pi * cutoff
+        phi = mid * omega
+        k = 2 * np.cos(omega)
+        u1 = np.sin(phi - omega)
+        u2 = np.sin(phi - 2 * omega)
+
+        fir = np.zeros((len(timeInSample), self.maxTap))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for idx in range(self.maxTap):
+                u0 = k * u1 - u2
+                u2 = u1
+                u1 = u0
+
+                x = idx + mid
+                fir[:, idx] = np.where(x == 0, 2 * cutoff, u0 / (np.pi * x))
+        fir[np.arange(self.maxTap) >= localTap[:, np.newaxis]] = 0
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelLanczosBiquadSine(self, timeInSample: np.ndarray):
+        localTap, halfTap, timeInt, fraction, cutoff = self.blockEven(timeInSample)
+
+        # Same recursion as the per-sample method, vectorized over samples.
+        mid = self.blockMargin(fraction) - halfTap
+
+        o1_omega = 2 * np.pi * cutoff
+        o1_phi = mid * o1_omega
+        o1_u1 = np.sin(o1_phi - o1_omega)
+        o1_u2 = np.sin(o1_phi - 2 * o1_omega)
+        o1_k = 2 * np.cos(o1_omega)
+
+        a = np.maximum(1, np.sqrt(halfTap))
+        o2_omega = 2 * np.pi * cutoff / a
+        o2_phi = mid * o2_omega
+        o2_u1 = np.sin(o2_phi - o2_omega)
+        o2_u2 = np.sin(o2_phi - 2 * o2_omega)
+        o2_k = 2 * np.cos(o2_omega)
+
+        fir = np.zeros((len(timeInSample), self.maxTap))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            A = np.where(cutoff == 0, 1, a / (2 * cutoff * np.pi * np.pi))
+            for idx in range(self.maxTap):
+                o1_u0 = o1_k * o1_u1 - o1_u2
+                o1_u2 = o1_u1
+                o1_u1 = o1_u0
+
+                o2_u0 = o2_k * o2_u1 - o2_u2
+                o2_u2 = o2_u1
+                o2_u1 = o2_u0
+
+                x = idx + mid
+                fir[:, idx] = np.where(x == 0, 2 * cutoff, A * o1_u0 * o2_u0 / (x * x))
+        fir[np.arange(self.maxTap) >= localTap[:, np.newaxis]] = 0
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelSincRectFullEvenStableQuadSine(self, timeInSample: np.ndarray):
+        localTap, halfTap, timeInt, fraction, cutoff = self.blockEven(timeInSample)
+
+        # Same recursion as the per-sample method, vectorized over samples.
+        mid = self.blockMargin(fraction) - halfTap
+        omega = 2 * np.pi * cutoff
+        phi = mid * omega
+        k1 = np.tan(omega / 2)
+        k2 = np.sin(omega)
+        u = np.cos(phi - omega)
+        v = np.sin(phi - omega)
+
+        fir = np.zeros((len(timeInSample), self.maxTap))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for idx in range(self.maxTap):
+                w = u - k1 * v
+                v = v + k2 * w
+                u = w - k1 * v
+
+                x = idx + mid
+                fir[:, idx] = np.where(x == 0, 2 * cutoff, v / (np.pi * x))
+        fir[np.arange(self.maxTap) >= localTap[:, np.newaxis]] = 0
+        return self.blockBypass(timeInSample, timeInt + halfTap, fir, cutoff)
+
+    def kernelSincRectFull(self, timeInSample: np.ndarray):
+        localTap = np.clip((2 * timeInSample).astype(np.int64), 2, self.maxTap)
+        isEven = (localTap + 1) & 1
+        halfTap = localTap // 2
+        clamped = np.clip(timeInSample, halfTap - isEven, self.maxTimeSample)
+        timeInt = clamped.astype(np.int64)
+        cutoff = self.blockCutoff(clamped)
+        fir = lowpassFirReversedBlock(localTap, cutoff, clamped - timeInt, self.maxTap)
+        return (timeInt + halfTap + (isEven ^ 1), fir)
+
     def debugCutoff(self, timeInSample: float):
         localTap = np.clip(2 * int(timeInSample), 2, self.maxTap)
         halfTap: int = localTap // 2
@@ -807,7 +1148,10 @@ def modifiedSincSimple(x, cutoff):
 
 
 def modifiedSinc(x, fc):
-    x = np.asarray(x, dtype=np.float64)
+    """`x` and `fc` are broadcasted."""
+    x, fc = np.broadcast_arrays(
+        np.asarray(x, dtype=np.float64), np.asarray(fc, dtype=np.float64)
+    )
     u = 2 * fc * x
     theta = np.pi * u
     out = np.zeros_like(x)
@@ -821,7 +1165,7 @@ def modifiedSinc(x, fc):
         y = y * t2 - (1.0 / 6.0)
         y = y * t2 + 1.0
 
-        out[mask] = 2 * fc * y
+        out[mask] = 2 * fc[mask] * y
 
     if np.any(~mask):
         u_large = u[~mask]
@@ -855,6 +1199,23 @@ def lowpassFirReversed(length: int, cutoff: float, fractionSample: float):
     return fir
 
 
+def lowpassFirReversedBlock(
+    length: np.ndarray, cutoff: np.ndarray, fractionSample: np.ndarray, width: int
+):
+    """
+    `lowpassFirReversed()` for each element of `length`, `cutoff` and `fractionSample`.
+    Returns an array of shape `(len(length), width)`. Taps at and after `length[i]` are
+    filled with 0.
+    """
+    mid = length // 2 + length % 2
+    mid = mid - fractionSample
+
+    taps = np.arange(width)
+    fir = modifiedSinc(taps - mid[:, np.newaxis], cutoff[:, np.newaxis])
+    fir[taps >= length[:, np.newaxis]] = 0
+    return fir
+
+
 def lowpassFirStableQuad(length: int, cutoff: float, fractionSample: float):
     mid = length // 2 + 1 if length % 2 == 1 else length // 2
 
@@ -1235,10 +1596,7 @@ def testDelay(inputPath: Path | None = None):
         ]
     ):
         delay = Delay(maxDelayTimeSample)
-        func = getattr(delay, method)
-        delayed = np.zeros_like(source)
-        for i, v in enumerate(source):
-            delayed[i] = func(v, delayTime[i])
+        delayed = delay.processBlock(source, delayTime, method)
 
         saveSpectrogram(Path(f"img/testDelay_{method}.png"), sampleRate, delayed)
 
@@ -1246,6 +1604,44 @@ def testDelay(inputPath: Path | None = None):
         soundfile.write(f"snd/{method}.wav", outputGain * delayed, sampleRate, "FLOAT")
 
 
+def testDelayBlock(durationSecond: float = 0.05, benchmarkSecond: float = 60):
+    """
+    Compares `Delay.processBlock()` to the per-sample methods, then measures the time
+    to process `benchmarkSecond` of modulated signal with each method.
+    """
+    sampleRate = 48000
+    maxDelayTimeSample = 65536
+
+    def modulatedTime(length: int):
+        return 16 * 2 ** (4 * np.sin(4 * np.pi * np.arange(length) / sampleRate))
+
+    methods = [
+        m
+        for m in dir(Delay)
+        if m.startswith("process") and hasattr(Delay, m.replace("process", "kernel", 1))
+    ]
+
+    source = generateSawtooth(sampleRate, 4000, durationSecond)
+    delayTime = modulatedTime(len(source))
+    for method in methods:
+        delay = Delay(maxDelayTimeSample)
+        func = getattr(delay, method)
+        target = np.zeros_like(source)
+        for i, v in enumerate(source):
+            target[i] = func(v, delayTime[i])
+
+        actual = Delay(maxDelayTimeSample).processBlock(source, delayTime, method)
+        print(f"{method:40}: max diff {np.max(np.abs(actual - target)):.3e}")
+
+    source = generateSawtooth(sampleRate, 4000, benchmarkSecond)
+    delayTime = modulatedTime(len(source))
+    for method in methods:
+        start = time.perf_counter()
+        Delay(maxDelayTimeSample).processBlock(source, delayTime, method)
+        elapsed = time.perf_counter() - start
+        print(f"{method:40}: {elapsed:8.3f} s for {benchmarkSecond} s of signal")
+
+
 def testDelaySlewRate():
     sampleRate = 48000
 
@@ -1420,9 +1816,7 @@ def testDelayAaIir(inputPath: Path | None = None):
     outputGain = 0.25
     maxDelayTimeSample = 65536
     delay = DelayAaIir(maxDelayTimeSample)
-    delayed = np.zeros_like(source)
-    for i, v in enumerate(source):
-        delayed[i] = delay.process(v, delayTime[i])
+    delayed = delay.processBlock(source, delayTime)
 
     saveSpectrogram(Path(f"img/testDelayAaIir_output.png"), sampleRate, delayed)
 
@@ -1503,6 +1897,7 @@ if __name__ == "__main__":
     # testMaxDelayTime()
     # testDelay(Path("snd/yey.wav"))
     # testDelay()
+    # testDelayBlock()
     # testDelaySlewRate()
     # compareDelay()
     # printFirGlitch()
@@ -0,0 +1,183 @@
+"""
+Precomputed tables of fractional delay kernels.
+
+The FIR generators in `windowed_sinc.py`, `versinc.py` and `window_function.py` take
+the fraction as the last argument, and compute the whole kernel from scratch with trig
+recurrences. `KernelTable` samples a generator at `nFraction` fractional positions once,
+and a read only interpolates between the rows of the table.
+
+```python
+table = KernelTable(functools.partial(lowpassBlackmanHarrisBiquad, 64, 0.25), 256)
+fir = table.lookup(fraction)  # ≈ lowpassBlackmanHarrisBiquad(64, 0.25, fraction)
+```
+
+Row `i` of the table is the kernel at fraction `(i - 1) / nFraction`. 1 row before 0 and
+2 rows after 1 are added, so that cubic interpolation doesn't need a special case at the
+ends. Tables are saved as `.npy`, and loaded as memory map.
+"""
+
+import functools
+import numpy as np
+from pathlib import Path
+
+from versinc import fastVersinc
+from window_function import blackmanHarrisC
+from windowed_sinc import (
+    lowpassBiquadPade,
+    lowpassBlackmanHarrisBiquad,
+    lowpassFir,
+    lowpassReinsch,
+)
+
+
+class KernelTable:
+    def __init__(self, generator, nFraction: int, table: np.ndarray | None = None):
+        """
+        `generator(fraction)` returns a kernel as 1D array. Use `functools.partial` to
+        fix the other arguments. `generator` isn't called when `table` is given.
+        """
+        self.nFraction: int = nFraction
+        if table is None:
+            fraction = (np.arange(nFraction + 3) - 1) / nFraction
+            table = np.array([generator(f) for f in fraction], dtype=np.float64)
+        if table.ndim != 2 or len(table) != nFraction + 3:
+            raise ValueError(f"Shape {table.shape} doesn't match nFraction={nFraction}.")
+        self.table: np.ndarray = table
+
+    @property
+    def length(self):
+        return self.table.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def save(self, path: Path):
+        np.save(path, np.ascontiguousarray(self.table))
+
+    @classmethod
+    def load(cls, path: Path):
+        table = np.load(path, mmap_mode="r")
+        return cls(None, len(table) - 3, table)
+
+    def position(self, fraction):
+        """Returns `(row, t)`. Fraction is `(row - 1 + t) / nFraction`."""
+        position = np.clip(np.asarray(fraction, dtype=np.float64), 0, 1) * self.nFraction
+        row = np.minimum(position.astype(np.int64), self.nFraction - 1)
+        return (row + 1, position - row)
+
+    def lookup(self, fraction, order: int = 3):
+        """
+        `fraction` is in [0, 1], and it's clamped to the range. When `fraction` is an
+        array, output shape is `fraction.shape + (self.length,)`.
+
+        `order` is 1 for linear interpolation, or 3 for cubic Lagrange interpolation.
+        """
+        row, t = self.position(fraction)
+        t = t[..., np.newaxis]
+        if order == 1:
+            y0 = self.table[row]
+            return y0 + t * (self.table[row + 1] - y0)
+        if order == 3:
+            ym1 = self.table[row - 1]
+            y0 = self.table[row]
+            y1 = self.table[row + 1]
+            y2 = self.table[row + 2]
+            return (
+                -t * (t - 1) * (t - 2) / 6 * ym1
+                + (t + 1) * (t - 1) * (t - 2) / 2 * y0
+                - (t + 1) * t * (t - 2) / 2 * y1
+                + (t + 1) * t * (t - 1) / 6 * y2
+            )
+        raise ValueError(f"Interpolation order must be 1 or 3, not {order}.")
+
+
+def loadKernelTable(generator, nFraction: int, cacheDir: Path = Path("kernel_table")):
+    """
+    Loads `KernelTable` from `cacheDir`, or builds and saves it if the file doesn't
+    exist. `generator` must be a `functools.partial` of a module level function, so
+    that the file name can be made from its arguments.
+    """
+    name = "_".join(
+        [generator.func.__name__]
+        + [str(arg) for arg in generator.args]
+        + [f"{key}={value}" for key, value in sorted(generator.keywords.items())]
+        + [str(nFraction)]
+    )
+    path = Path(cacheDir) / f"{name}.npy"
+    if path.exists():
+        return KernelTable.load(path)
+
+    table = KernelTable(generator, nFraction)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table.save(path)
+    return table
+
+
+def measureTableError(
+    generator, nFractions=(16, 64, 256, 1024), nTest: int = 1024, seed: int = 0
+):
+    """
+    Returns list of `(nFraction, nbytes, linearError, cubicError)`. Errors are the
+    maximum absolute difference to `generator` at `nTest` random fractions.
+    """
+    rng = np.random.default_rng(seed)
+    fraction = rng.uniform(0, 1, nTest)
+    target = np.array([generator(f) for f in fraction])
+
+    result = []
+    for nFraction in nFractions:
+        table = KernelTable(generator, nFraction)
+        linear = np.max(np.abs(table.lookup(fraction, 1) - target))
+        cubic = np.max(np.abs(table.lookup(fraction, 3) - target))
+        result.append((nFraction, table.nbytes, linear, cubic))
+    return result
+
+
+def reportTableError(length: int = 64, cutoff: float = 0.25):
+    generators = {
+        "lowpassFir": functools.partial(lowpassFir, length, cutoff),
+        "lowpassBiquadPade": functools.partial(lowpassBiquadPade, length, cutoff),
+        "lowpassReinsch": functools.partial(lowpassReinsch, length, cutoff),
+        "lowpassBlackmanHarrisBiquad": functools.partial(
+            lowpassBlackmanHarrisBiquad, length, cutoff
+        ),
+        "fastVersinc": functools.partial(fastVersinc, length, cutoff),
+        "blackmanHarrisC": functools.partial(blackmanHarrisC, length),
+    }
+
+    print(f"length={length}, cutoff={cutoff}")
+    print(
+        f"{'generator':28} | {'nFraction':>9} | {'memory [KiB]':>12} | "
+        f"{'linear error':>12} | {'cubic error':>12}"
+    )
+    for name, generator in generators.items():
+        for nFraction, nbytes, linear, cubic in measureTableError(generator):
+            print(
+                f"{name:28} | {nFraction:9} | {nbytes / 1024:12.1f} | "
+                f"{linear:12.3e} | {cubic:12.3e}"
+            )
+
+
+def testKernelTable():
+    generator = functools.partial(lowpassBlackmanHarrisBiquad, 16, 0.4)
+    table = KernelTable(generator, 64)
+
+    # Sampled fractions are exact in both interpolations.
+    for index in range(65):
+        fraction = index / 64
+        for order in [1, 3]:
+            if not np.allclose(table.lookup(fraction, order), generator(fraction)):
+                print(f"Test failed: fraction={fraction}, order={order}")
+
+    path = Path("kernel_table/testKernelTable.npy")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table.save(path)
+    loaded = KernelTable.load(path)
+    if not np.array_equal(loaded.lookup([0.1, 0.7]), table.lookup([0.1, 0.7])):
+        print("Test failed: save and load")
+
+
+if __name__ == "__main__":
+    testKernelTable()
+    reportTableError()
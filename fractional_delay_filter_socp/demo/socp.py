@@ -38,35 +38,7 @@ import argparse
 import json
 import numpy
 
-from cvxopt import matrix, solvers
-
-def get_b(omega, fraction):
-    H_d = numpy.exp(-1j * fraction * omega)
-    return numpy.vstack((H_d.real, H_d.imag)).T
-
-def get_A_tilde(n_taps, omega):
-    index = numpy.arange(n_taps)
-    a = numpy.exp(-1j * index.reshape(1, -1) * omega.reshape(-1, 1))
-
-    A_tilde = []
-    for a_i in a:
-        a_i0 = numpy.append(a_i, 0)
-        A_tilde.append([a_i0.real, a_i0.imag])
-    return numpy.array(A_tilde)
-
-def solve(A, b):
-    c = numpy.zeros(A.shape[2])
-    c[-1] = 1
-
-    rhs = numpy.zeros_like(A[0][0])
-    rhs[-1] = 1
-
-    G = [matrix(-numpy.vstack((rhs.reshape(1, -1), A_i))) for A_i in A]
-    h = [matrix(numpy.append(0, b_i)) for b_i in b]
-
-    solvers.options["show_progress"] = False
-    sol = solvers.socp(matrix(c), Gq=G, hq=h)
-    return numpy.array(sol["x"]).flatten()
+from socptable import design_table, get_omega
 
 def createTable(n_taps, n_fraction, delta_min=None, omega_max=0.9, omega_density=4):
     if n_taps < 2:
@@ -80,24 +52,17 @@ def createTable(n_taps, n_fraction, delta_min=None, omega_max=0.9, omega_density
     if omega_density < 1:
         raise ValueError("omega_density must be greater than or equal to 1.")
 
-    omega = numpy.linspace(
-        0,
-        numpy.pi * omega_max,
-        int(omega_density * n_taps),
-    )
+    omega = get_omega(n_taps, omega_max, omega_density)
 
     if delta_min is None:
         delta_min = numpy.floor((n_taps - 1) / 2)
 
     # fraction is Δ in paper.
-    table = [
-        -solve(get_A_tilde(n_taps, omega), get_b(omega, fraction))[0:-1]
-        for fraction in numpy.linspace(delta_min, delta_min + 1, n_fraction)
-    ]
+    fractions = numpy.linspace(delta_min, delta_min + 1, n_fraction)
     return {
         "delta_min": delta_min,
         "omega_max": omega_max,
-        "table": numpy.array(table),
+        "table": design_table(n_taps, fractions, omega),
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+"""
+SOCP 分数遅延フィルタのテーブルを設計するモジュール。
+
+`socp.py` と `truepeak_computation/code/fractionaldelaysocp.py` の `createTable` から
+使われる。
+
+- 制約の行列は NumPy のブロードキャストで作る。行列は遅延 Δ に依存しないので、
+  テーブルごとに 1 回だけ作る。
+- 遅延はチャンクに分けてプロセスプールで解く。遅延ごとに独立に解くので、結果は
+  チャンクの大きさに依存しない。隣の遅延の解を初期値 (warm start) にしても速く
+  ならなかったので使っていない。
+- 解いたテーブルはパラメータのハッシュをファイル名として `cache_dir` に `.npy` で
+  保存する。
+"""
+
+import hashlib
+import json
+import numpy
+from multiprocessing import Pool
+from pathlib import Path
+
+from cvxopt import matrix, solvers
+
+def get_omega(n_taps, omega_max, omega_density):
+    return numpy.linspace(0, numpy.pi * omega_max, int(omega_density * n_taps))
+
+def get_b(omega, delta):
+    H_d = numpy.exp(-1j * delta * omega)
+    return numpy.vstack((H_d.real, H_d.imag)).T
+
+def get_A_tilde(n_taps, omega):
+    """Shape is `(len(omega), 2, n_taps + 1)`. Last column is for slack variable."""
+    a = numpy.exp(-1j * numpy.arange(n_taps)[numpy.newaxis, :] * omega[:, numpy.newaxis])
+    a0 = numpy.concatenate((a, numpy.zeros((len(omega), 1))), axis=1)
+    return numpy.stack((a0.real, a0.imag), axis=1)
+
+def get_G(A):
+    rhs = numpy.zeros((A.shape[0], 1, A.shape[2]))
+    rhs[:, :, -1] = 1
+    return -numpy.concatenate((rhs, A), axis=1)
+
+def solve(A, b):
+    c = numpy.zeros(A.shape[2])
+    c[-1] = 1
+
+    G = [matrix(G_i) for G_i in get_G(A)]
+    h = [matrix(numpy.append(0, b_i)) for b_i in b]
+
+    solvers.options["show_progress"] = False
+    sol = solvers.socp(matrix(c), Gq=G, hq=h)
+    return numpy.array(sol["x"]).flatten()
+
+def solve_chunk(args):
+    """Solves consecutive delays with the constraint matrix shared in the chunk."""
+    n_taps, omega, deltas = args
+    A = get_A_tilde(n_taps, omega)
+    return [-solve(A, get_b(omega, delta))[0:-1] for delta in deltas]
+
+def table_key(n_taps, deltas, omega):
+    param = {
+        "n_taps": int(n_taps),
+        "deltas": [float(d).hex() for d in deltas],
+        "omega": [float(w).hex() for w in omega],
+    }
+    return hashlib.sha256(json.dumps(param).encode("utf-8")).hexdigest()
+
+def design_tables(specs, processes=None, chunk_size=4, cache_dir="socp_cache"):
+    """
+    specs: List of `(n_taps, deltas, omega)`.
+    Returns list of tables. Each table is an array of shape `(len(deltas), n_taps)`.
+
+    All uncached tables are solved in one process pool, so a parameter sweep can be
+    passed at once.
+    """
+    cache_dir = None if cache_dir is None else Path(cache_dir)
+    tables = [None] * len(specs)
+    keys = [table_key(*spec) for spec in specs]
+
+    tasks = []
+    for index, ((n_taps, deltas, omega), key) in enumerate(zip(specs, keys)):
+        if cache_dir is not None and (cache_dir / f"{key}.npy").exists():
+            tables[index] = numpy.load(cache_dir / f"{key}.npy")
+            continue
+        for start in range(0, len(deltas), chunk_size):
+            tasks.append((index, (n_taps, omega, deltas[start : start + chunk_size])))
+
+    if len(tasks) == 0:
+        return tables
+
+    arguments = [task for _, task in tasks]
+    if processes == 1 or len(tasks) == 1:
+        solved = list(map(solve_chunk, arguments))
+    else:
+        with Pool(processes) as pool:
+            solved = pool.map(solve_chunk, arguments)
+
+    rows = {}
+    for (index, _), chunk in zip(tasks, solved):
+        rows.setdefault(index, []).extend(chunk)
+
+    for index, table in rows.items():
+        tables[index] = numpy.array(table)
+        if cache_dir is not None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            numpy.save(cache_dir / f"{keys[index]}.npy", tables[index])
+    return tables
+
+def design_table(n_taps, deltas, omega, **kwargs):
+    return design_tables([(n_taps, deltas, omega)], **kwargs)[0]
@@ -1,12 +1,12 @@
 import argparse
 import numpy
 import python_speech_features
-import sklearn.cluster
 import sklearn.manifold
-import shutil
 import soundfile
 from pathlib import Path
 
+from pipeline import run
+
 def extract_feature(path, n_frame=19):
     """
     mfcc.shape = (n_frame, n_cepstrum)
@@ -33,43 +33,28 @@ def extract_feature(path, n_frame=19):
 
     return numpy.ravel(mfcc)
 
-def write_result(output_directory, n_clusters, labels, filepath):
-    if output_directory.exists():
-        shutil.rmtree(output_directory)
-
-    digits = len(str(abs(n_clusters - 1)))
-    output_directories = [
-        output_directory / Path(f"{index:0{digits}d}")
-        for index in range(n_clusters)
-    ]
-
-    for directory in output_directories:
-        directory.mkdir(parents=True, exist_ok=True)
-
-    for label, path in zip(labels, filepath):
-        shutil.copy(path, output_directories[label])
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Extract features from wav file.")
     parser.add_argument(
         "src_path", metavar="src_path", type=str, help="Source directory path.")
+    parser.add_argument("--n_clusters", type=int, default=40)
+    parser.add_argument(
+        "--link",
+        choices=["symlink", "copy", "none"],
+        default="symlink",
+        help="How to place sound files in cluster directories.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of processes for feature extraction.")
     args = parser.parse_args()
 
     directory_path = Path(args.src_path)
     if not directory_path.is_dir():
         print("Invalid path.")
+        exit()
 
-    filepath = [path for path in directory_path.glob("*.wav")]
-    features = numpy.array([extract_feature(path) for path in filepath])
-
-    n_clusters = 40
-    cluster = sklearn.cluster.KMeans(n_clusters=n_clusters).fit(features)
-
-    write_result(Path("cluster_mfcc"), n_clusters, cluster.labels_, filepath)
-
-    numpy.save("data/filepath.npy", filepath)
-    numpy.save("data/features.npy", features)
-    numpy.save("data/features_shape.npy", (19, 26))
-    numpy.save("data/labels.npy", cluster.labels_)
-    numpy.save("data/centers.npy", cluster.cluster_centers_)
+    run(directory_path, extract_feature, "mfcc", (19, 26), args.n_clusters,
+        args.link, args.processes)
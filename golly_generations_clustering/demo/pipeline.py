@@ -0,0 +1,202 @@
+"""
+mfcc.py と spectrogram.py で使う、特徴量の抽出からクラスタリングまでの処理。
+
+特徴量は data/ に保存する。 plot_kmeans.py などは今までどおり data/*.npy を読む。
+
+- features.npy : float32 の行列。 1 行が 1 ファイル。 mmap で読み書きする。
+- index.json : 特徴量の名前と形、各行のファイルのパスと更新時刻。
+
+再実行したときは、パス、更新時刻、サイズ、特徴量の名前と形が一致する行を再利用して、
+追加または変更されたファイルだけをプロセスプールで計算する。
+"""
+
+import json
+import numpy
+import os
+import shutil
+import sklearn.cluster
+from multiprocessing import Pool
+from numpy.lib.format import open_memmap
+from pathlib import Path
+
+def get_file_key(path):
+    stat = path.stat()
+    return {
+        "path": str(path.resolve()),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+def load_index(data_dir):
+    index_path = Path(data_dir) / "index.json"
+    if not index_path.exists():
+        return None
+    with open(index_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def get_feature(directory_path,
+                extract_feature,
+                name,
+                feature_shape,
+                data_dir=Path("data"),
+                processes=None):
+    """
+    extract_feature(path) は長さ prod(feature_shape) の 1 次元の配列を返す関数。
+    ワーカーに渡すので、モジュールのトップレベルで定義すること。
+
+    (filepath, features) を返す。 features は mmap で読み込んだ float32 の行列。
+    """
+    params = {"name": name, "feature_shape": [int(n) for n in feature_shape]}
+    n_column = int(numpy.prod(feature_shape))
+
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    feature_path = data_dir / "features.npy"
+
+    filepath = sorted(Path(directory_path).glob("*.wav"))
+    keys = [get_file_key(path) for path in filepath]
+
+    cached_row = {}
+    previous = load_index(data_dir)
+    if (previous is not None and previous["params"] == params
+            and feature_path.exists()):
+        previous_features = numpy.load(feature_path, mmap_mode="r")
+        for row, key in enumerate(previous["files"]):
+            cached_row[tuple(key.values())] = row
+    else:
+        previous_features = None
+
+    tmp_path = data_dir / "features.tmp.npy"
+    features = open_memmap(tmp_path,
+                           mode="w+",
+                           dtype=numpy.float32,
+                           shape=(len(filepath), n_column))
+    new_rows = []
+    for row, key in enumerate(keys):
+        cached = cached_row.get(tuple(key.values()))
+        if cached is None:
+            new_rows.append(row)
+        else:
+            features[row] = previous_features[cached]
+    del previous_features
+
+    print(f"{len(filepath) - len(new_rows)} cached, "
+          f"{len(new_rows)} to extract.")
+    with Pool(processes) as pool:
+        results = pool.imap(extract_feature,
+                            [filepath[row] for row in new_rows],
+                            chunksize=16)
+        for row, feature in zip(new_rows, results):
+            features[row] = feature
+    features.flush()
+    del features
+    os.replace(tmp_path, feature_path)
+
+    index = {"params": params, "files": keys}
+    tmp_index_path = data_dir / "index.tmp.json"
+    with open(tmp_index_path, "w", encoding="utf-8") as file:
+        json.dump(index, file, indent=1)
+    os.replace(tmp_index_path, data_dir / "index.json")
+
+    numpy.save(data_dir / "filepath.npy", filepath)
+    numpy.save(data_dir / "features_shape.npy", feature_shape)
+    return (filepath, numpy.load(feature_path, mmap_mode="r"))
+
+def minibatch_kmeans(features, n_clusters, init="k-means++", batch_size=4096,
+                     seed=0):
+    return sklearn.cluster.MiniBatchKMeans(
+        n_clusters=n_clusters,
+        init=init,
+        n_init=1 if isinstance(init, numpy.ndarray) else 3,
+        batch_size=batch_size,
+        random_state=seed,
+    ).fit(features)
+
+def elbow_curve(features, k_range=range(2, 101), batch_size=4096, seed=0):
+    """
+    k を増やしながら inertia を計算する。 k のクラスタリングは k - 1 の中心に
+    1 つ中心を足して始める。足す中心は greedy k-means++ と同じく、最も近い中心までの
+    距離の 2 乗に比例する確率で n_trial 個の候補を選び、 sample の inertia が
+    最も小さくなる候補にする。
+    """
+    rng = numpy.random.default_rng(seed)
+    n_sample = min(len(features), 16 * batch_size)
+    rows = numpy.sort(rng.choice(len(features), n_sample, replace=False))
+    sample = numpy.asarray(features[rows])
+    sample_norm = numpy.sum(sample * sample, axis=1)
+
+    inertia = []
+    cluster = None
+    for k in k_range:
+        if cluster is None or cluster.n_clusters != k - 1:
+            init = "k-means++"
+        else:
+            distance = numpy.min(cluster.transform(sample), axis=1)**2
+            total = numpy.sum(distance)
+            n_trial = 2 + int(numpy.log(k))
+            if total > 0:
+                candidate = rng.choice(n_sample, n_trial, p=distance / total)
+            else:
+                candidate = rng.integers(n_sample, size=n_trial)
+            to_candidate = (sample_norm[:, numpy.newaxis]
+                            + sample_norm[candidate]
+                            - 2 * sample @ sample[candidate].T)
+            potential = numpy.sum(
+                numpy.minimum(distance[:, numpy.newaxis], to_candidate), axis=0)
+            new_center = sample[candidate[numpy.argmin(potential)]]
+            init = numpy.vstack((cluster.cluster_centers_, new_center))
+        cluster = minibatch_kmeans(features, k, init, batch_size, seed)
+        inertia.append(cluster.inertia_)
+    return numpy.array(inertia)
+
+def write_result(output_directory, n_clusters, labels, filepath,
+                 link="symlink"):
+    """
+    音声ファイルを output_directory/{label}/ に置いて、 manifest.json に
+    ラベルとファイルのリストを書く。 link が "symlink" ならシンボリックリンク、
+    "copy" ならコピーで置く。 "none" なら manifest.json だけを書く。
+    """
+    if output_directory.exists():
+        shutil.rmtree(output_directory)
+    output_directory.mkdir(parents=True)
+
+    digits = len(str(abs(n_clusters - 1)))
+    names = [f"{index:0{digits}d}" for index in range(n_clusters)]
+
+    clusters = {name: [] for name in names}
+    for label, path in zip(labels, filepath):
+        clusters[names[label]].append(str(Path(path).resolve()))
+
+    if link != "none":
+        for name, paths in clusters.items():
+            directory = output_directory / name
+            directory.mkdir()
+            for path in map(Path, paths):
+                if link == "symlink":
+                    (directory / path.name).symlink_to(path)
+                else:
+                    shutil.copy(path, directory)
+
+    manifest_path = output_directory / "manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump({"clusters": clusters}, file, indent=1)
+
+def run(directory_path,
+        extract_feature,
+        name,
+        feature_shape,
+        n_clusters=40,
+        link="symlink",
+        processes=None):
+    """
+    mfcc.py と spectrogram.py の main から呼ぶ。
+    """
+    filepath, features = get_feature(directory_path, extract_feature, name,
+                                     feature_shape, processes=processes)
+    cluster = minibatch_kmeans(features, n_clusters)
+
+    write_result(Path(f"cluster_{name}"), n_clusters, cluster.labels_, filepath,
+                 link)
+
+    numpy.save("data/labels.npy", cluster.labels_)
+    numpy.save("data/centers.npy", cluster.cluster_centers_)
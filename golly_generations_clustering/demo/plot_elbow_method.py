@@ -1,19 +1,13 @@
 import matplotlib.pyplot as pyplot
 import numpy
-import python_speech_features
-import sklearn.cluster
-import soundfile
-from pathlib import Path
 
-def get_inertia(n_clusters, features):
-    cluster = sklearn.cluster.KMeans(n_clusters=n_clusters).fit(features)
-    return cluster.inertia_
+from pipeline import elbow_curve
 
 if __name__ == "__main__":
-    features = numpy.load("data/features.npy")
+    features = numpy.load("data/features.npy", mmap_mode="r")
 
     x_range = (2, 101)
-    errors = [get_inertia(k, features) for k in range(*x_range)]
+    errors = elbow_curve(features, range(*x_range))
     k_value = [k for k in range(*x_range)]
 
     pyplot.figure(figsize=(12.80, 7.20), dpi=10)
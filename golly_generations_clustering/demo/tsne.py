@@ -1,6 +1,11 @@
 import numpy
+import sklearn.decomposition
 import sklearn.manifold
 
-features = numpy.load("data/features.npy")
-tsne = sklearn.manifold.TSNE(n_components=2).fit(features)
+# 次元が大きいと TSNE が遅いので、先に PCA で 50 次元に減らす。
+features = numpy.load("data/features.npy", mmap_mode="r")
+n_components = min(50, *features.shape)
+reduced = sklearn.decomposition.PCA(n_components=n_components).fit_transform(
+    features)
+tsne = sklearn.manifold.TSNE(n_components=2, init="pca").fit(reduced)
 numpy.save("data/embedding.npy", tsne.embedding_)
@@ -1,10 +1,22 @@
+import os
+import sys
 import numpy
 import imageio
 from scipy.special import binom
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../waveequationimplicit/demo",
+    ))
+from grunwaldletnikov import GrunwaldLetnikovSum, grunwaldLetnikovCoefficients
+from timehistory import TimeHistory
+from tridiagonal import boundaryTridiagonal
+
 
 class HeatWave1D():
-    def __init__(self, length, c, dx, dt, alpha, attenuation):
+    def __init__(self, length, c, dx, dt, alpha, attenuation, memoryLength=None,
+                 nExponentials=24):
         """
         1次元の熱と波のシミュレータ。
 
@@ -16,13 +28,24 @@ class HeatWave1D():
         :param dt: シミュレーションの1ステップで進む時間[s]。
         :param alpha: 分数階微分の階数。 [0, 1] の範囲。
         :param attenuation: 厳密でない波の減衰係数。 [0, 1] の範囲。
+        :param memoryLength: 指定すると分数階微分を指数関数の和で近似する。近似する履歴
+            の長さ。 1 ステップの計算量は memoryLength によらない。
+        :param nExponentials: 近似に使う指数関数の数。
         """
         # u(x, t) -> self.wave[t][x]
         self.length = length
         self.fracDiffDepth = 256
-        self.wave = numpy.zeros((self.fracDiffDepth, self.length))
+
+        # memoryLength を指定したときは分数階微分を指数関数の和で近似する。
+        self.memory = None
+        if memoryLength is not None:
+            self.memory = GrunwaldLetnikovSum(length, memoryLength, nExponentials)
+            self.fracDiffDepth = self.memory.depth()
+
+        self.wave = TimeHistory(self.fracDiffDepth, self.length)
 
         self.field = numpy.zeros(self.length)
+        self.work = numpy.zeros(self.length)
 
         self.setParameters(c, dx, dt, alpha, attenuation)
         self.pick(0, 0)
@@ -30,6 +53,7 @@ class HeatWave1D():
     def value(self):
         """
         描画用に最新の波を返す。
+        内部のリングバッファのビューなので、以降の step() で上書きされる。
         """
         return self.wave[0]
 
@@ -62,49 +86,63 @@ class HeatWave1D():
         self.C1 = (self.c / self.dx)**2 * self.dt**(1 + self.alpha)
         self.C2 = -(1 + 2 * self.C1)
 
-        self.fracCoefficients = [(-1)**m * binom(1 + self.alpha, m)
-                                 for m in range(self.fracDiffDepth)]
+        if self.memory is None:
+            self.fracCoefficients = [(-1)**m * binom(1 + self.alpha, m)
+                                     for m in range(self.fracDiffDepth)]
+        else:
+            self.fracFit = self.memory.fit(
+                grunwaldLetnikovCoefficients(1 + self.alpha,
+                                             self.memory.memoryLength))
 
     def initMatrix(self):
         """
         Implicit finite difference method で解く必要のある方程式の設定。
         ax = b の a。
         """
-        mat = numpy.zeros((self.length, self.length))
-
-        mat[0][0] = self.C2
-        mat[0][1] = self.C1 * (1 + self.L)
-
-        last = self.length - 1
-        for i in range(1, last):
-            mat[i][i - 1] = self.C1
-            mat[i][i] = self.C2
-            mat[i][i + 1] = self.C1
-
-        mat[last][last - 1] = self.C1 * (1 + self.R)
-        mat[last][last] = self.C2
-
-        self.a = mat
+        self.solver = boundaryTridiagonal(
+            self.length, self.C1, self.C2, self.L, self.R)
 
     def step(self):
         """
         シミュレーションの1ステップ。
         """
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.fractionalDifference(),
+        numpy.multiply(
+            self.solver.solve(self.fractionalDifference(), overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
+    def advance(self, nSteps, out=None):
+        """
+        描画せずに nSteps だけシミュレーションを進める。
+
+        :param nSteps: 進めるステップ数。
+        :param out: 各ステップの後の波を書き込む配列。形は (nSteps, length) 。
+            numpy.memmap も使える。 None のときは新しく確保する。
+        :return: out 。
+        """
+        if out is None:
+            out = numpy.empty((nSteps, self.length))
+        for index in range(nSteps):
+            self.step()
+            out[index] = self.wave[0]
+        return out
+
     def fractionalDifference(self):
         """
         分数階微分の計算。方程式 ax = b の bを返す。
         """
+        if self.memory is not None:
+            self.memory.push(self.wave)
+            return self.memory.sum(self.wave, self.fracFit, self.field)
+
         self.field.fill(0)
         for m in range(1, len(self.wave)):
-            self.field += self.fracCoefficients[m] * self.wave[m]
+            numpy.multiply(self.wave[m], self.fracCoefficients[m], out=self.work)
+            self.field += self.work
         return self.field
 
     def reset(self):
@@ -112,6 +150,8 @@ class HeatWave1D():
         波を 0 で埋めて初期状態に戻す。
         """
         self.wave.fill(0)
+        if self.memory is not None:
+            self.memory.reset()
 
     def pick(self, x, y):
         """
@@ -128,10 +168,7 @@ if __name__ == "__main__":
     length = 512
     wave1d = HeatWave1D(length, 64, 0.1, 0.01, 0.5, 1)
 
-    result = []
     wave1d.pick(0.5, 1)
-    for t in range(0, length):
-        wave1d.step()
-        result.append(wave1d.value())
+    result = wave1d.advance(length)
 
-    imageio.imwrite("heat_wave1d.png", numpy.array(result))
+    imageio.imwrite("heat_wave1d.png", result)
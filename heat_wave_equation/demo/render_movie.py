@@ -1,16 +1,22 @@
+import os
 import sys
 import math
 import random
 import pathlib
+from multiprocessing import Pool
 
+import numpy
 from PyQt5.QtCore import (QSize, QPointF, Qt)
 from PyQt5.QtGui import (QGuiApplication, QPainter, QPainterPath, QBrush,
                          QColor, QPen, QImage, QFont)
 
 from wave import Wave1D, HeatWave1D, Wave1DExplicit
 
+# Frames are rendered without display.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 
-def draw(image, wave1d, font):
+
+def draw(image, wav, pickY, alpha, font):
     size = image.size()
     centerY = math.floor(size.height() / 2)
 
@@ -22,7 +28,6 @@ def draw(image, wave1d, font):
     qp.setPen(color)
     qp.setBrush(color)
 
-    wav = wave1d.value()
     path = QPainterPath()
     path.moveTo(0, centerY)
     denom = len(wav) - 1
@@ -35,7 +40,7 @@ def draw(image, wave1d, font):
     path.lineTo(0, size.height())
     qp.drawPath(path)
 
-    if wave1d.pickY != 0:
+    if pickY != 0:
         pen = QPen(QColor(0xe0, 0x20, 0x10))
         pen.setWidthF(2.0)
         pen.setCapStyle(Qt.RoundCap)
@@ -43,7 +48,7 @@ def draw(image, wave1d, font):
         w = 8
         h = 16
         centerX = size.width() / 2 - 0.5
-        depth = centerY + wave1d.pickY
+        depth = centerY + pickY
         qp.drawLine(QPointF(centerX, centerY - h), QPointF(centerX, centerY))
         qp.drawLine(
             QPointF(centerX - w / 2, centerY - h / 4),
@@ -56,7 +61,7 @@ def draw(image, wave1d, font):
 
     qp.setPen(Qt.black)
     qp.setFont(font)
-    qp.drawText(4, font.pointSize() + 4, "α={:0.3}".format(wave1d.alpha))
+    qp.drawText(4, font.pointSize() + 4, "α={:0.3}".format(alpha))
 
     qp.setPen(QColor(0x30, 0x30, 0x30))
     qp.setBrush(Qt.transparent)
@@ -75,44 +80,87 @@ def compose(target, images, grid, gridWidth, gridHeight):
             )
 
 
-if __name__ == '__main__':
-    app = QGuiApplication(sys.argv)
+def simulate(args):
+    """
+    Writes the state of `waveIndex`-th wave to `statesPath`, which is a `.npy` file of
+    shape `(number of waves, numFrame, length)`. The file is memory mapped, so a long
+    movie doesn't have to fit in memory.
+    """
+    statesPath, waveIndex, parameters, numFrame, releaseFrame, pickY = args
+    states = numpy.load(statesPath, mmap_mode="r+")
 
-    width = 320
-    height = 180
+    wave = HeatWave1D(*parameters)
+    wave.pick(0.5, pickY)
+    wave.advance(releaseFrame, states[waveIndex, :releaseFrame])
+    wave.pick(0.5, 0)
+    wave.advance(numFrame - releaseFrame, states[waveIndex, releaseFrame:])
+    states.flush()
+    return waveIndex
+
+
+def initRenderer():
+    # QGuiApplication is created in each worker process, not in the parent.
+    global app
+    app = QGuiApplication([])
 
-    grid = 4
-    length = grid * grid
-    denom = length - 1
-    wave1d = [
-        HeatWave1D(
-            width,
-            4,
-            0.1 * width / 512,
-            1 / 60,
-            index / denom,
-            1,
-        ) for index in range(length)
-    ]
+
+def render(args):
+    statesPath, frames, alphas, releaseFrame, pickY, grid, width, height = args
+    states = numpy.load(statesPath, mmap_mode="r")
 
     images = [
-        QImage(width, height, QImage.Format_RGB888) for _ in range(length)
+        QImage(width, height, QImage.Format_RGB888) for _ in range(len(states))
     ]
     composed_image = QImage(width * grid, height * grid, QImage.Format_RGB888)
 
     font = QFont("Dejavu Sans Mono", 12)
 
+    for time in frames:
+        picking = pickY if time < releaseFrame else 0
+        for i in range(len(states)):
+            draw(images[i], states[i, time], picking, alphas[i], font)
+        compose(composed_image, images, grid, width, height)
+        composed_image.save("img/out{:04d}.png".format(time))
+    return len(frames)
+
+
+if __name__ == '__main__':
+    width = 320
+    height = 180
+
+    grid = 4
+    length = grid * grid
+    denom = length - 1
+    parameters = [(width, 4, 0.1 * width / 512, 1 / 60, index / denom, 1)
+                  for index in range(length)]
+    alphas = [p[4] for p in parameters]
+
     pathlib.Path('img').mkdir(parents=True, exist_ok=True)
 
-    for wave in wave1d:
-        wave.pick(0.5, height / 3)
     num_frame = 1800
-    for time in range(num_frame):
-        if time == num_frame / 6:
-            for wave in wave1d:
-                wave.pick(0.5, 0)
-        for i in range(length):
-            wave1d[i].step()
-            draw(images[i], wave1d[i], font)
-        compose(composed_image, images, grid, width, height)
-        composed_image.save("img/out{:04d}.png".format(time))
+    release_frame = num_frame // 6
+    pick_y = height / 3
+
+    # Simulation and rendering both run in parallel. The states are passed through a
+    # memory mapped file.
+    states_path = "img/states.npy"
+    numpy.lib.format.open_memmap(
+        states_path, mode="w+", shape=(length, num_frame, width)).flush()
+
+    tasks = [(states_path, index, p, num_frame, release_frame, pick_y)
+             for index, p in enumerate(parameters)]
+    with Pool() as pool:
+        for done, _ in enumerate(pool.imap_unordered(simulate, tasks)):
+            sys.stdout.write("\rSimulation: {:2} / {:2}".format(done + 1, length))
+    print()
+
+    chunk = 60
+    tasks = [(states_path, range(start, min(start + chunk, num_frame)), alphas,
+              release_frame, pick_y, grid, width, height)
+             for start in range(0, num_frame, chunk)]
+    with Pool(initializer=initRenderer) as pool:
+        done = 0
+        for n in pool.imap_unordered(render, tasks):
+            done += n
+            sys.stdout.write("\rFrame: {:4} / {:4}".format(done, num_frame))
+    print("\n")
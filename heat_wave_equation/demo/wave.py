@@ -1,13 +1,25 @@
+import os
+import sys
 import math
 import numpy
 from scipy.special import binom
 
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../waveequationimplicit/demo",
+    ))
+from grunwaldletnikov import GrunwaldLetnikovSum, grunwaldLetnikovCoefficients
+from timehistory import TimeHistory
+from tridiagonal import boundaryTridiagonal
+
 
 class Wave1D():
     def __init__(self, length, c, dx, dt, attenuation):
         # u(x, t) -> self.wave[t][x]
         self.length = length
-        self.wave = numpy.zeros((3, self.length))
+        self.wave = TimeHistory(3, self.length)
+        self.rhs = numpy.zeros(self.length)
 
         self.c = c
         self.dx = dx
@@ -29,34 +41,39 @@ class Wave1D():
         self.R = 0.0
 
     def initMatrix(self):
-        mat = numpy.zeros((self.length, self.length))
-
-        mat[0][0] = self.beta
-        mat[0][1] = self.alpha * (1 + self.L)
-
-        last = self.length - 1
-        for i in range(1, last):
-            mat[i][i - 1] = self.alpha
-            mat[i][i] = self.beta
-            mat[i][i + 1] = self.alpha
-
-        mat[last][last - 1] = self.alpha * (1 + self.R)
-        mat[last][last] = self.beta
-
-        self.a = mat
+        self.solver = boundaryTridiagonal(
+            self.length, self.alpha, self.beta, self.L, self.R)
 
     def value(self):
         return self.wave[0]
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.wave[1] - 0.5 * self.wave[2],
+
+        # rhs = wave[1] - 0.5 * wave[2]
+        numpy.multiply(self.wave[2], -0.5, out=self.rhs)
+        self.rhs += self.wave[1]
+        numpy.multiply(
+            self.solver.solve(self.rhs, overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
+    def advance(self, nSteps, out=None):
+        """
+        Runs `nSteps` steps without drawing. The state after each step is written to
+        `out[i]`. `out` can be a preallocated array or a `numpy.memmap` of shape
+        `(nSteps, length)`. Returns `out`.
+        """
+        if out is None:
+            out = numpy.empty((nSteps, self.length))
+        for index in range(nSteps):
+            self.step()
+            out[index] = self.wave[0]
+        return out
+
     def reset(self):
         self.wave.fill(0)
 
@@ -76,13 +93,22 @@ class Wave1D():
 
 
 class HeatWave1D(Wave1D):
-    def __init__(self, length, c, dx, dt, alpha, attenuation):
+    def __init__(self, length, c, dx, dt, alpha, attenuation, memoryLength=None,
+                 nExponentials=24):
         # u(x, t) -> self.wave[t][x]
         self.length = length
         self.fracDiffDepth = 256
-        self.wave = numpy.zeros((self.fracDiffDepth, self.length))
+
+        # Fast mode. The fractional difference is approximated with sum of exponentials.
+        self.memory = None
+        if memoryLength is not None:
+            self.memory = GrunwaldLetnikovSum(length, memoryLength, nExponentials)
+            self.fracDiffDepth = self.memory.depth()
+
+        self.wave = TimeHistory(self.fracDiffDepth, self.length)
 
         self.field = numpy.zeros(self.length)
+        self.work = numpy.zeros(self.length)
 
         self.setParameters(c, dx, dt, alpha, attenuation)
         self.pick(0, 0)
@@ -102,57 +128,67 @@ class HeatWave1D(Wave1D):
         self.C1 = (self.c / self.dx)**2 * self.dt**(1 + self.alpha)
         self.C2 = -(1 + 2 * self.C1)
 
-        self.fracCoefficients = [(-1)**m * binom(1 + self.alpha, m)
-                                 for m in range(self.fracDiffDepth)]
+        if self.memory is None:
+            self.fracCoefficients = [(-1)**m * binom(1 + self.alpha, m)
+                                     for m in range(self.fracDiffDepth)]
+        else:
+            self.fracFit = self.memory.fit(
+                grunwaldLetnikovCoefficients(1 + self.alpha,
+                                             self.memory.memoryLength))
 
     def initMatrix(self):
-        mat = numpy.zeros((self.length, self.length))
-
-        mat[0][0] = self.C2
-        mat[0][1] = self.C1 * (1 + self.L)
-
-        last = self.length - 1
-        for i in range(1, last):
-            mat[i][i - 1] = self.C1
-            mat[i][i] = self.C2
-            mat[i][i + 1] = self.C1
-
-        mat[last][last - 1] = self.C1 * (1 + self.R)
-        mat[last][last] = self.C2
-
-        self.a = mat
+        self.solver = boundaryTridiagonal(
+            self.length, self.C1, self.C2, self.L, self.R)
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.fractionalDifference(),
+        numpy.multiply(
+            self.solver.solve(self.fractionalDifference(), overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
     def step_CN(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        right = numpy.roll(self.wave[1], 1)
-        right[0] = right[1] if self.L == 1 else 0
-        left = numpy.roll(self.wave[1], -1)
-        left[len(left) - 1] = left[len(left) - 2] if self.R == 1 else 0
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.fractionalDifference() - self.C1 *
-            (left - 2 * self.wave[1] + right),
+
+        rhs = self.fractionalDifference()
+
+        # work = left - 2 * wave[1] + right. The neighbours outside of the field are
+        # `wave[1]` itself at a free end, and 0 at a fixed end.
+        numpy.multiply(self.wave[1], -2, out=self.work)
+        self.work += self.wave.forward(1)
+        self.work += self.wave.backward(1)
+        if self.L == 1:
+            self.work[0] += self.wave[1][0]
+        if self.R == 1:
+            self.work[-1] += self.wave[1][-1]
+        self.work *= self.C1
+        rhs -= self.work
+        numpy.multiply(
+            self.solver.solve(rhs, overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
     def fractionalDifference(self):
+        if self.memory is not None:
+            self.memory.push(self.wave)
+            return self.memory.sum(self.wave, self.fracFit, self.field)
+
         self.field.fill(0)
         for m in range(1, len(self.wave)):
-            self.field += self.fracCoefficients[m] * self.wave[m]
+            numpy.multiply(self.wave[m], self.fracCoefficients[m], out=self.work)
+            self.field += self.work
         return self.field
 
     def reset(self):
         self.wave.fill(0)
+        if self.memory is not None:
+            self.memory.reset()
 
     def pick(self, x, y):
         self.pickX = int((self.length - 1) * numpy.clip(x, 0.0, 1.0))
@@ -162,7 +198,7 @@ class HeatWave1D(Wave1D):
 class Wave1DExplicit(Wave1D):
     def __init__(self, length, c, dx, dt, attenuation):
         self.length = length
-        self.wave = numpy.zeros((3, self.length))
+        self.wave = TimeHistory(3, self.length)
 
         self.c = c
         self.dt = dt
@@ -178,24 +214,25 @@ class Wave1DExplicit(Wave1D):
         self.beta = 2 * (1 - self.alpha)
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
-        self.wave[0][0] = 0
-        last = len(self.wave[0]) - 1
+        self.wave.rotate()
+        wave0, wave1, wave2 = self.wave[0], self.wave[1], self.wave[2]
+        wave0[0] = 0
+        last = len(wave0) - 1
 
         if self.boundaryCondition == 1:
-            self.wave[0][last] = self.attenuation * (
-                self.alpha * (self.wave[1][last - 1] + self.wave[1][last - 1])
-                + self.beta * self.wave[1][last] - self.wave[2][last])
+            wave0[last] = self.attenuation * (
+                self.alpha * (wave1[last - 1] + wave1[last - 1])
+                + self.beta * wave1[last] - wave2[last])
         else:
-            self.wave[0][last] = 0
+            wave0[last] = 0
 
         for x in range(1, last):
-            self.wave[0][x] = self.attenuation * (
-                self.alpha * (self.wave[1][x + 1] + self.wave[1][x - 1]) +
-                self.beta * self.wave[1][x] - self.wave[2][x])
+            wave0[x] = self.attenuation * (
+                self.alpha * (wave1[x + 1] + wave1[x - 1]) +
+                self.beta * wave1[x] - wave2[x])
 
         if self.pickY != 0:
-            self.wave[0][self.pickX] = self.pickY
+            wave0[self.pickX] = self.pickY
 
 
 wave1d = Wave1D(512, 40, 0.1, 1 / 60, 1)
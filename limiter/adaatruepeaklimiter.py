@@ -1,9 +1,18 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
 import math
 import scipy.signal as signal
 import soundfile
-from collections import deque
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../peak_hold_envelope/python",
+    )
+)
+from slidingmax import peakHold
 
 
 def adaa1Bypass(x):
@@ -94,39 +103,6 @@ def adaa2CosineWindow(x):
     return y
 
 
-def peakHold(sig, holdTime):
-    """
-    sig: 入力信号。
-    holdTime: ホールド時間。単位はサンプル数。
-    """
-    out = np.empty(len(sig))
-    buffer = deque([0 for _ in range(holdTime)])
-    hold = deque([])
-    for i in range(len(sig)):
-        x0 = sig[i]
-
-        if len(hold) > 0:
-            idx = len(hold) - 1
-            while idx >= 0:
-                if hold[idx] < x0:
-                    hold.pop()
-                else:
-                    break
-                idx -= 1
-
-        hold.append(x0)
-
-        buffer.append(x0)
-        delayOut = buffer.popleft()
-
-        if len(hold) > 0 and delayOut == hold[0]:
-            hold.popleft()
-
-        out[i] = hold[0] if len(hold) > 0 else 0
-
-    return out
-
-
 def applyCharacteristicCurve(amp, threshold):
     with np.errstate(divide="ignore", invalid="ignore"):
         return np.where(amp > threshold, threshold / amp, 1)
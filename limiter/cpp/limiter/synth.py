@@ -1,9 +1,17 @@
+import os
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 import scipy.signal as signal
 import soundfile
 
-from collections import deque
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../../peak_hold_envelope/python",
+    )
+)
+from slidingmax import peakHold
 
 def nextTime(rng, rate):
     """
@@ -41,34 +49,6 @@ def makeTriangleFir(delay):
     )
     return fir / np.sum(fir)
 
-def peakHold(sig, holdTime, neutral=0):
-    out = np.empty(len(sig))
-    buffer = deque([0 for _ in range(holdTime)])
-    hold = deque([])
-    for i in range(len(sig)):
-        x0 = sig[i]
-
-        # Remove existing hold values which is less than new hold value.
-        if len(hold) > 0:
-            idx = len(hold) - 1
-            while idx >= 0:
-                if hold[idx] < x0:
-                    hold.pop()
-                else:
-                    break
-                idx -= 1
-
-        hold.append(x0)  # Add new hold value to hold buffer.
-
-        buffer.append(x0)
-        delayOut = buffer.popleft()
-        if len(hold) > 0 and delayOut == hold[0]:
-            hold.popleft()
-
-        out[i] = hold[0] if len(hold) > 0 else neutral
-
-    return out
-
 def renderDoubleAverageFilterTestSignal():
     samplerate = 48000
     hold = 32
@@ -0,0 +1,150 @@
+"""
+Streaming version of `applyLimiter` in `lighttruepeaklimiter.py`.
+
+`applyLimiter` reads gain up to `holdTime - 1` samples ahead. `StreamingLimiter` keeps
+the peak hold state, the not yet resolved gain, and the input delayed by the lookahead,
+so output is delayed by `holdTime - 1` samples within a stream. Concatenation of all
+outputs including `flush()` is the same as `applyLimiter` applied to the whole signal.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+import soundfile
+
+from lighttruepeaklimiter import applyCharacteristicCurve, applyLimiter, getTriangleWindow
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../peak_hold_envelope/python",
+    )
+)
+from slidingmax import SlidingMax
+
+
+class StreamingLimiter:
+    def __init__(self, holdTime: int, threshold: float = 1.0):
+        """
+        holdTime: ホールド時間。単位はサンプル数。
+        threshold: リミッタのしきい値。
+        """
+        self.holdTime = holdTime
+        self.threshold = threshold
+        self.fir = getTriangleWindow(holdTime)
+        self.reset()
+
+    def reset(self):
+        self.peakHold = SlidingMax(self.holdTime)
+        self.gain = np.empty(0)
+        self.delay = None
+
+    def process(self, sig, absed=None):
+        """
+        sig: 入力信号のブロック。 2 次元のときは `(frame, channel)` 。
+        absed: ピークの検出に使う信号。省略すると `sig` の絶対値。
+
+        Returns output which is ready. The length may differ from `sig`.
+        """
+        sig = np.asarray(sig, dtype=np.float64)
+        if absed is None:
+            absed = np.abs(sig) if sig.ndim == 1 else np.max(np.abs(sig), axis=1)
+
+        hold = self.peakHold.process(absed)
+        gain = applyCharacteristicCurve(hold, self.threshold)
+        self.gain = np.concatenate((self.gain, gain))
+        self.delay = sig if self.delay is None else np.concatenate((self.delay, sig))
+
+        nOut = len(self.delay) - (self.holdTime - 1)
+        if nOut <= 0:
+            return self.delay[:0]
+
+        pending = self.gain[len(self.gain) - len(self.delay) :]
+        smoothed = np.convolve(pending, self.fir, mode="valid")
+        out = self._applyGain(smoothed[:nOut])
+        self._keepTail()
+        return out
+
+    def flush(self):
+        """
+        Returns remaining output. Gain after the end of input is treated as 0, which is
+        the same as `np.convolve` in `applyLimiter`.
+        """
+        if self.delay is None or len(self.delay) == 0:
+            self.reset()
+            return np.empty(0)
+
+        # `self.gain` has `holdTime - 1` samples of history to make `np.convolve` sum
+        # the partially overlapping terms in the same order as the whole-array version.
+        smoothed = np.convolve(self.gain, self.fir)[self.holdTime - 1 :]
+        out = self._applyGain(smoothed[len(smoothed) - len(self.delay) :])
+        self.reset()
+        return out
+
+    def _applyGain(self, smoothed):
+        nOut = len(smoothed)
+        if self.delay.ndim > 1:
+            smoothed = smoothed[:, np.newaxis]
+        out = self.delay[:nOut] * smoothed
+        self.delay = self.delay[nOut:]
+        return out
+
+    def _keepTail(self):
+        keep = len(self.delay) + self.holdTime - 1
+        self.gain = self.gain[max(len(self.gain) - keep, 0) :]
+
+
+def limitBlocks(blocks, holdTime: int, threshold: float = 1.0):
+    """
+    Generator which applies `StreamingLimiter` to an iterable of blocks.
+    """
+    limiter = StreamingLimiter(holdTime, threshold)
+    for block in blocks:
+        out = limiter.process(block)
+        if len(out) > 0:
+            yield out
+    out = limiter.flush()
+    if len(out) > 0:
+        yield out
+
+
+def limitFile(inputPath, outputPath, holdTime: int, blockSize: int = 65536):
+    """
+    Memory usage depends on `blockSize` and `holdTime`, not on the length of input.
+    """
+    info = soundfile.info(str(inputPath))
+    blocks = soundfile.blocks(str(inputPath), blocksize=blockSize, dtype="float64")
+    with soundfile.SoundFile(
+        str(outputPath),
+        "w",
+        samplerate=info.samplerate,
+        channels=info.channels,
+        subtype="FLOAT",
+    ) as outfile:
+        for out in limitBlocks(blocks, holdTime):
+            outfile.write(out)
+
+
+def testStreamingLimiter(nTest=64):
+    rng = np.random.default_rng(0)
+    for _ in range(nTest):
+        holdTime = int(rng.integers(2, 512))
+        sig = rng.normal(0, 1, int(rng.integers(holdTime, 16384)))
+        target = applyLimiter(sig, np.abs(sig), holdTime)
+
+        boundaries = np.sort(rng.integers(0, len(sig), 8))
+        out = np.concatenate(list(limitBlocks(np.split(sig, boundaries), holdTime)))
+        if not np.array_equal(target, out):
+            print(f"Test failed: holdTime={holdTime}, length={len(sig)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="Input audio file.")
+    parser.add_argument("output", help="Output audio file. Written as 32-bit float.")
+    parser.add_argument("--hold", type=int, default=128, help="Hold time in samples.")
+    parser.add_argument("--blocksize", type=int, default=65536)
+    args = parser.parse_args()
+
+    limitFile(args.input, args.output, args.hold, args.blocksize)
@@ -2,12 +2,14 @@ import argparse
 import collections
 import functools
 import itertools
+import json
 import matplotlib.pyplot as pyplot
 import numpy
 import sklearn.cluster
 import shutil
+from multiprocessing import Pool
 from pathlib import Path
-from extract import Sound
+from extract import load_features
 
 class Order:
     def __init__(self, func, feature, params):
@@ -22,6 +24,16 @@ def kmeans(features, n_clusters):
     ).fit(features)
     return (n_clusters, cluster.labels_, cluster.cluster_centers_)
 
+def minibatch_kmeans(features, n_clusters, batch_size=4096):
+    n_clusters = min(n_clusters, len(features))
+    cluster = sklearn.cluster.MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=batch_size,
+        n_init=3,
+        random_state=0,
+    ).fit(features)
+    return (n_clusters, cluster.labels_, cluster.cluster_centers_)
+
 def affinity_propagation(features, damping):
     cluster = sklearn.cluster.AffinityPropagation(
         damping=damping,
@@ -32,43 +44,84 @@ def affinity_propagation(features, damping):
     return (len(cluster.cluster_centers_), cluster.labels_,
             cluster.cluster_centers_)
 
+def prototype_affinity_propagation(features, damping, n_prototype=1024):
+    """
+    大きなデータ向けの Affinity Propagation 。ミニバッチ k-means で n_prototype 個の
+    代表点に量子化して、代表点に Affinity Propagation をかける。各点は自分の代表点の
+    クラスタに入る。メモリは O(n * dim + n_prototype^2) 。
+    """
+    if len(features) <= n_prototype:
+        return affinity_propagation(features, damping)
+
+    _, labels, prototypes = minibatch_kmeans(features, n_prototype)
+    n_clusters, prototype_labels, centers = affinity_propagation(
+        prototypes, damping)
+    if n_clusters == 0:
+        return (0, labels, centers)
+    return (n_clusters, prototype_labels[labels], centers)
+
 def compose_func(func, points, params):
     if params is not None:
         return functools.partial(func, points, *params)
     return functools.partial(func, points)
 
-def sort_data_by_label(data, n_clusters, labels):
-    bag = [[] for _ in range(n_clusters)]
-    for dat, label in zip(data, labels):
-        bag[label].append(dat)
-    return bag
-
-def recurse_clustering(depth, orders, sounds):
-    if len(sounds) <= 1:
-        return sounds
-
-    order = orders[depth]
-
-    clustering_func = compose_func(
-        order.func,
-        [getattr(sound, order.feature) for sound in sounds],
-        order.params,
-    )
+def split_cluster(order, features, columns, rows):
+    """
+    rows は特徴量の行列の行番号。 (クラスタごとの rows のリスト, centers) を返す。
+    """
+    start, end = columns[order.feature]
+    # features と同じ float32 のまま渡す。 float64 にすると大きな列で 2 倍のメモリを使う。
+    points = numpy.asarray(features[rows, start:end])
+    clustering_func = compose_func(order.func, points, order.params)
 
     n_clusters, labels, centers = clustering_func()
-    sounds = sort_data_by_label(sounds, n_clusters, labels)
-
-    depth += 1
-    if depth >= len(orders):
-        sounds.append(centers)
-        return sounds
-
-    sounds = [recurse_clustering(depth, orders, sound) for sound in sounds]
-    sounds.append(centers)
-    return sounds
+    if n_clusters == 0:  # Affinity Propagation が収束しなかった。
+        return ([rows], numpy.mean(points, axis=0, keepdims=True))
+    return ([rows[labels == label] for label in range(n_clusters)], centers)
 
-def start_clustering(orders, sounds):
-    return recurse_clustering(0, orders, sounds)
+def recurse_clustering(depth, orders, features, columns, rows):
+    """
+    返り値の木のノードは、葉なら {"rows": [...]} 、それ以外は
+    {"children": [...], "centers": ndarray} 。
+    """
+    if len(rows) <= 1 or depth >= len(orders):
+        return {"rows": rows.tolist()}
+
+    children, centers = split_cluster(orders[depth], features, columns, rows)
+    return {
+        "children": [
+            recurse_clustering(depth + 1, orders, features, columns, child)
+            for child in children
+        ],
+        "centers": centers,
+    }
+
+# ワーカーのグローバル変数。 init_worker で設定する。
+worker_features = None
+worker_columns = None
+
+def init_worker(feature_directory):
+    global worker_features, worker_columns
+    _, worker_features, worker_columns = load_features(feature_directory)
+
+def job_subtree(orders, rows):
+    return recurse_clustering(1, orders, worker_features, worker_columns, rows)
+
+def start_clustering(orders, feature_directory, processes=None):
+    """
+    1 段目は親プロセスで計算して、 2 段目以降の部分木をプロセスプールで並列に計算する。
+    """
+    _, features, columns = load_features(feature_directory)
+    rows = numpy.arange(len(features))
+    if len(rows) <= 1 or len(orders) <= 1:
+        return recurse_clustering(0, orders, features, columns, rows)
+
+    children, centers = split_cluster(orders[0], features, columns, rows)
+    with Pool(processes, initializer=init_worker,
+              initargs=(feature_directory,)) as pool:
+        subtrees = pool.starmap(
+            job_subtree, [(orders, child) for child in children], chunksize=1)
+    return {"children": subtrees, "centers": centers}
 
 def delete_previous_result(data_prefix):
     output_directory = Path("cluster") / Path(data_prefix)
@@ -80,62 +133,99 @@ def get_next_path(n_data, name, index, digits):
         return Path(f"{name}{index:0{digits}d}")
     return Path(f"{name}_outlier")
 
-def write_result(data_prefix, sounds, feature_names, depth=0):
+def count_node(node):
+    if "rows" in node:
+        return len(node["rows"])
+    return len(node["children"]) + 1  # 以前の形式の [cluster, ..., centers] の長さ。
+
+def write_result(output_directory,
+                 node,
+                 filepath,
+                 feature_names,
+                 link,
+                 depth=0):
     """
-    sounds = [
-        [[s0, s1, ...], centers],
-        [[s0, s1, ...], centers],
-        ...
-        [[s0, s1, ...], centers],
-        centers,
-    ]
+    clustering の結果をディレクトリの階層に書き出して、 manifest のノードを返す。
+    音声ファイルは link が "symlink" ならシンボリックリンク、 "copy" ならコピーで
+    置く。 "none" なら manifest にだけ書く。
     """
-    output_directory = Path("cluster") / data_prefix
     output_directory.mkdir(parents=True, exist_ok=True)
 
-    if isinstance(sounds[-1], numpy.ndarray):
-        numpy.save(str(output_directory / "centers.npy"), sounds.pop())
-
-    if isinstance(sounds[0], list):
-        digits = len(str(abs(len(sounds) - 1)))
-        for index, sound in enumerate(sounds):
-            next_prefix = data_prefix / get_next_path(
-                len(sound), feature_names[depth], index, digits)
-            write_result(next_prefix, sound, feature_names, depth + 1)
+    if "rows" in node:
+        files = [filepath[row] for row in node["rows"]]
+        for path in files:
+            if link == "symlink":
+                (output_directory / path.name).symlink_to(path.resolve())
+            elif link == "copy":
+                shutil.copy(path, output_directory)
+        return {"files": [str(path) for path in files]}
+
+    center_path = output_directory / "centers.npy"
+    numpy.save(str(center_path), node["centers"])
+
+    children = node["children"]
+    digits = len(str(abs(len(children) - 1)))
+    manifest_children = []
+    for index, child in enumerate(children):
+        name = get_next_path(
+            count_node(child), feature_names[depth], index, digits)
+        manifest_child = write_result(output_directory / name, child, filepath,
+                                      feature_names, link, depth + 1)
+        manifest_child["name"] = str(name)
+        manifest_children.append(manifest_child)
+    return {"centers": center_path.name, "children": manifest_children}
+
+def print_clusters(node, depth=0):
+    space = " " * depth
+    if "rows" in node:
+        print(space + f"{len(node['rows'])} sounds,")
         return
+    print(space + "[")
+    for child in node["children"]:
+        print_clusters(child, depth + 1)
+    print(space + "],")
 
-    for path in [snd.filepath for snd in sounds]:
-        shutil.copy(path, output_directory)
-
-def print_clusters(clusters, depth=0):
-    space = " " * depth
-    for c in clusters:
-        if isinstance(c, list):
-            print(space + "[",)
-            print_clusters(c, depth + 1)
-            print(space + "],")
-        elif isinstance(c, Sound):
-            pass
-        else:
-            print(space + str(type(c)) + ",")
-
-def clustering(data_prefix):
-    sounds = numpy.load(f"data/{data_prefix}.npy")
-
-    orders = [
+backends = {
+    "affinity": [
         Order(affinity_propagation, "envelope", (0.9,)),
         Order(affinity_propagation, "mfccdelta", (0.6,)),
         Order(affinity_propagation, "pitch", (0.5,)),
-    ]
+    ],
+    "prototype": [
+        Order(prototype_affinity_propagation, "envelope", (0.9,)),
+        Order(prototype_affinity_propagation, "mfccdelta", (0.6,)),
+        Order(prototype_affinity_propagation, "pitch", (0.5,)),
+    ],
+    "kmeans": [
+        Order(minibatch_kmeans, "envelope", (64,)),
+        Order(minibatch_kmeans, "mfccdelta", (16,)),
+        Order(minibatch_kmeans, "pitch", (8,)),
+    ],
+}
+
+def clustering(data_prefix, backend="affinity", link="symlink", processes=None):
+    """
+    affinity は sklearn の Affinity Propagation で、メモリが O(n^2) 。大きなライブラリ
+    には prototype か kmeans を使う。
+    """
+    orders = backends[backend]
 
     delete_previous_result(data_prefix)
 
-    # print_clusters(start_clustering(orders, sounds))
-    write_result(
-        Path(data_prefix),
-        start_clustering(orders, sounds),
-        [order.feature for order in orders],
-    )
+    feature_directory = Path("data") / Path(data_prefix)
+    filepath, _, _ = load_features(feature_directory)
+    tree = start_clustering(orders, feature_directory, processes)
+
+    # print_clusters(tree)
+    feature_names = [order.feature for order in orders]
+    output_directory = Path("cluster") / Path(data_prefix)
+    manifest = write_result(output_directory, tree, filepath, feature_names,
+                            link)
+    manifest["features"] = feature_names
+    manifest["backend"] = backend
+    manifest_path = output_directory / "manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=1)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -145,6 +235,21 @@ if __name__ == "__main__":
         metavar="src_name",
         type=str,
         help="source directory name. snd/src_name")
+    parser.add_argument(
+        "--backend",
+        choices=list(backends.keys()),
+        default="affinity",
+        help="clustering method. prototype and kmeans scale to large data.")
+    parser.add_argument(
+        "--link",
+        choices=["symlink", "copy", "none"],
+        default="symlink",
+        help="how to place sound files in the cluster directories.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of processes for subtrees.")
     args = parser.parse_args()
 
-    clustering(args.src_name)
+    clustering(args.src_name, args.backend, args.link, args.processes)
@@ -1,14 +1,30 @@
+"""
+特徴量は data/{src_name}/ に保存する。
+
+- features.npy : float32 の行列。 1 行が 1 ファイル。列の範囲は index.json の columns 。
+- index.json : パラメータ、列の範囲、各行のファイルのパスと更新時刻。
+
+再実行したときは、パス、更新時刻、サイズ、パラメータが一致する行を再利用して、
+追加または変更されたファイルだけを計算する。
+"""
+
 import argparse
 import functools
+import json
 import matplotlib.pyplot as pyplot
 import numpy
+import os
 import python_speech_features
 import soundfile
 import scipy.signal
 from multiprocessing import Pool
+from numpy.lib.format import open_memmap
 from pathlib import Path
 from pyfftw.interfaces.numpy_fft import fft, ifft
 
+NUMCEP = 26
+N_PITCH = 18
+
 def trim_feature(feature, n_frame):
     feature_step = feature.shape[0]
     if feature_step < n_frame:
@@ -132,8 +148,8 @@ def pitch_frame(data, samplerate, winlen, winstep, n_pitch, pitch_func):
 
 def extract_feature(data, samplerate, winstep, nfft, n_frame):
     winlen = nfft / samplerate
-    numcep = 26
-    n_pitch = 18
+    numcep = NUMCEP
+    n_pitch = N_PITCH
 
     mfcc = trim_feature(
         python_speech_features.mfcc(
@@ -162,10 +178,7 @@ def extract_feature(data, samplerate, winstep, nfft, n_frame):
                         mpm_nsd_type2)
     pitch = numpy.ravel(pitch)
     pitch[numpy.isnan(pitch)] = 0
-    pitch = numpy.concatenate((
-        pitch,
-        numpy.zeros(n_frame * n_pitch - len(pitch)),
-    ))
+    pitch = trim_data(pitch, n_frame * n_pitch)
 
     return (
         envelope,
@@ -180,19 +193,145 @@ class Sound:
         self.mfccdelta = mfccdelta
         self.pitch = pitch
 
-def get_feature(directory_path, nfft=1024, n_frame=100):
+def get_columns(n_frame):
+    """
+    特徴量の行列の列の範囲。 {name: (start, end)}
+    """
+    sizes = [
+        ("envelope", n_frame),
+        ("mfccdelta", 2 * n_frame * NUMCEP),
+        ("pitch", n_frame * N_PITCH),
+    ]
+    columns = {}
+    start = 0
+    for name, size in sizes:
+        columns[name] = (start, start + size)
+        start += size
+    return columns
+
+def get_file_key(path):
+    stat = path.stat()
+    return {
+        "path": str(path.resolve()),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+    }
+
+def extract_file(path, winstep, nfft, n_frame):
+    """
+    ワーカーで呼ぶ。音声は親プロセスから受け取らずに、ワーカーで読み込む。
+    """
+    data, samplerate = soundfile.read(str(path))
+    feature = extract_feature(data, samplerate, winstep, nfft, n_frame)
+    return numpy.concatenate(feature).astype(numpy.float32)
+
+def load_index(feature_directory):
+    index_path = Path(feature_directory) / "index.json"
+    if not index_path.exists():
+        return None
+    with open(index_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def get_feature(directory_path,
+                feature_directory,
+                nfft=1024,
+                n_frame=100,
+                processes=None):
+    """
+    directory_path 内の .wav の特徴量を feature_directory に保存して、
+    load_features の結果を返す。
+    """
     winstep = 0.01  # Frame length in second.
-
-    filepath = [path for path in directory_path.glob("*.wav")]
-    sound = [soundfile.read(str(path)) for path in filepath]
-
+    params = {
+        "winstep": winstep,
+        "nfft": nfft,
+        "n_frame": n_frame,
+        "numcep": NUMCEP,
+        "n_pitch": N_PITCH,
+    }
+    columns = get_columns(n_frame)
+    n_column = max(end for _, end in columns.values())
+
+    feature_directory = Path(feature_directory)
+    feature_directory.mkdir(parents=True, exist_ok=True)
+    feature_path = feature_directory / "features.npy"
+
+    filepath = sorted(directory_path.glob("*.wav"))
+    keys = [get_file_key(path) for path in filepath]
+
+    # パス、更新時刻、サイズ、パラメータが一致する行を再利用する。
+    cached_row = {}
+    previous = load_index(feature_directory)
+    if previous is not None and previous["params"] == params:
+        previous_features = numpy.load(feature_path, mmap_mode="r")
+        for row, key in enumerate(previous["files"]):
+            cached_row[tuple(key.values())] = row
+    else:
+        previous_features = None
+
+    tmp_path = feature_directory / "features.tmp.npy"
+    features = open_memmap(
+        tmp_path,
+        mode="w+",
+        dtype=numpy.float32,
+        shape=(len(filepath), n_column),
+    )
+    new_rows = []
+    for row, key in enumerate(keys):
+        cached = cached_row.get(tuple(key.values()))
+        if cached is None:
+            new_rows.append(row)
+        else:
+            features[row] = previous_features[cached]
+    del previous_features
+
+    n_cached = len(filepath) - len(new_rows)
+    print(f"{n_cached} cached, {len(new_rows)} to extract.")
     extract = functools.partial(
-        extract_feature, winstep=winstep, nfft=nfft, n_frame=n_frame)
-
-    with Pool() as pool:
-        features = list(pool.starmap(extract, sound))
-
-    return [Sound(path, *data) for path, data in zip(filepath, features)]
+        extract_file, winstep=winstep, nfft=nfft, n_frame=n_frame)
+    with Pool(processes) as pool:
+        results = pool.imap(
+            extract, [filepath[row] for row in new_rows], chunksize=16)
+        for row, feature in zip(new_rows, results):
+            features[row] = feature
+    features.flush()
+    del features
+    os.replace(tmp_path, feature_path)
+
+    index = {"params": params, "columns": columns, "files": keys}
+    tmp_index_path = feature_directory / "index.tmp.json"
+    with open(tmp_index_path, "w", encoding="utf-8") as file:
+        json.dump(index, file, indent=1)
+    os.replace(tmp_index_path, feature_directory / "index.json")
+
+    return load_features(feature_directory)
+
+def load_features(feature_directory):
+    """
+    (filepath, features, columns) を返す。 features は mmap で読み込む。
+    """
+    feature_directory = Path(feature_directory)
+    index = load_index(feature_directory)
+    features = numpy.load(feature_directory / "features.npy", mmap_mode="r")
+    if index is None or len(index["files"]) != len(features):
+        raise ValueError(f"Broken feature data in {feature_directory}")
+    filepath = [Path(key["path"]) for key in index["files"]]
+    columns = {name: tuple(span) for name, span in index["columns"].items()}
+    return (filepath, features, columns)
+
+def load_sounds(feature_directory):
+    """
+    clustering.py と plot.py 用。 Sound の特徴量は features の行のビュー。
+    """
+    filepath, features, columns = load_features(feature_directory)
+    sounds = []
+    for path, row in zip(filepath, features):
+        feature = {
+            name: row[start:end]
+            for name, (start, end) in columns.items()
+        }
+        sounds.append(Sound(path, **feature))
+    return sounds
 
 def plot_envelope(filepath, envelope):
     for env, path in zip(envelope, filepath):
@@ -216,11 +355,4 @@ if __name__ == "__main__":
         print(f"{str(source_directory)} does not exist")
         exit()
 
-    Path("data").mkdir(exist_ok=True)
-
-    sounds = get_feature(source_directory)
-
-    # for snd in sounds:
-    #     print(len(snd.pitch))
-
-    numpy.save(f"data/{source_name}.npy", sounds)
+    get_feature(source_directory, Path("data") / Path(source_name))
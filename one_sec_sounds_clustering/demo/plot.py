@@ -8,7 +8,7 @@ import re
 import soundfile
 import subprocess
 from pathlib import Path
-from extract import Sound
+from extract import Sound, load_sounds
 
 class PlotData:
     def __init__(self, n_sound):
@@ -224,7 +224,7 @@ if __name__ == "__main__":
 
     Path("video").mkdir(parents=True, exist_ok=True)
 
-    sounds = numpy.load(f"data/{args.src_name}.npy")
+    sounds = load_sounds(Path("data") / Path(args.src_name))
 
     plot_data = PlotData(len(sounds))
 
@@ -233,7 +233,7 @@ if __name__ == "__main__":
     open_dir(
         root,
         [None for _ in range(len(clusters))],
-        sounds.tolist(),
+        sounds,
         plot_data,
     )
     print()
@@ -8,6 +8,19 @@ from collections import deque
 class PeakHold:
     lowest = np.finfo(np.float64).min
 
+    __slots__ = (
+        "backIndex",
+        "middleStart",
+        "workingIndex",
+        "middleEnd",
+        "frontIndex",
+        "frontMax",
+        "workingMax",
+        "middleMax",
+        "buffer",
+        "bufferMask",
+    )
+
     def __init__(S, maxLength: int):
         S.backIndex: int = 0
         S.middleStart: int = 0
@@ -48,14 +61,14 @@ class PeakHold:
 
             index: int = S.backIndex & S.bufferMask
             back: float = S.buffer[index]
-            S.buffer[index] = backPrev if preserveCurrentPeak else max([back, backPrev])
+            S.buffer[index] = backPrev if preserveCurrentPeak else max(back, backPrev)
         while S.size() > newSize:
             S.pop()
 
     def push(S, v: float):
         S.buffer[S.frontIndex & S.bufferMask] = v
         S.frontIndex += 1
-        S.frontMax = max([S.frontMax, v])
+        S.frontMax = max(S.frontMax, v)
 
     def pop(S):
         if S.backIndex == S.middleStart:
@@ -80,20 +93,20 @@ class PeakHold:
 
                 # Working index is close enough that it will be finished by the time the back is empty
                 backLength: int = S.middleStart - S.backIndex
-                workingLength: int = min([backLength, S.middleEnd - S.middleStart])
+                workingLength: int = min(backLength, S.middleEnd - S.middleStart)
                 S.workingIndex = S.middleStart + workingLength
 
                 # Since the front was not completely consumed, we re-calculate the front's maximum
                 i: int = S.middleEnd
                 while i != S.frontIndex:
-                    S.frontMax = max([S.frontMax, S.buffer[i & S.bufferMask]])
+                    S.frontMax = max(S.frontMax, S.buffer[i & S.bufferMask])
                     i += 1
 
                 # The index might not start at the end of the working block - compute the last bit immediately
                 i: int = S.middleEnd - 1
                 while i != S.workingIndex - 1:
                     S.buffer[i & S.bufferMask] = S.workingMax = max(
-                        [S.workingMax, S.buffer[i & S.bufferMask]]
+                        S.workingMax, S.buffer[i & S.bufferMask]
                     )
                     i -= 1
 
@@ -116,18 +129,82 @@ class PeakHold:
         if S.workingIndex != S.middleStart:
             S.workingIndex -= 1
             S.buffer[S.workingIndex & S.bufferMask] = S.workingMax = max(
-                [S.workingMax, S.buffer[S.workingIndex & S.bufferMask]]
+                S.workingMax, S.buffer[S.workingIndex & S.bufferMask]
             )
 
     def read(S):
         backMax: float = S.buffer[S.backIndex & S.bufferMask]
-        return max([backMax, S.middleMax, S.frontMax])
+        return max(backMax, S.middleMax, S.frontMax)
 
     def process(S, v: float):
         S.push(v)
         S.pop()
         return S.read()
 
+    def processBlock(S, sig, holdLength=None, preserveCurrentPeak: bool = False):
+        """
+        Block version of `process()`. Output and internal state are the same as calling
+        `process()` for each sample.
+
+        `holdLength` is an optional array of the same length as `sig`. When
+        `holdLength[i]` differs from the current size, `set()` is called before
+        processing `sig[i]`.
+        """
+        sig = np.asarray(sig, dtype=np.float64)
+        out = np.empty(len(sig))
+
+        start = 0
+        while start < len(sig):
+            end = len(sig)
+            if holdLength is not None:
+                if holdLength[start] != S.size():
+                    S.set(int(holdLength[start]), preserveCurrentPeak)
+                changed = np.flatnonzero(holdLength[start:] != holdLength[start])
+                if len(changed) > 0:
+                    end = start + changed[0]
+            S._processSegment(sig[start:end], out[start:end])
+            start = end
+        return out
+
+    def _processSegment(S, sig, out):
+        i = 0
+        while i < len(sig):
+            # Swap of back, middle and front happens when `backIndex` reaches
+            # `middleStart`. That sample goes through the per-sample path.
+            length = min(S.middleStart - S.backIndex, len(sig) - i)
+            if length <= 0:
+                out[i] = S.process(sig[i])
+                i += 1
+                continue
+
+            # Between swaps, each sample is processed as following:
+            # 1. `push()` writes input to front, and updates `frontMax`.
+            # 2. `pop()` advances back, and accumulates `workingMax` downwards.
+            # 3. `read()` takes maximum of back, middle and front.
+            # All of them reduce to cumulative maximums.
+            x = sig[i : i + length]
+
+            S.buffer[(S.frontIndex + np.arange(length)) & S.bufferMask] = x
+            frontMax = np.maximum.accumulate(np.hstack((S.frontMax, x)))[1:]
+
+            nWorking = min(length, S.workingIndex - S.middleStart)
+            if nWorking > 0:
+                working = (S.workingIndex - 1 - np.arange(nWorking)) & S.bufferMask
+                workingMax = np.maximum.accumulate(
+                    np.hstack((S.workingMax, S.buffer[working]))
+                )[1:]
+                S.buffer[working] = workingMax
+                S.workingMax = workingMax[-1]
+                S.workingIndex -= nWorking
+
+            back = S.buffer[(S.backIndex + 1 + np.arange(length)) & S.bufferMask]
+            out[i : i + length] = np.maximum(np.maximum(back, S.middleMax), frontMax)
+
+            S.frontIndex += length
+            S.backIndex += length
+            S.frontMax = frontMax[-1]
+            i += length
+
 
 def peakHold2(sig, holdTime, neutral=0):
     out = np.zeros_like(sig)
@@ -137,6 +214,14 @@ def peakHold2(sig, holdTime, neutral=0):
     return out
 
 
+def peakHoldBlock(sig, holdTime, blockSize=512):
+    out = np.zeros_like(sig)
+    ph = PeakHold(holdTime)
+    for i in range(0, len(sig), blockSize):
+        out[i : i + blockSize] = ph.processBlock(sig[i : i + blockSize])
+    return out
+
+
 def peakHoldTarget(sig, holdTime, neutral=0):
     out = np.zeros_like(sig)
     buffer = deque([0 for _ in range(holdTime)])
@@ -218,6 +303,9 @@ if __name__ == "__main__":
 
     holdedTarget = peakHoldTarget(np.abs(sig), holdtime)
     holdedSmithPy = peakHold2(np.abs(sig), holdtime)
+    holdedSmithBlock = peakHoldBlock(np.abs(sig), holdtime)
+    if not np.array_equal(holdedSmithPy, holdedSmithBlock):
+        print("Block processing doesn't match to per sample processing.")
     holdedSmithCpp, fs = soundfile.read("snd/output_peak.wav")
     delayed = np.hstack((np.zeros(delay), sig[:-delay]))
 
@@ -6,6 +6,7 @@ import soundfile
 from pathlib import Path
 from multiprocessing import Pool
 from collections import deque
+from slidingmax import slidingMax
 
 def plotSignal(signals, labels, title, legendLocation=0):
     plt.figure(figsize=(6, 3.5), tight_layout=True)
@@ -172,6 +173,20 @@ def idealPeakHoldFast(sig, holdTime, neutral=0):
 
     return out
 
+def testSlidingMax(nTest=256):
+    """
+    Check that block based `slidingMax` matches `idealPeakHoldFast`.
+    """
+    rng = np.random.default_rng(0)
+    for _ in range(nTest):
+        holdTime = int(rng.integers(1, 256))
+        blockSize = int(rng.integers(1, 4096))
+        sig = pulseNoise(rng, 1 / 8, 8192)
+        fast = idealPeakHoldFast(sig, holdTime)
+        vectorized = slidingMax(sig, holdTime, blockSize=blockSize)
+        if not np.array_equal(fast, vectorized):
+            print(f"Test failed: holdTime={holdTime}, blockSize={blockSize}")
+
 def plotIdealHoldExample():
     rng = np.random.default_rng(3)
 
@@ -259,5 +274,6 @@ if __name__ == "__main__":
     plotForwardHoldExample()
     plotSmoothingExample()
     plotIdealHoldExample()
+    # testSlidingMax()
     # testIdealHoldRandom()
     # testIdealHoldFile(Path("../data"))
@@ -0,0 +1,92 @@
+"""
+Sliding window maximum/minimum for whole NumPy arrays.
+
+Uses van Herk/Gil-Werman algorithm. The input is split into blocks of the window size,
+and the maximum of a window is computed from the suffix maximum of one block and the
+prefix maximum of the next block. Cost is O(n) regardless of the window size.
+
+`SlidingMax` carries the last `windowSize - 1` samples across calls to `process()`, so
+a long signal can be processed in fixed size blocks. The output is identical to
+`idealPeakHoldFast` in `hold.py` when the input is non-negative (e.g. `np.abs(sig)`) and
+`initial` is 0.
+"""
+
+import numpy as np
+
+
+class SlidingMax:
+    ufunc = np.maximum
+    padding = -np.inf
+
+    def __init__(self, windowSize: int, initial: float = 0):
+        """
+        windowSize: Window length in samples. Must be 1 or greater.
+        initial: Value assumed to be in the window before the first input sample.
+        """
+        if windowSize < 1:
+            raise ValueError(f"windowSize must be 1 or greater: {windowSize}")
+        self.windowSize = int(windowSize)
+        self.reset(initial)
+
+    def reset(self, initial: float = 0):
+        self.history = np.full(self.windowSize - 1, initial, dtype=np.float64)
+
+    def process(self, sig):
+        """
+        Returns the maximum of `windowSize` samples ending at each sample of `sig`.
+        """
+        sig = np.asarray(sig, dtype=np.float64)
+        if len(sig) == 0:
+            return np.empty(0)
+
+        W = self.windowSize
+        padded = np.concatenate((self.history, sig))
+        self.history = padded[len(padded) - (W - 1) :].copy()
+        if W == 1:
+            return padded
+
+        nBlock = -(-len(padded) // W)
+        blocks = np.full(nBlock * W, type(self).padding)
+        blocks[: len(padded)] = padded
+        blocks = blocks.reshape((nBlock, W))
+
+        prefix = type(self).ufunc.accumulate(blocks, axis=1).ravel()
+        suffix = type(self).ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+
+        n = len(sig)
+        return type(self).ufunc(suffix[:n], prefix[W - 1 : W - 1 + n])
+
+
+class SlidingMin(SlidingMax):
+    ufunc = np.minimum
+    padding = np.inf
+
+
+def slidingMax(sig, windowSize: int, initial: float = 0, blockSize: int = 65536):
+    """
+    Whole array version of `SlidingMax`. `sig` is processed in chunks of `blockSize` to
+    bound the size of temporary arrays.
+    """
+    return _processInBlocks(SlidingMax(windowSize, initial), sig, blockSize)
+
+
+def slidingMin(sig, windowSize: int, initial: float = 0, blockSize: int = 65536):
+    return _processInBlocks(SlidingMin(windowSize, initial), sig, blockSize)
+
+
+def _processInBlocks(processor, sig, blockSize):
+    out = np.empty(len(sig))
+    for start in range(0, len(sig), blockSize):
+        end = start + blockSize
+        out[start:end] = processor.process(sig[start:end])
+    return out
+
+
+def peakHold(sig, holdTime: int, neutral: float = 0):
+    """
+    Drop-in replacement of the deque based `peakHold` in the limiter scripts.
+
+    sig: Non-negative input signal.
+    holdTime: Hold time in samples.
+    """
+    return slidingMax(sig, holdTime, neutral)
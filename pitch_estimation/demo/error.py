@@ -9,8 +9,17 @@ from pitch import *
 def hz_to_cent(frequency):
     return 1200 * numpy.log2(frequency / 440)
 
-def mean_absolute_error(true_value, data_value):
-    return numpy.nanmean(numpy.abs(true_value - data_value))
+def mean_absolute_error(true_value, data_value, axis=None):
+    return numpy.nanmean(numpy.abs(true_value - data_value), axis=axis)
+
+def error_grid(store, method):
+    """
+    セルごとの平均絶対誤差 [cent] 。形は store.shape 。 method の列だけを読む。
+    """
+    true_cent = hz_to_cent(store.frequency)[:, numpy.newaxis, numpy.newaxis]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return mean_absolute_error(
+            true_cent, hz_to_cent(store.pitch(method)), axis=2)
 
 def plot_error_per_frequency(errors, frequencies, xname, xlabel, signal_type):
     cmap = pyplot.get_cmap("inferno")
@@ -75,9 +84,8 @@ def plot_error_sum(error_sum, signal_type):
     pyplot.savefig(f"img/error_{signal_type}.png")
     pyplot.close()
 
-def plot_error_mesh(method, datas, signal_type, xtick, xlabel, ytick, ylabel):
-    error_2d = extract_error_2d_from_method(datas, method)
-    error_2d = numpy.log10(error_2d)
+def plot_error_mesh(method, store, signal_type, xtick, xlabel, ytick, ylabel):
+    error_2d = numpy.log10(error_grid(store, method))
     error_mesh = numpy.ma.masked_where(~numpy.isfinite(error_2d), error_2d)
 
     pyplot.figure(figsize=(12.8, 7.2))
@@ -111,57 +119,40 @@ def plot_error_mesh(method, datas, signal_type, xtick, xlabel, ytick, ylabel):
     pyplot.savefig(f"img/error_{signal_type}_{method}.png")
     pyplot.close()
 
-def extract_error_1d(datas):
-    errors = {method: [] for method in datas[0].pitch.keys()}
-    for data in datas:
-        true_cent = hz_to_cent(data.frequency)
-        for method, pitch in data.pitch.items():
-            errors[method].append(
-                mean_absolute_error(true_cent, hz_to_cent(pitch)))
+def extract_error_1d(store):
+    errors = {
+        method: list(error_grid(store, method)[:, 0])
+        for method in store.methods
+    }
     error_sum = {
         method: numpy.nanmean(error) for method, error in errors.items()
     }
     return (errors, error_sum)
 
-def gather_error_2d(datas):
-    errors = {method: [] for method in datas[0][0].pitch.keys()}
-    for error_index, data in enumerate(datas):
-        for error in errors.values():
-            error.append(0)
-        for i in range(0, len(data)):
-            for method, pitch in data[i].pitch.items():
-                mae = mean_absolute_error(
-                    hz_to_cent(data[i].frequency), hz_to_cent(pitch))
-                if numpy.isfinite(mae):
-                    errors[method][error_index] += mae
-    return errors
-
-def extract_error_2d(datas):
-    error_x = gather_error_2d(datas)
-    error_y = gather_error_2d(datas.T)
+def gather_error_2d(error_grids):
+    # 有限の誤差だけを足す。
+    return {
+        method: list(numpy.where(numpy.isfinite(grid), grid, 0).sum(axis=1))
+        for method, grid in error_grids.items()
+    }
+
+def extract_error_2d(store):
+    error_grids = {method: error_grid(store, method) for method in store.methods}
+    error_x = gather_error_2d(error_grids)
+    error_y = gather_error_2d(
+        {method: grid.T for method, grid in error_grids.items()})
     error_sum = {
         method: numpy.nanmean(error) for method, error in error_x.items()
     }
     return (error_x, error_y, error_sum)
 
-def extract_error_2d_from_method(datas, method):
-    error = numpy.zeros(datas.shape)
-    for x in range(len(datas)):
-        for y in range(len(datas[x])):
-            error[x][y] = mean_absolute_error(
-                hz_to_cent(datas[x][y].frequency),
-                hz_to_cent(datas[x][y].pitch[method]),
-            )
-    return error
-
 def plot_sin_wave(path):
-    signal_type = path.stem
-    datas = numpy.load(str(path))
-    error_per_freq, error_sum = extract_error_1d(datas)
-    frequencies = [data.frequency for data in datas]
+    store = ResultStore(path)
+    signal_type = store.signal_type
+    error_per_freq, error_sum = extract_error_1d(store)
     plot_error_per_frequency(
         error_per_freq,
-        frequencies,
+        store.frequency,
         "frequency",
         "Sine Wave Frequency[Hz]",
         signal_type,
@@ -169,23 +160,23 @@ def plot_sin_wave(path):
     plot_error_sum(error_sum, signal_type)
 
 def plot_sin_with_noise(path):
-    signal_type = path.stem
+    store = ResultStore(path)
+    signal_type = store.signal_type
 
-    datas = numpy.load(str(path))
-    error_per_freq, error_per_ratio, error_sum = extract_error_2d(datas)
+    error_per_freq, error_per_ratio, error_sum = extract_error_2d(store)
 
-    frequencies = [data[0].frequency for data in datas]
-    ratios = [data[0].misc["noise_ratio"] for data in datas.T]
+    frequencies = store.frequency
+    ratios = store.param
 
     # mpm_nsd_type2 のエラーがとても大きいので別に分ける。
     # error_per_freq.pop("mpm_nsd_type2")
     # error_per_ratio.pop("mpm_nsd_type2")
     # error_sum.pop("mpm_nsd_type2")
 
-    for func in pitch_functions:
+    for method in store.methods:
         plot_error_mesh(
-            func.__name__,
-            datas,
+            method,
+            store,
             signal_type,
             ratios,
             "Noise Ratio",
@@ -210,18 +201,18 @@ def plot_sin_with_noise(path):
     plot_error_sum(error_sum, signal_type)
 
 def plot_sin_modulation(path):
-    signal_type = path.stem
+    store = ResultStore(path)
+    signal_type = store.signal_type
 
-    datas = numpy.load(str(path))
-    error_per_freq, error_per_ratio, error_sum = extract_error_2d(datas)
+    error_per_freq, error_per_ratio, error_sum = extract_error_2d(store)
 
-    frequencies = [data[0].frequency for data in datas]
-    ratios = [data[0].misc["mod_freq"] for data in datas.T]
+    frequencies = store.frequency
+    ratios = store.param
 
-    for func in pitch_functions:
+    for method in store.methods:
         plot_error_mesh(
-            func.__name__,
-            datas,
+            method,
+            store,
             signal_type,
             ratios,
             "Modulator Frequency [Hz]",
@@ -245,9 +236,8 @@ def plot_sin_modulation(path):
     )
     plot_error_sum(error_sum, signal_type)
 
-data_dir = Path("data")
-
-# plot_sin_wave(data_dir / Path("sin_wave.npy"))
-# plot_sin_with_noise(data_dir / Path("sin_with_noise.npy"))
-plot_sin_modulation(data_dir / Path("sin_am.npy"))
-plot_sin_modulation(data_dir / Path("sin_fm.npy"))
+# data_dir は evaluation.py で定義。
+# plot_sin_wave(data_dir / "sin_wave")
+# plot_sin_with_noise(data_dir / "sin_with_noise")
+plot_sin_modulation(data_dir / "sin_am")
+plot_sin_modulation(data_dir / "sin_fm")
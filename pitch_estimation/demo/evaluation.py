@@ -1,8 +1,11 @@
-import functools
-import multiprocessing
+from pathlib import Path
 
+from harness import ResultStore, open_store, run_evaluation
 from pitch import *
 
+# 結果の保存先。形式は harness.py を参照。
+data_dir = Path("data")
+
 def generate_sin(duration, samplerate, frequency):
     length = int(duration * samplerate)
     phase = numpy.linspace(0, 2 * numpy.pi * frequency * duration, length)
@@ -27,101 +30,58 @@ def generate_sin_fm(duration, samplerate, car_freq, mod_freq):
     phase = (car_phase + numpy.sin(mod_phase)).cumsum()
     return numpy.sin(phase)
 
-class SignalData():
-    def __init__(self, signal, samplerate, winlen, winstep, frequency, misc):
-        self.signal = signal
-        self.samplerate = samplerate
-        self.winlen = winlen
-        self.winstep = winstep
-        self.frequency = frequency
-        self.misc = misc
-
-        self.pitch = {}
-        for pitch_func in pitch_functions:
-            self.pitch[pitch_func.__name__] = pitch_frame(
-                signal, samplerate, winlen, winstep, pitch_func)
-
 def test_sin_wave(samplerate, duration, winlen, winstep, freq_low, freq_high,
                   num):
     frequency = numpy.geomspace(freq_low, freq_high, num)
-    signals = [generate_sin(duration, samplerate, freq) for freq in frequency]
-    result = [
-        SignalData(sig, samplerate, winlen, winstep, freq, None)
-        for sig, freq in zip(signals, frequency)
-    ]
-    numpy.save("data/sin_wave.npy", result)
-
-def job_sin_with_noise(samplerate, duration, winlen, winstep, frequency,
-                       noise_ratio):
-    return SignalData(
-        generate_sin_with_noise(duration, samplerate, frequency, noise_ratio),
-        samplerate,
-        winlen,
-        winstep,
-        frequency,
-        {"noise_ratio": noise_ratio},
-    )
+    generate_signals = lambda: [[generate_sin(duration, samplerate, freq)]
+                                for freq in frequency]
+    open_store(data_dir / "sin_wave", "sin_wave", generate_signals, samplerate,
+               winlen, winstep, frequency)
+    run_evaluation(data_dir / "sin_wave")
 
 def test_sin_with_noise(samplerate, duration, winlen, winstep, freq_low,
                         freq_high, ratio_low, ratio_high, num):
     frequency = numpy.geomspace(freq_low, freq_high, num)
     noise_ratio = numpy.geomspace(ratio_low, ratio_high, num)
-    result = []
-    for freq in frequency:
-        args = [(samplerate, duration, winlen, winstep, freq, ratio)
-                for ratio in noise_ratio]
-        with multiprocessing.Pool() as pool:
-            result.append(pool.starmap(job_sin_with_noise, args))
-    numpy.save(f"data/sin_with_noise.npy", result)
-
-def job_sin_modulator(samplerate, duration, winlen, winstep, car_freq, mod_freq,
-                      generation_func):
-    return SignalData(
-        generation_func(duration, samplerate, car_freq, mod_freq),
-        samplerate,
-        winlen,
-        winstep,
-        car_freq,
-        {"mod_freq": mod_freq},
-    )
+    generate_signals = lambda: [[
+        generate_sin_with_noise(duration, samplerate, freq, ratio)
+        for ratio in noise_ratio
+    ] for freq in frequency]
+    open_store(data_dir / "sin_with_noise", "sin_with_noise", generate_signals,
+               samplerate, winlen, winstep, frequency, "noise_ratio",
+               noise_ratio)
+    run_evaluation(data_dir / "sin_with_noise")
+
+def test_sin_modulator(signal_type, generation_func, samplerate, duration,
+                       winlen, winstep, car_freq_low, car_freq_high,
+                       mod_freq_low, mod_freq_high, num):
+    car_freqs = numpy.geomspace(car_freq_low, car_freq_high, num)
+    mod_freqs = numpy.geomspace(mod_freq_low, mod_freq_high, num)
+    generate_signals = lambda: [[
+        generation_func(duration, samplerate, car_freq, mod_freq)
+        for mod_freq in mod_freqs
+    ] for car_freq in car_freqs]
+    open_store(data_dir / signal_type, signal_type, generate_signals,
+               samplerate, winlen, winstep, car_freqs, "mod_freq", mod_freqs)
+    run_evaluation(data_dir / signal_type)
 
 def test_sin_am(samplerate, duration, winlen, winstep, car_freq_low,
                 car_freq_high, mod_freq_low, mod_freq_high, num):
-    car_freqs = numpy.geomspace(car_freq_low, car_freq_high, num)
-    mod_freqs = numpy.geomspace(mod_freq_low, mod_freq_high, num)
-    result = []
-    for car_freq in car_freqs:
-        args = [(
-            samplerate,
-            duration,
-            winlen,
-            winstep,
-            car_freq,
-            mod_freq,
-            generate_sin_am,
-        ) for mod_freq in mod_freqs]
-        with multiprocessing.Pool() as pool:
-            result.append(pool.starmap(job_sin_modulator, args))
-    numpy.save(f"data/sin_am.npy", result)
+    test_sin_modulator("sin_am", generate_sin_am, samplerate, duration, winlen,
+                       winstep, car_freq_low, car_freq_high, mod_freq_low,
+                       mod_freq_high, num)
 
 def test_sin_fm(samplerate, duration, winlen, winstep, car_freq_low,
                 car_freq_high, mod_freq_low, mod_freq_high, num):
-    car_freqs = numpy.geomspace(car_freq_low, car_freq_high, num)
-    mod_freqs = numpy.geomspace(mod_freq_low, mod_freq_high, num)
-    result = []
-    for car_freq in car_freqs:
-        args = [(
-            samplerate,
-            duration,
-            winlen,
-            winstep,
-            car_freq,
-            mod_freq,
-            generate_sin_fm,
-        ) for mod_freq in mod_freqs]
-        with multiprocessing.Pool() as pool:
-            result.append(pool.starmap(job_sin_modulator, args))
-    numpy.save(f"data/sin_fm.npy", result)
+    test_sin_modulator("sin_fm", generate_sin_fm, samplerate, duration, winlen,
+                       winstep, car_freq_low, car_freq_high, mod_freq_low,
+                       mod_freq_high, num)
+
+def rerun_methods(signal_type, methods):
+    """
+    保存済みの信号で methods の手法だけを計算しなおす。手法を変更したときに使う。
+    """
+    run_evaluation(data_dir / signal_type, methods, overwrite=True)
 
 if __name__ == "__main__":
     samplerate = 16000
@@ -148,3 +108,6 @@ if __name__ == "__main__":
     #             mod_freq_low, mod_freq_high, num)
     # test_sin_fm(samplerate, duration * 4, winlen, winstep, freq_low, freq_high,
     #             mod_freq_low, mod_freq_high, num)
+
+    # 手法を変更したときは、その手法だけを保存済みの信号で計算しなおす。
+    # rerun_methods("sin_wave", ["yin_cmnd_type1"])
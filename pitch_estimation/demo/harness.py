@@ -0,0 +1,202 @@
+"""
+評価用のエンジンと結果の保存形式。
+
+テスト信号は create_store で 1 度だけ生成して保存し、 run_evaluation で共有メモリに
+のせてワーカーに渡す。タスクは (手法, パラメータのセル) ごとに分割し、ワーカーは
+フレームごとの推定値だけを返す。
+
+結果はディレクトリに列ごとに保存する。
+
+- meta.json : サンプリング周波数、窓、周波数とパラメータの軸。
+- signal.npy : 信号。形は (n_frequency, n_param, length) 。
+- pitch_{method}.npy : 推定値。形は (n_frequency, n_param, n_frame) 。
+
+.npy は mmap で読むので、 error.py は必要な手法の列だけを読み込む。計算済みの手法は
+run_evaluation で飛ばすので、一部の手法を変更したときはその列だけを計算しなおせる。
+"""
+
+import json
+import multiprocessing
+import numpy
+import os
+from multiprocessing import shared_memory
+from numpy.lib.format import open_memmap
+from pathlib import Path
+from types import SimpleNamespace
+
+from pitch import count_frame, pitch_frame, pitch_functions
+
+class ResultStore():
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / "meta.json", "r", encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.signal_type = self.meta["signal_type"]
+        self.samplerate = self.meta["samplerate"]
+        self.winlen = self.meta["winlen"]
+        self.winstep = self.meta["winstep"]
+        self.frequency = numpy.array(self.meta["frequency"])
+        self.param_name = self.meta["param_name"]
+        self.param = numpy.array(self.meta["param"])
+
+    @property
+    def shape(self):
+        return (len(self.frequency), len(self.param))
+
+    @property
+    def methods(self):
+        return [
+            func.__name__ for func in pitch_functions
+            if self.pitch_path(func.__name__).exists()
+        ]
+
+    def pitch_path(self, method):
+        return self.path / f"pitch_{method}.npy"
+
+    def signal(self):
+        return numpy.load(self.path / "signal.npy", mmap_mode="r")
+
+    def pitch(self, method):
+        return numpy.load(self.pitch_path(method), mmap_mode="r")
+
+    def cell(self, i, j):
+        """
+        plot.py の plot_pitch に渡せる形で 1 つのセルを返す。
+        """
+        misc = None if self.param_name is None else {
+            self.param_name: self.param[j]
+        }
+        return SimpleNamespace(
+            signal=numpy.array(self.signal()[i, j]),
+            samplerate=self.samplerate,
+            winlen=self.winlen,
+            winstep=self.winstep,
+            frequency=self.frequency[i],
+            misc=misc,
+            pitch={
+                method: numpy.array(self.pitch(method)[i, j])
+                for method in self.methods
+            },
+        )
+
+def create_store(path, signal_type, signals, samplerate, winlen, winstep,
+                 frequency, param_name=None, param=None):
+    """
+    signals の形は (len(frequency), len(param), length) 。 param_name が None のときは
+    (len(frequency), 1, length) 。既存の推定値は消す。
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for pitch_path in path.glob("pitch_*.npy"):
+        pitch_path.unlink()
+
+    numpy.save(path / "signal.npy", numpy.asarray(signals, dtype=numpy.float64))
+    meta = make_meta(signal_type, samplerate, winlen, winstep, frequency,
+                     param_name, param)
+    with open(path / "meta.json", "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+    return ResultStore(path)
+
+def make_meta(signal_type, samplerate, winlen, winstep, frequency,
+              param_name=None, param=None):
+    return {
+        "signal_type": signal_type,
+        "samplerate": samplerate,
+        "winlen": winlen,
+        "winstep": winstep,
+        "frequency": [float(freq) for freq in frequency],
+        "param_name": param_name,
+        "param": [0.0] if param is None else [float(p) for p in param],
+    }
+
+def open_store(path, signal_type, generate_signals, samplerate, winlen, winstep,
+               frequency, param_name=None, param=None):
+    """
+    meta.json と signal.npy が同じ条件で保存済みなら、そのまま開いて推定値を残す。
+    そうでなければ generate_signals() で信号を生成して create_store を呼ぶ。
+    """
+    path = Path(path)
+    meta = make_meta(signal_type, samplerate, winlen, winstep, frequency,
+                     param_name, param)
+    meta_path = path / "meta.json"
+    if meta_path.exists() and (path / "signal.npy").exists():
+        with open(meta_path, "r", encoding="utf-8") as file:
+            if json.load(file) == meta:
+                return ResultStore(path)
+    return create_store(path, signal_type, generate_signals(), samplerate,
+                        winlen, winstep, frequency, param_name, param)
+
+pitch_function_by_name = {func.__name__: func for func in pitch_functions}
+
+# ワーカーのグローバル変数。 init_worker で設定する。
+worker_memory = None
+worker_signal = None
+worker_setting = None
+
+def init_worker(memory_name, shape, setting):
+    global worker_memory, worker_signal, worker_setting
+    worker_memory = shared_memory.SharedMemory(name=memory_name)
+    worker_signal = numpy.ndarray(shape, dtype=numpy.float64,
+                                  buffer=worker_memory.buf)
+    worker_setting = setting
+
+def job_cell(task):
+    method, i, j = task
+    samplerate, winlen, winstep = worker_setting
+    pitch = pitch_frame(worker_signal[i, j], samplerate, winlen, winstep,
+                        pitch_function_by_name[method])
+    return (method, i, j, pitch)
+
+def run_evaluation(path, methods=None, processes=None, overwrite=False):
+    """
+    methods が None のときはすべての手法を計算する。 overwrite が False のときは
+    計算済みの手法を飛ばす。
+    """
+    store = ResultStore(path)
+    if methods is None:
+        methods = list(pitch_function_by_name.keys())
+    if not overwrite:
+        methods = [m for m in methods if not store.pitch_path(m).exists()]
+    if len(methods) == 0:
+        return store
+
+    signal = store.signal()
+    frame_len = int(store.samplerate * store.winlen)
+    frame_step = int(store.samplerate * store.winstep)
+    n_frame = count_frame(signal.shape[2], frame_len, frame_step)
+
+    # 途中で止まっても既存の列が壊れないように、一時ファイルに書いてから置き換える。
+    tmp_paths = {m: store.path / f"pitch_{m}.tmp.npy" for m in methods}
+    columns = {
+        m: open_memmap(tmp_paths[m], mode="w+", dtype=numpy.float64,
+                       shape=store.shape + (n_frame,))
+        for m in methods
+    }
+
+    memory = shared_memory.SharedMemory(create=True, size=signal.nbytes)
+    shared = numpy.ndarray(signal.shape, dtype=numpy.float64, buffer=memory.buf)
+    shared[:] = signal
+    del shared  # 残っていると memory.close() が失敗する。
+    try:
+        setting = (store.samplerate, store.winlen, store.winstep)
+        tasks = [(m, i, j) for m in methods
+                 for i in range(store.shape[0])
+                 for j in range(store.shape[1])]
+        with multiprocessing.Pool(
+                processes,
+                initializer=init_worker,
+                initargs=(memory.name, signal.shape, setting)) as pool:
+            chunksize = max(1, len(tasks) // (4 * (processes or os.cpu_count())))
+            for method, i, j, pitch in pool.imap_unordered(
+                    job_cell, tasks, chunksize=chunksize):
+                columns[method][i, j] = pitch
+    finally:
+        memory.close()
+        memory.unlink()
+
+    for column in columns.values():
+        column.flush()
+    del columns
+    for method in methods:
+        os.replace(tmp_paths[method], store.pitch_path(method))
+    return store
@@ -6,7 +6,8 @@ https://github.com/sevagh/pitch-detection/blob/master/src/yin.cpp
 
 import numpy
 import python_speech_features
-from pyfftw.interfaces.numpy_fft import fft, ifft
+import time
+from pyfftw.interfaces.numpy_fft import fft, ifft, irfft, rfft
 
 YIN_THRESHOLD = 0.3
 
@@ -191,13 +192,229 @@ def framesig(data, frame_len, frame_step):
         frame[i][:len(part)] = part[:]
     return frame
 
-def pitch_frame(data, samplerate, winlen, winstep, pitch_func=yin_cmnd_type2):
-    frame = python_speech_features.sigproc.framesig(
-        data,
-        frame_len=int(samplerate * winlen),
-        frame_step=int(samplerate * winstep),
-    )
-    return numpy.array([pitch_func(sig, samplerate) for sig in frame])
+### Batch ###
+# 以下の関数は (n_frame, frame_len) の行列を受け取り、全フレームをまとめて計算する。
+# 結果は 1 フレームずつの関数と丸め誤差の範囲で一致する。見つからなかった周期は -1 で表す。
+def autocorrelation_type1_batch(frame):
+    spec = rfft(frame, axis=1)
+    return irfft(spec.real**2 + spec.imag**2, n=frame.shape[1], axis=1)
+
+def autocorrelation_type2_batch(frame):
+    len_sig = frame.shape[1]
+    spec = rfft(frame, n=2 * len_sig, axis=1)
+    corr = irfft(spec.real**2 + spec.imag**2, n=2 * len_sig, axis=1)
+    return corr[:, :len_sig]
+
+def energy_batch(frame):
+    return (frame * frame)[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+def first_true(mask):
+    index = numpy.argmax(mask, axis=1)
+    return numpy.where(mask[numpy.arange(len(mask)), index], index, -1)
+
+def first_of_group(group):
+    """
+    ソート済みの group について、各グループの先頭で True となるマスクを返す。
+    """
+    first = numpy.ones(len(group), dtype=bool)
+    first[1:] = group[1:] != group[:-1]
+    return first
+
+def parabolic_interpolation_batch(array, x):
+    rows = numpy.arange(len(array))
+    last = array.shape[1] - 1
+    y0 = array[rows, x]
+    ym1 = array[rows, numpy.maximum(x - 1, 0)]
+    yp1 = array[rows, numpy.minimum(x + 1, last)]
+    denom = yp1 + ym1 - 2 * y0
+    delta = ym1 - yp1
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        result = numpy.where(denom == 0, x, x + delta / (2 * denom))
+    result = numpy.where(x >= last, numpy.where(y0 <= ym1, x, x - 1), result)
+    return numpy.where(x < 1, numpy.where(y0 <= yp1, x, x + 1), result)
+
+def period_to_frequency(samplerate, period, valid):
+    frequency = numpy.full(len(period), numpy.nan)
+    with numpy.errstate(divide="ignore"):
+        frequency[valid] = samplerate / period[valid]
+    return frequency
+
+def difference_type1_batch(frame):
+    autocorr = autocorrelation_type1_batch(frame)
+    return autocorr[:, :1] - autocorr
+
+def difference_type2_batch(frame):
+    return difference_type2_from_autocorrelation(
+        autocorrelation_type2_batch(frame), energy_batch(frame))
+
+def difference_type2_from_autocorrelation(autocorr, energy):
+    return energy[:, :1] + energy - 2 * autocorr
+
+def cumulative_mean_normalized_difference_batch(diff):
+    tau = numpy.arange(1, diff.shape[1])
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        diff[:, 1:] *= tau / diff[:, 1:].cumsum(axis=1)
+    diff[:, 0] = 1
+    return diff
+
+def absolute_threshold_batch(diff, threshold=YIN_THRESHOLD):
+    col = numpy.arange(diff.shape[1])
+    tau = first_true((diff < threshold) & (col >= 2))
+
+    # 閾値を下回った位置から極小値まで下る。
+    stop = numpy.ones(diff.shape, dtype=bool)
+    stop[:, :-1] = ~(diff[:, 1:] < diff[:, :-1])
+    tau_min = first_true(stop & (col >= tau[:, numpy.newaxis]))
+    return numpy.where(tau >= 0, tau_min, -1)
+
+def invert_nsd_batch(nsd):
+    """
+    invert_nsd で None になるフレームは valid が False 。
+    """
+    start = first_true(~(nsd > 0))
+    col = numpy.arange(nsd.shape[1])
+    inverted = numpy.where(col < start[:, numpy.newaxis], 0, -nsd)
+    return inverted, start >= 0
+
+def normalized_square_difference_type1_batch(frame):
+    corr = autocorrelation_type1_batch(frame)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return corr / corr[:, :1]  # corr[0] == 0 のフレームは nan 。
+
+def normalized_square_difference_type2_batch(frame):
+    return normalized_square_difference_type2_from_autocorrelation(
+        autocorrelation_type2_batch(frame), energy_batch(frame))
+
+def normalized_square_difference_type2_from_autocorrelation(corr, energy):
+    cumsum = numpy.maximum(energy, 1)  # 発散を防ぐ。
+    return corr / (corr[:, :1] + cumsum)
+
+def estimate_period_batch(diff):
+    n_frame, length = diff.shape
+    col = numpy.arange(length)
+    start = first_true(~(diff > 0))[:, numpy.newaxis]
+    after_start = (start >= 0) & (col >= start)
+    threshold = MPM_K * numpy.max(
+        numpy.where(after_start, diff, -numpy.inf), axis=1)
+
+    # 負の値で区切られた区間 (run) を 1 次元にならべて扱う。
+    member = after_start & ~(diff < 0)
+    edge = numpy.zeros((n_frame, 1), dtype=bool)
+    run_start = numpy.flatnonzero(
+        member & ~numpy.hstack((edge, member[:, :-1])))
+    run_end = numpy.flatnonzero(member & ~numpy.hstack((member[:, 1:], edge)))
+    index = numpy.full(n_frame, -1)
+    if len(run_start) == 0:
+        return index
+
+    flat = numpy.where(member, diff, -numpy.inf).ravel()
+    run_max = numpy.maximum.reduceat(flat, run_start)
+
+    # 各 run の最大値の最初の位置。
+    position = numpy.flatnonzero(member)
+    run_id = numpy.searchsorted(run_start, position, side="right") - 1
+    is_peak = flat[position] == run_max[run_id]
+    position, run_id = position[is_peak], run_id[is_peak]
+    is_first = first_of_group(run_id)
+    position, run_id = position[is_first], run_id[is_first]
+
+    # 負の値で閉じていて、閾値以上の最初の run を選ぶ。
+    row = position // length
+    closed = run_end[run_id] % length < length - 1
+    valid = closed & (run_max[run_id] >= threshold[row])
+    position, row = position[valid], row[valid]
+    is_first = first_of_group(row)
+    index[row[is_first]] = position[is_first] % length
+    return index
+
+# 以下の 4 つは差分関数か NSD の行列から周波数を求める。
+def yin_cmnd_batch(diff, samplerate):
+    cmnd = cumulative_mean_normalized_difference_batch(diff)
+    tau = absolute_threshold_batch(cmnd)
+    period = parabolic_interpolation_batch(cmnd, tau)
+    return period_to_frequency(samplerate, period, tau >= 0)
+
+def yin_nsd_batch(nsd, samplerate):
+    nsd, valid = invert_nsd_batch(nsd)
+    tau = absolute_threshold_batch(nsd, 0)
+    return period_to_frequency(samplerate, tau, valid & (tau >= 0))
+
+def mpm_cmnd_batch(diff, samplerate):
+    cmnd = cumulative_mean_normalized_difference_batch(diff)
+    cmnd = numpy.max(cmnd, axis=1, keepdims=True) / 2 - cmnd
+    index = estimate_period_batch(cmnd)
+    period = parabolic_interpolation_batch(cmnd, index)
+    return period_to_frequency(samplerate, period, index >= 0)
+
+def mpm_nsd_batch(nsd, samplerate):
+    index = estimate_period_batch(nsd)
+    period = parabolic_interpolation_batch(nsd, index)
+    return period_to_frequency(samplerate, period, index >= 0)
+
+def yin_cmnd_type1_batch(frame, samplerate):
+    return yin_cmnd_batch(difference_type1_batch(frame), samplerate)
+
+def yin_cmnd_type2_batch(frame, samplerate):
+    return yin_cmnd_batch(difference_type2_batch(frame), samplerate)
+
+def yin_nsd_type1_batch(frame, samplerate):
+    return yin_nsd_batch(normalized_square_difference_type1_batch(frame),
+                         samplerate)
+
+def yin_nsd_type2_batch(frame, samplerate):
+    return yin_nsd_batch(normalized_square_difference_type2_batch(frame),
+                         samplerate)
+
+def mpm_cmnd_type1_batch(frame, samplerate):
+    return mpm_cmnd_batch(difference_type1_batch(frame), samplerate)
+
+def mpm_cmnd_type2_batch(frame, samplerate):
+    return mpm_cmnd_batch(difference_type2_batch(frame), samplerate)
+
+def mpm_nsd_type1_batch(frame, samplerate):
+    return mpm_nsd_batch(normalized_square_difference_type1_batch(frame),
+                         samplerate)
+
+def mpm_nsd_type2_batch(frame, samplerate):
+    return mpm_nsd_batch(normalized_square_difference_type2_batch(frame),
+                         samplerate)
+
+def count_frame(len_data, frame_len, frame_step):
+    """
+    python_speech_features.sigproc.framesig が返すフレーム数。
+    """
+    if len_data <= frame_len:
+        return 1
+    return 1 + int(numpy.ceil((len_data - frame_len) / frame_step))
+
+def pitch_frame(data,
+                samplerate,
+                winlen,
+                winstep,
+                pitch_func=yin_cmnd_type2,
+                batch=True,
+                batch_size=4096):
+    """
+    batch が True で pitch_func に対応する *_batch 関数があるときは、全フレームを
+    まとめて計算する。長い信号でもメモリが足りるように batch_size フレームずつ分割する。
+    """
+    frame_len = int(samplerate * winlen)
+    frame_step = int(samplerate * winstep)
+    batch_func = batch_functions.get(pitch_func)
+    if not batch or batch_func is None:
+        frame = python_speech_features.sigproc.framesig(
+            data, frame_len=frame_len, frame_step=frame_step)
+        return numpy.array([pitch_func(sig, samplerate) for sig in frame])
+
+    n_frame = count_frame(len(data), frame_len, frame_step)
+    pitch = []
+    for first in range(0, n_frame, batch_size):
+        last = min(first + batch_size, n_frame) - 1
+        part = data[first * frame_step:last * frame_step + frame_len]
+        frame = python_speech_features.sigproc.framesig(
+            part, frame_len=frame_len, frame_step=frame_step)
+        pitch.append(batch_func(frame.astype(numpy.float64), samplerate))
+    return numpy.concatenate(pitch)
 
 pitch_functions = [
     yin_cmnd_type1,
@@ -209,3 +426,49 @@ pitch_functions = [
     mpm_nsd_type1,
     mpm_nsd_type2,
 ]
+
+batch_functions = {
+    yin_cmnd_type1: yin_cmnd_type1_batch,
+    yin_cmnd_type2: yin_cmnd_type2_batch,
+    yin_nsd_type1: yin_nsd_type1_batch,
+    yin_nsd_type2: yin_nsd_type2_batch,
+    mpm_cmnd_type1: mpm_cmnd_type1_batch,
+    mpm_cmnd_type2: mpm_cmnd_type2_batch,
+    mpm_nsd_type1: mpm_nsd_type1_batch,
+    mpm_nsd_type2: mpm_nsd_type2_batch,
+}
+
+def compare_batch(samplerate=16000, duration=4, winlen=0.1, winstep=0.01):
+    """
+    1 フレームずつの関数と *_batch 関数の結果と計算時間を比較する。
+    """
+    rng = numpy.random.default_rng(0)
+    length = int(duration * samplerate)
+    frequency = numpy.geomspace(50, 2000, length)
+    phase = 2 * numpy.pi * numpy.cumsum(frequency) / samplerate
+    data = numpy.sin(phase) + 0.1 * rng.uniform(-1, 1, length)
+    data[length // 2:length // 2 + samplerate // 4] = 0  # 無音区間。
+
+    for pitch_func in pitch_functions:
+        start = time.perf_counter()
+        try:
+            target = pitch_frame(
+                data, samplerate, winlen, winstep, pitch_func, batch=False)
+        except TypeError:
+            # type1 の NSD は無音のフレームで None を返すので、1 フレームずつの関数は失敗する。
+            target = None
+        elapsed_frame = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = pitch_frame(data, samplerate, winlen, winstep, pitch_func)
+        elapsed_batch = time.perf_counter() - start
+
+        if target is None:
+            match = "-"
+        else:
+            match = numpy.allclose(result, target, rtol=1e-9, equal_nan=True)
+        print(f"{pitch_func.__name__:16} frame {elapsed_frame:8.3f} s, "
+              f"batch {elapsed_batch:8.3f} s, match {match}")
+
+if __name__ == "__main__":
+    compare_batch()
@@ -443,12 +443,13 @@ def plot_pitch(data, title):
             label=name)
     ax.axhline(
         y=data.frequency, lw=1, ls="--", color="black", label=f"Mod Frequency")
-    ax.axhline(
-        y=data.misc["mod_freq"],
-        lw=1,
-        ls="-.",
-        color="black",
-        label=f"Car Frequency")
+    if data.misc is not None and "mod_freq" in data.misc:
+        ax.axhline(
+            y=data.misc["mod_freq"],
+            lw=1,
+            ls="-.",
+            color="black",
+            label=f"Car Frequency")
     # ax.legend(loc=1)
     ax.legend(loc=9, bbox_to_anchor=(0.5, -0.1), ncol=5)
 
@@ -462,20 +463,20 @@ def job_sin_mod(data, car_freq, mod_freq, index):
     plot_pitch(data, title)
 
 def plot_some_sin_mod():
-    datas = numpy.load("data/sin_am.npy")
-    index = 0
-    for data in datas:
-        indices = index + numpy.arange(len(data))
-        index += len(data)
-        args = [(d, d.frequency, d.misc["mod_freq"], i)
-                for d, i in zip(data, indices)]
-        with multiprocessing.Pool() as pool:
-            pool.starmap(job_sin_mod, args)
+    store = ResultStore(data_dir / "sin_am")
+    args = []
+    for i, j in numpy.ndindex(*store.shape):
+        data = store.cell(i, j)
+        index = i * store.shape[1] + j
+        args.append((data, data.frequency, data.misc["mod_freq"], index))
+    with multiprocessing.Pool() as pool:
+        pool.starmap(job_sin_mod, args)
 
 def plot_sin_wave():
-    datas = numpy.load("data/sin_wave.npy")
-    for data in datas:
-        plot_pitch(data)
+    store = ResultStore(data_dir / "sin_wave")
+    for i in range(store.shape[0]):
+        data = store.cell(i, 0)
+        plot_pitch(data, f"{i:08d} Sin - {data.frequency:.3f}Hz")
 
 # plot_autocorr()
 plot_diff()
@@ -0,0 +1,200 @@
+"""
+ストリーミング用のピッチ推定。
+
+PitchTracker は任意の長さのチャンクを受け取り、フレームがそろうたびにピッチを返す。
+結果は pitch_frame で信号全体を処理したときと丸め誤差の範囲で一致する。
+
+- type2 の自己相関はフレームをまたいで再利用する。 winstep が短いときは、 hop ごとに
+  抜けるサンプルと入るサンプルの分だけ自己相関を更新する (O(hop * frame_len))。
+  長いときは、そろったフレームをまとめて FFT で計算する。
+- フレーム i のピッチは i * step + frame_len 個目のサンプルが届いた process の呼び出しで
+  返る。遅延は frame_len サンプルで、 1 hop あたりの計算量は入力の長さによらない。
+"""
+
+import numpy
+import time
+from numpy.lib.stride_tricks import sliding_window_view
+
+from pitch import (
+    autocorrelation_type2_batch,
+    count_frame,
+    difference_type2_from_autocorrelation,
+    energy_batch,
+    mpm_cmnd_batch,
+    mpm_cmnd_type2,
+    mpm_nsd_batch,
+    mpm_nsd_type2,
+    normalized_square_difference_type2_from_autocorrelation,
+    pitch_frame,
+    yin_cmnd_batch,
+    yin_cmnd_type2,
+    yin_nsd_batch,
+    yin_nsd_type2,
+)
+
+# pitch_func -> (自己相関から求める関数, 周波数を求める関数)
+stream_functions = {
+    yin_cmnd_type2: (difference_type2_from_autocorrelation, yin_cmnd_batch),
+    yin_nsd_type2: (
+        normalized_square_difference_type2_from_autocorrelation,
+        yin_nsd_batch,
+    ),
+    mpm_cmnd_type2: (difference_type2_from_autocorrelation, mpm_cmnd_batch),
+    mpm_nsd_type2: (
+        normalized_square_difference_type2_from_autocorrelation,
+        mpm_nsd_batch,
+    ),
+}
+
+def update_autocorrelation_type2(corr, extended, step):
+    """
+    corr が autocorrelation_type2(extended[:-step]) のとき、
+    autocorrelation_type2(extended[step:]) を返す。
+    """
+    length = len(extended) - step
+    leaving = extended[:step] @ sliding_window_view(extended[:-1], length)
+    entering = extended[length:][::-1] @ sliding_window_view(
+        extended[::-1][:-1], length)
+    return corr + entering - leaving
+
+class PitchTracker():
+    def __init__(self,
+                 samplerate,
+                 winlen,
+                 winstep,
+                 pitch_func=yin_cmnd_type2,
+                 incremental=None,
+                 refresh=64):
+        """
+        pitch_func は type2 の関数のみ。 type1 は循環自己相関なので差分で更新できない。
+
+        incremental が None のときは、 1 hop の更新が FFT より安くなる winstep で
+        差分更新を使う。手元の計測では frame_len = 1600 で hop が数サンプル以下のとき。
+        差分更新では誤差がたまるので、 refresh hop ごとに FFT で計算しなおす。
+        差分更新は winstep <= winlen のときだけ使える。
+        """
+        if pitch_func not in stream_functions:
+            raise ValueError(
+                f"{pitch_func.__name__} is not supported. Use one of "
+                f"{[func.__name__ for func in stream_functions]}.")
+
+        self.samplerate = samplerate
+        self.frame_len = int(samplerate * winlen)
+        self.step = int(samplerate * winstep)
+        self.transform, self.estimate = stream_functions[pitch_func]
+
+        if incremental is None:
+            incremental = self.step <= numpy.log2(2 * self.frame_len) / 2
+        elif incremental and self.step > self.frame_len:
+            raise ValueError("incremental requires winstep <= winlen.")
+        self.incremental = incremental
+        self.refresh = refresh
+        self.reset()
+
+    def reset(self):
+        # buffer は次のフレームの先頭から始まる。差分更新では 1 つ前のフレームの先頭から。
+        self.buffer = numpy.zeros(0)
+        # winstep > winlen のとき、次のフレームの先頭まで捨てるサンプル数。
+        self.skip = 0
+        self.corr = None
+        self.n_update = 0
+        self.n_received = 0
+
+    def process(self, chunk):
+        """
+        chunk までで新しくそろったフレームのピッチを返す。そろったフレームがなければ
+        長さ 0 の配列を返す。
+        """
+        chunk = numpy.asarray(chunk, dtype=numpy.float64)
+        self.n_received += len(chunk)
+        n_skip = min(self.skip, len(chunk))
+        self.skip -= n_skip
+        self.buffer = numpy.concatenate((self.buffer, chunk[n_skip:]))
+
+        offset = 0 if self.corr is None else self.step
+        if len(self.buffer) < offset + self.frame_len:
+            return numpy.zeros(0)
+        n_frame = (len(self.buffer) - offset - self.frame_len) // self.step + 1
+
+        frames = sliding_window_view(self.buffer[offset:],
+                                     self.frame_len)[::self.step][:n_frame]
+        if self.incremental:
+            corr = self.update(offset, n_frame)
+            self.buffer = self.buffer[offset + (n_frame - 1) * self.step:]
+        else:
+            corr = autocorrelation_type2_batch(frames)
+            self.skip = max(n_frame * self.step - len(self.buffer), 0)
+            self.buffer = self.buffer[n_frame * self.step:]
+
+        return self.estimate(self.transform(corr, energy_batch(frames)),
+                             self.samplerate)
+
+    def update(self, offset, n_frame):
+        corr = numpy.empty((n_frame, self.frame_len))
+        for i in range(n_frame):
+            start = offset + i * self.step
+            if self.corr is None or self.n_update >= self.refresh:
+                frame = self.buffer[numpy.newaxis, start:start + self.frame_len]
+                self.corr = autocorrelation_type2_batch(frame)[0]
+                self.n_update = 0
+            else:
+                extended = self.buffer[start - self.step:start + self.frame_len]
+                self.corr = update_autocorrelation_type2(self.corr, extended,
+                                                         self.step)
+                self.n_update += 1
+            corr[i] = self.corr
+        return corr
+
+    def flush(self):
+        """
+        入力の終わりを 0 で埋めて、残りのフレームのピッチを返す。 framesig と同じく
+        最後のフレームは信号の終わりをまたぐ。呼び出したあとは reset された状態になる。
+        """
+        n_total = count_frame(self.n_received, self.frame_len, self.step)
+        padding = (n_total - 1) * self.step + self.frame_len - self.n_received
+        pitch = self.process(numpy.zeros(max(padding, 0)))
+        self.reset()
+        return pitch
+
+def compare_stream(samplerate=16000,
+                   duration=4,
+                   winlen=0.1,
+                   winsteps=(0.001, 0.01, 0.15),
+                   chunk_size=256):
+    """
+    PitchTracker と pitch_frame の結果と計算時間を比較する。
+    """
+    rng = numpy.random.default_rng(0)
+    length = int(duration * samplerate)
+    frequency = numpy.geomspace(50, 2000, length)
+    phase = 2 * numpy.pi * numpy.cumsum(frequency) / samplerate
+    data = numpy.sin(phase) + 0.1 * rng.uniform(-1, 1, length)
+
+    for winstep in winsteps:
+        for pitch_func in stream_functions:
+            start = time.perf_counter()
+            target = pitch_frame(data, samplerate, winlen, winstep, pitch_func)
+            elapsed_frame = time.perf_counter() - start
+
+            for incremental in [False, True]:
+                if incremental and winstep > winlen:
+                    continue
+                tracker = PitchTracker(samplerate, winlen, winstep, pitch_func,
+                                       incremental)
+                start = time.perf_counter()
+                pitch = [
+                    tracker.process(data[i:i + chunk_size])
+                    for i in range(0, length, chunk_size)
+                ]
+                pitch.append(tracker.flush())
+                elapsed_stream = time.perf_counter() - start
+
+                pitch = numpy.concatenate(pitch)
+                match = pitch.shape == target.shape and numpy.allclose(
+                    pitch, target, rtol=1e-6, equal_nan=True)
+                print(f"winstep {winstep:6.3f} {pitch_func.__name__:16} "
+                      f"incremental {incremental:d}: batch {elapsed_frame:7.3f} s, "
+                      f"stream {elapsed_stream:7.3f} s, match {match}")
+
+if __name__ == "__main__":
+    compare_stream()
@@ -1,10 +1,29 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import copy
+import hashlib
+import io
+import json
+import os
+import pickle
+from contextlib import redirect_stdout
+from multiprocessing import Pool
 from mpmath import mp
 from scipy import signal
 from signal_mp import butter_zpk_mp, ellip_zpk_mp, tf2sos_mp
 
+DESIGN_CACHE_DIR = "design_cache"
+
+# Design cache is invalidated when one of these files changes.
+DESIGN_CACHE_SOURCES = ("design.py", "signal_mp.py")
+# Bump when the pickled design format changes.
+DESIGN_CACHE_VERSION = 1
+
+# In-process layer of the design cache. Keys are the file paths.
+_design_memo = {}
+# `design_source_digest()`, computed on the first lookup.
+_design_source = None
+
 
 def apply(data, fn, deepcopy=True):
     """
@@ -205,6 +224,89 @@ def design_polyphase_iir(
             return q_polyphase, sos_sections
 
 
+def design_to_float(design):
+    if isinstance(design, tuple):
+        return tuple(apply(x, float) for x in design)
+    return apply(design, float)
+
+
+def design_source_digest():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(str(DESIGN_CACHE_VERSION).encode("utf-8"))
+    for name in DESIGN_CACHE_SOURCES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _design_cache_path(key, cache_dir):
+    global _design_source
+    if _design_source is None:
+        _design_source = design_source_digest()
+    param = {"design": key, "source": _design_source}
+    digest = hashlib.sha256(json.dumps(param).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.pkl")
+
+
+def _load_cached_design(path):
+    """Returns the design at `path` from memory or disk, or `None` if not cached."""
+    design = _design_memo.get(path)
+    if design is None and os.path.exists(path):
+        with open(path, "rb") as f:
+            design = pickle.load(f)
+        _design_memo[path] = design
+    return design
+
+
+def estimate_workdps(order, cutoff, M):
+    """Working precision in dps, estimated from the growth of the coefficients."""
+    f_min = min(cutoff, 1.0 - cutoff)
+    log_fc = np.log10(f_min)
+
+    slope = -0.8 * log_fc - 0.2
+    intercept = 0.3 * log_fc - 0.5
+    est_peak_1a = slope * order + intercept
+
+    upper_bound = order * np.log10(M)
+
+    est_log_max_s = max(0.0, min(upper_bound, est_peak_1a))
+    workdps = int(np.ceil(est_log_max_s)) + 25
+    return max(25, workdps)
+
+
+def _design_key(family, params, workdps, output):
+    """`params` are the positional arguments of the design function of `family`."""
+    if workdps is None:
+        workdps = estimate_workdps(params[0], params[-2], params[-1])
+    return [family, *params, workdps, output]
+
+
+def cached_design(key, compute, as_float=False, cache_dir=None):
+    """
+    Returns `compute()`, which is a design in `mpmath` types. When `cache_dir` is not
+    `None`, the design is cached in memory and pickled to `cache_dir`. `key` is a list
+    that can be dumped to JSON, and it must include all the parameters of the design.
+    The digest of `DESIGN_CACHE_SOURCES` is added to `key`, so that editing the design
+    code doesn't return stale designs.
+    """
+    if cache_dir is None:
+        design = compute()
+        return design_to_float(design) if as_float else design
+
+    path = _design_cache_path(key, cache_dir)
+    design = _load_cached_design(path)
+    if design is None:
+        design = compute()
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(design, f)
+        os.replace(tmp_path, path)
+    _design_memo[path] = design
+
+    return design_to_float(design) if as_float else copy.deepcopy(design)
+
+
 def design_polyphase_butterworth(
     order: int,
     cutoff: float,
@@ -212,6 +314,7 @@ def design_polyphase_butterworth(
     output: str = "ba",
     as_float: bool = False,
     workdps: int | None = 2000,
+    cache_dir: str | None = None,
 ):
     """
     Designs a Butterworth filter and decomposes it for polyphase down-sampling.
@@ -230,6 +333,9 @@ def design_polyphase_butterworth(
         Cast the coefficients to Python float.
     workdps : int, optional
         Working precision in dps. If None, it is estimated.
+    cache_dir : str, optional
+        Directory of the design cache. Designs are cached by family, parameters, `M`,
+        `workdps` and `output`. If None, the cache is not used.
 
     Returns:
     --------
@@ -246,24 +352,15 @@ def design_polyphase_butterworth(
         raise ValueError("output must be one of 'ba', 'sos', 'sos2', or 'hybrid'")
 
     if workdps is None:
-        f_min = min(cutoff, 1.0 - cutoff)
-        log_fc = np.log10(f_min)
+        workdps = estimate_workdps(order, cutoff, M)
 
-        slope = -0.8 * log_fc - 0.2
-        intercept = 0.3 * log_fc - 0.5
-        est_peak_1a = slope * order + intercept
+    def compute():
+        with mp.workdps(workdps):
+            z_mp, p_mp, k_mp = butter_zpk_mp(order, cutoff, btype="low")
+        return design_polyphase_iir(z_mp, p_mp, k_mp, M, output=output, workdps=workdps)
 
-        upper_bound = order * np.log10(M)
-
-        est_log_max_s = max(0.0, min(upper_bound, est_peak_1a))
-        workdps = int(np.ceil(est_log_max_s)) + 25
-        workdps = max(25, workdps)
-
-    with mp.workdps(workdps):
-        z_mp, p_mp, k_mp = butter_zpk_mp(order, cutoff, btype="low")
-    return design_polyphase_iir(
-        z_mp, p_mp, k_mp, M, output=output, as_float=as_float, workdps=workdps
-    )
+    key = _design_key("butterworth", (order, cutoff, M), workdps, output)
+    return cached_design(key, compute, as_float, cache_dir)
 
 
 def design_polyphase_elliptic(
@@ -275,6 +372,7 @@ def design_polyphase_elliptic(
     output: str = "ba",
     as_float: bool = False,
     workdps: int | None = 2000,
+    cache_dir: str | None = None,
 ):
     """
     Designs an Elliptic filter and decomposes it for polyphase down-sampling.
@@ -297,6 +395,9 @@ def design_polyphase_elliptic(
         Cast the coefficients to Python float.
     workdps : int, optional
         Working precision in dps. If None, it is estimated.
+    cache_dir : str, optional
+        Directory of the design cache. Designs are cached by family, parameters, `M`,
+        `workdps` and `output`. If None, the cache is not used.
 
     Returns:
     --------
@@ -313,24 +414,81 @@ def design_polyphase_elliptic(
         raise ValueError("output must be one of 'ba', 'sos', 'sos2', or 'hybrid'")
 
     if workdps is None:
-        f_min = min(cutoff, 1.0 - cutoff)
-        log_fc = np.log10(f_min)
+        workdps = estimate_workdps(order, cutoff, M)
 
-        slope = -0.8 * log_fc - 0.2
-        intercept = 0.3 * log_fc - 0.5
-        est_peak_1a = slope * order + intercept
+    def compute():
+        with mp.workdps(workdps):
+            z_mp, p_mp, k_mp = ellip_zpk_mp(order, rp, rs, cutoff, btype="low")
+        return design_polyphase_iir(z_mp, p_mp, k_mp, M, output=output, workdps=workdps)
 
-        upper_bound = order * np.log10(M)
+    key = _design_key("elliptic", (order, rp, rs, cutoff, M), workdps, output)
+    return cached_design(key, compute, as_float, cache_dir)
 
-        est_log_max_s = max(0.0, min(upper_bound, est_peak_1a))
-        workdps = int(np.ceil(est_log_max_s)) + 25
-        workdps = max(25, workdps)
 
-    with mp.workdps(workdps):
-        z_mp, p_mp, k_mp = ellip_zpk_mp(order, rp, rs, cutoff, btype="low")
-    return design_polyphase_iir(
-        z_mp, p_mp, k_mp, M, output=output, as_float=as_float, workdps=workdps
-    )
+DESIGN_FAMILIES = {
+    "butterworth": design_polyphase_butterworth,
+    "elliptic": design_polyphase_elliptic,
+}
+
+
+def _design_sweep_job(args):
+    family, params, kwargs = args
+    try:
+        return DESIGN_FAMILIES[family](*params, **kwargs)
+    except ValueError:
+        return None
+
+
+def design_sweep(
+    configs,
+    output="ba",
+    as_float=False,
+    workdps=2000,
+    processes=None,
+    cache_dir=DESIGN_CACHE_DIR,
+):
+    """
+    Designs all `configs` on a process pool.
+
+    configs: List of `(family, params)`. `params` are the positional arguments of
+        `design_polyphase_butterworth` or `design_polyphase_elliptic`, e.g.
+        `("butterworth", (order, cutoff, M))` or
+        `("elliptic", (order, rp, rs, cutoff, M))`.
+
+    Returns list of designs in the same order as `configs`. The design is `None` when it
+    raised `ValueError`. Designs found in `cache_dir` are loaded in this process, and
+    only the rest are sent to the pool.
+    """
+    kwargs = {
+        "output": output,
+        "as_float": as_float,
+        "workdps": workdps,
+        "cache_dir": cache_dir,
+    }
+    results = [None] * len(configs)
+    misses = []
+    for index, (family, params) in enumerate(configs):
+        params = tuple(params)
+        design = None
+        if cache_dir is not None and family in DESIGN_FAMILIES:
+            key = _design_key(family, params, workdps, output)
+            design = _load_cached_design(_design_cache_path(key, cache_dir))
+        if design is None:
+            misses.append((index, (family, params, kwargs)))
+        elif as_float:
+            results[index] = design_to_float(design)
+        else:
+            results[index] = copy.deepcopy(design)
+
+    jobs = [job for _, job in misses]
+    if processes == 1 or len(jobs) <= 1:
+        designs = list(map(_design_sweep_job, jobs))
+    else:
+        with Pool(processes) as pool:
+            designs = pool.map(_design_sweep_job, jobs, chunksize=1)
+    for (index, _), design in zip(misses, designs):
+        results[index] = design
+    return results
 
 
 def check_stability(order, M, precision="float64"):
@@ -606,7 +764,9 @@ def print_sos_cpp_struct_f64(order, cutoff, struct_name="SosTest"):
     print(generate_sos_cpp_struct(sos_matrix, struct_name))
 
 
-def print_coefficient_counts_table(max_order=16):
+def print_coefficient_counts_table(
+    max_order=16, processes=None, cache_dir=DESIGN_CACHE_DIR
+):
     import sympy
 
     def count_elements(data):
@@ -629,37 +789,28 @@ def print_coefficient_counts_table(max_order=16):
     sos_results = {}
     sos2_results = {}
 
-    for order in range(1, max_order + 1):
-        for M in sympy.divisors(order):
-            if M == 1:
-                continue
-
-            try:
-                q, sos_a = design_polyphase_butterworth(
-                    order, fc, M, output="hybrid", workdps=16
-                )
-            except ValueError:
-                pass
-            else:
-                hybrid_results[(order, M)] = count_elements(q) + count_elements(sos_a)
-
-            try:
-                sos_full = design_polyphase_butterworth(
-                    order, fc, M, output="sos", workdps=16
-                )
-            except ValueError:
-                pass
-            else:
-                sos_results[(order, M)] = (count_elements(sos_full) // 6) * 5
-
-            try:
-                sos2b, sos2a = design_polyphase_butterworth(
-                    order, fc, M, output="sos2", workdps=16
-                )
-            except ValueError:
-                pass
-            else:
-                sos2_results[(order, M)] = count_elements(sos2b) + count_elements(sos2a)
+    keys = [
+        (order, M)
+        for order in range(1, max_order + 1)
+        for M in sympy.divisors(order)
+        if M != 1
+    ]
+    configs = [("butterworth", (order, fc, M)) for order, M in keys]
+
+    def sweep(output):
+        designs = design_sweep(
+            configs, output, workdps=16, processes=processes, cache_dir=cache_dir
+        )
+        return [(key, design) for key, design in zip(keys, designs) if design is not None]
+
+    for key, (q, sos_a) in sweep("hybrid"):
+        hybrid_results[key] = count_elements(q) + count_elements(sos_a)
+
+    for key, sos_full in sweep("sos"):
+        sos_results[key] = (count_elements(sos_full) // 6) * 5
+
+    for key, (sos2b, sos2a) in sweep("sos2"):
+        sos2_results[key] = count_elements(sos2b) + count_elements(sos2a)
 
     def render_markdown_table(title, results):
         lines = []
@@ -700,6 +851,59 @@ def print_coefficient_counts_table(max_order=16):
     )
 
 
+def max_coefficient_magnitude(design):
+    magnitude = 0
+    stack = [design]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (list, tuple)):
+            stack.extend(current)
+        else:
+            magnitude = max(magnitude, abs(current))
+    return magnitude
+
+
+def print_stability_map(
+    max_order=16,
+    max_M=16,
+    cutoff=0.125,
+    precision="float64",
+    workdps=None,
+    processes=None,
+    cache_dir=DESIGN_CACHE_DIR,
+):
+    """
+    Prints a markdown table of log10 of the largest coefficient of the "ba" design for
+    each `(order, M)`. Cells marked with `*` are the ones `check_stability` predicts to
+    be unstable. Designs are computed with `design_sweep`, so the second run only reads
+    the cache.
+    """
+    m_range = range(2, max_M + 1)
+    keys = [(order, M) for order in range(1, max_order + 1) for M in m_range]
+    configs = [("butterworth", (order, cutoff, M)) for order, M in keys]
+    designs = design_sweep(
+        configs, "ba", workdps=workdps, processes=processes, cache_dir=cache_dir
+    )
+
+    results = {}
+    for (order, M), design in zip(keys, designs):
+        if design is None:
+            continue
+        magnitude = max_coefficient_magnitude(design)
+        with redirect_stdout(io.StringIO()):
+            stable = check_stability(order, M, precision)
+        mark = "" if stable else "*"
+        results[(order, M)] = f"{float(mp.log10(magnitude)):.1f}{mark}"
+
+    print(f"### log10 of Max Coefficient Magnitude (cutoff={cutoff}, {precision})")
+    print("")
+    print("Order \\ M | " + " | ".join(map(str, m_range)))
+    print("-:|" + "|".join(["-:"] * len(m_range)))
+    for order in range(1, max_order + 1):
+        row = [str(order)] + [results.get((order, M), "") for M in m_range]
+        print(" | ".join(row))
+
+
 if __name__ == "__main__":
     order = 16
     cutoff = 0.015625
@@ -1,9 +1,12 @@
 import argparse
+import hashlib
 import json
 import os
 import random
+import shutil
 import subprocess
 import sys
+from multiprocessing import Pool
 from mpmath import mp
 import numpy as np
 from tabulate import tabulate
@@ -13,9 +16,20 @@ from signal_mp import (
     butter_zpk_mp,
     ellip_zpk_mp,
     zpk2sos_mp,
-    filter_polyphase_hybrid_mp,
+    lfilter_mp,
     sosfilt_mp,
 )
+from signal_dd import (
+    EPS_DD,
+    LONGDOUBLE_IS_EXTENDED,
+    estimate_gain,
+    filter_polyphase_hybrid_dd,
+    filter_polyphase_hybrid_np,
+    from_dd,
+    longdouble_to_dd,
+    sosfilt_dd,
+    sosfilt_np,
+)
 from design import (
     apply,
     design_polyphase_butterworth,
@@ -38,7 +52,226 @@ def run_command(cmd, desc="command"):
     return res
 
 
-def compute_reference_data(design_params, num_samples, out_path):
+REFERENCE_ENGINES = ("auto", "longdouble", "dd", "mp")
+
+# Reference error relative to the peak of output. Default is 1/1000 ULP of float64.
+# "longdouble" needs `tol >= 10 * gain * eps(longdouble)` (about 1.1e-18 for gain 1),
+# so it's never picked by default. Pass a larger `--ref-tol` to allow it.
+DEFAULT_REFERENCE_TOL = float(np.finfo(np.float64).eps) * 1e-3
+
+# Impulse responses decay below the range of float64. The dd engine filters an impulse
+# of this height, so that the tail keeps full precision down to the smallest subnormal
+# of float64. Scaling by a power of 2 is exact.
+IR_SCALE_EXPONENT = 600
+
+# Reference values below half of the smallest subnormal of float64 are rounded to 0 by
+# `float()` in `analyze_numerical_errors`. They are stored as 0 in every engine, so that
+# the reference strings don't depend on how far an engine can follow the tail.
+UNDERFLOW = mp.ldexp(1, -1075)
+
+NOISE_SEED = 65429876
+
+# Reference cache is invalidated when one of these files changes.
+REFERENCE_SOURCES = ("signal_mp.py", "signal_dd.py", "design.py")
+# Bump when the reference computation in this file changes.
+REFERENCE_VERSION = 2
+
+
+def select_reference_engine(y64, y_ld, tol):
+    """
+    Returns the cheapest engine of which the estimated error is below `tol`. The error
+    is estimated by `estimate_gain` with the safety factor of 10. See
+    `DEFAULT_REFERENCE_TOL` for when "longdouble" can be picked. Needs
+    `LONGDOUBLE_IS_EXTENDED`.
+    """
+    gain = estimate_gain(y64, y_ld)
+    if gain * np.finfo(np.float64).eps > 1e-3:
+        # float64 output is too inaccurate to estimate the gain.
+        return "mp"
+    if 10 * gain * np.finfo(np.longdouble).eps <= tol:
+        return "longdouble"
+    if 10 * gain * EPS_DD <= tol:
+        return "dd"
+    return "mp"
+
+
+def _lfilter_mp_job(args):
+    b, a, x, dps = args
+    with mp.workdps(dps):
+        return lfilter_mp(b, a, x)
+
+
+def _sosfilt_mp_job(args):
+    sos, x, dps = args
+    with mp.workdps(dps):
+        return sosfilt_mp(sos, x)
+
+
+def filter_polyphase_hybrid_mp_parallel(q_polyphase, sos_sections, inputs, pool):
+    """
+    Same as `filter_polyphase_hybrid_mp`, but the FIR of each branch runs on `pool`.
+    The shared all-pole sections are a cascade, so they run in series.
+    """
+    one = mp.mpf(1.0)
+    zero = mp.mpf(0.0)
+    jobs = [(q_k, [one], x_k, mp.dps) for q_k, x_k in zip(q_polyphase, inputs)]
+    branches = pool.map(_lfilter_mp_job, jobs)
+    sum_fir = [sum(values, zero) for values in zip(*branches)]
+
+    sos = [[one, zero, zero, one, sec[0], sec[1]] for sec in sos_sections]
+    return sosfilt_mp(sos, sum_fir)
+
+
+def filter_reference(
+    q_mp,
+    a_sos_mp,
+    polyphase_sos_mp,
+    in_noise,
+    ir_length_per_branch,
+    engine="auto",
+    tol=DEFAULT_REFERENCE_TOL,
+    processes=None,
+):
+    """
+    Computes the noise output of the hybrid form and the impulse response of each
+    branch of the SOS form. `in_noise` is a list of float lists, one per branch.
+
+    `engine` is one of `REFERENCE_ENGINES`. "auto" runs the filters in `np.float64` and
+    `np.longdouble` first, and picks the cheapest engine that meets `tol` for each
+    output. "mp" runs `signal_mp` on a process pool, one job per polyphase branch.
+
+    Where `np.longdouble` is the same as `np.float64`, the gain can't be estimated, so
+    "auto" uses "mp" for both outputs, and "longdouble" raises `ValueError`.
+
+    Returns `(out_noise_mp, out_ir_mp, engines)`. Outputs are lists of `mpmath`
+    numbers. `out_ir_mp` is a list per branch.
+    """
+    if engine not in REFERENCE_ENGINES:
+        raise ValueError(f"engine must be one of {REFERENCE_ENGINES}, not '{engine}'")
+    if engine == "longdouble" and not LONGDOUBLE_IS_EXTENDED:
+        raise ValueError(
+            "np.longdouble has the same precision as np.float64 on this platform. "
+            "Use engine 'dd' or 'mp'."
+        )
+
+    noise_dd = [(np.array(x), np.zeros(len(x))) for x in in_noise]
+    impulse = np.zeros(ir_length_per_branch)
+    impulse[0] = 1
+
+    def run_np(dtype):
+        noise = filter_polyphase_hybrid_np(q_mp, a_sos_mp, noise_dd, dtype)
+        ir = [sosfilt_np(sos, impulse, dtype) for sos in polyphase_sos_mp]
+        return noise, ir
+
+    if engine == "auto" and not LONGDOUBLE_IS_EXTENDED:
+        print(
+            "np.longdouble has the same precision as np.float64 on this platform. "
+            "Using 'mp' for the reference."
+        )
+        engine = "mp"
+
+    engines = {"outputs": engine, "impulse_response": engine}
+    if engine in ("auto", "longdouble"):
+        noise_ld, ir_ld = run_np(np.longdouble)
+    if engine == "auto":
+        noise64, ir64 = run_np(np.float64)
+        engines["outputs"] = select_reference_engine(noise64, noise_ld, tol)
+        engines["impulse_response"] = select_reference_engine(
+            np.concatenate(ir64), np.concatenate(ir_ld), tol
+        )
+    print(f"Reference engines: {engines}")
+
+    pool = None
+    if "mp" in engines.values():
+        pool = Pool(processes)
+
+    try:
+        if engines["outputs"] == "longdouble":
+            out_noise_mp = from_dd(*longdouble_to_dd(noise_ld))
+        elif engines["outputs"] == "dd":
+            out_noise_mp = from_dd(
+                *filter_polyphase_hybrid_dd(q_mp, a_sos_mp, noise_dd)
+            )
+        else:
+            in_noise_mp = apply(in_noise, mp.mpf)
+            out_noise_mp = filter_polyphase_hybrid_mp_parallel(
+                q_mp, a_sos_mp, in_noise_mp, pool
+            )
+
+        if engines["impulse_response"] == "longdouble":
+            out_ir_mp = [from_dd(*longdouble_to_dd(y)) for y in ir_ld]
+        elif engines["impulse_response"] == "dd":
+            scale = 2.0**IR_SCALE_EXPONENT
+            impulse_dd = (impulse * scale, np.zeros(ir_length_per_branch))
+            out_ir_mp = [
+                [v / scale for v in from_dd(*sosfilt_dd(sos, impulse_dd))]
+                for sos in polyphase_sos_mp
+            ]
+        else:
+            impulse_mp = [mp.mpf(v) for v in impulse]
+            out_ir_mp = pool.map(
+                _sosfilt_mp_job,
+                [(sos, impulse_mp, mp.dps) for sos in polyphase_sos_mp],
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def flush(values):
+        zero = mp.mpf(0)
+        return [zero if abs(v) < UNDERFLOW else v for v in values]
+
+    return flush(out_noise_mp), [flush(y) for y in out_ir_mp], engines
+
+
+def reference_source_digest():
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(str(REFERENCE_VERSION).encode("utf-8"))
+    for name in REFERENCE_SOURCES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def reference_cache_path(cache_dir, design_params, num_samples, engine, tol, seed):
+    param = {
+        "design": list(design_params),
+        "samples": num_samples,
+        "engine": engine,
+        "tol": float(tol).hex(),
+        "seed": seed,
+        "source": reference_source_digest(),
+    }
+    digest = hashlib.sha256(json.dumps(param).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def compute_reference_data(
+    design_params,
+    num_samples,
+    out_path,
+    engine="auto",
+    tol=DEFAULT_REFERENCE_TOL,
+    processes=None,
+    cache_dir="reference_cache",
+    seed=NOISE_SEED,
+):
+    """
+    Reference data is cached in `cache_dir` by design parameters, number of samples,
+    `engine`, `tol`, `seed` and the source of the filter code. Set `cache_dir` to
+    `None` to disable the cache.
+    """
+    if cache_dir is not None:
+        cache_path = reference_cache_path(
+            cache_dir, design_params, num_samples, engine, tol, seed
+        )
+        if os.path.exists(cache_path):
+            print(f"Loading cached reference data from {cache_path}")
+            shutil.copyfile(cache_path, out_path)
+            with open(out_path) as f:
+                return json.load(f)
+
     filter_type = design_params[0]
 
     if filter_type == "butterworth":
@@ -92,26 +325,24 @@ def compute_reference_data(design_params, num_samples, out_path):
         raise ValueError(f"Unsupported filter type: {filter_type}")
 
     with mp.workdps(100):
-        random.seed(65429876)
-        in_noise_mp = []
+        random.seed(seed)
+        in_noise = []
         for _ in range(M):
-            in_noise_mp.append(
-                [mp.mpf(random.uniform(-1.0, 1.0)) for _ in range(num_samples)]
-            )
+            in_noise.append([random.uniform(-1.0, 1.0) for _ in range(num_samples)])
+        in_noise_mp = apply(in_noise, mp.mpf)
 
         print("Computing high-precision reference outputs...")
-        out_noise_mp = filter_polyphase_hybrid_mp(q_mp, a_sos_mp, in_noise_mp)
-
-        in_ir_mp = []
-        out_ir_mp = []
         ir_length_per_branch = 65536 // M
-        for i in range(M):
-            sig = [mp.mpf(0) for _ in range(ir_length_per_branch)]
-            sig[0] = mp.mpf(1)
-            in_ir_mp.append(sig)
-
-            sig = sosfilt_mp(polyphase_sos_mp[i], sig)
-            out_ir_mp.append(sig)
+        out_noise_mp, out_ir_mp, engines = filter_reference(
+            q_mp,
+            a_sos_mp,
+            polyphase_sos_mp,
+            in_noise,
+            ir_length_per_branch,
+            engine,
+            tol,
+            processes,
+        )
         out_ir_mp = [v for w in zip(*out_ir_mp) for v in w]  # Interleave
 
         def _nstr(x, n=25):
@@ -127,9 +358,13 @@ def compute_reference_data(design_params, num_samples, out_path):
             "impulse_response": apply(out_ir_mp, _nstr),
         }
         ref_data.update(ref_metadata)
+        ref_data["reference_engine"] = engines
 
         with open(out_path, "w") as f:
             json.dump(ref_data, f, indent=2)
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            shutil.copyfile(out_path, cache_path)
 
     print(f"Reference data successfully generated at {out_path}\n")
     return ref_data
@@ -374,8 +609,43 @@ def main():
         action="store_true",
         help="Enable and run execution speed benchmarks",
     )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=REFERENCE_ENGINES,
+        default="auto",
+        help=(
+            "Precision of reference outputs. 'auto' picks the fastest of 'longdouble', "
+            "'dd' (double-double) and 'mp' (mpmath) that meets --ref-tol, or 'mp' where "
+            "np.longdouble is the same as np.float64"
+        ),
+    )
+    parser.add_argument(
+        "--ref-tol",
+        type=float,
+        default=DEFAULT_REFERENCE_TOL,
+        help="Allowed reference error relative to the peak output for '--engine auto'",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="Number of processes for '--engine mp' (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default="reference_cache",
+        help="Directory to cache reference data by design parameters",
+    )
 
     args = parser.parse_args()
+    reference_options = {
+        "engine": args.engine,
+        "tol": args.ref_tol,
+        "processes": args.processes,
+        "cache_dir": args.cache_dir,
+    }
 
     if os.path.exists(args.ref):
         print(f"Loading existing reference file from {args.ref}")
@@ -409,13 +679,17 @@ def main():
             )
             sys.exit(1)
 
-        ref_data = compute_reference_data(design_params, args.samples, args.ref)
+        ref_data = compute_reference_data(
+            design_params, args.samples, args.ref, **reference_options
+        )
     else:
         print(
             f"No reference data found at {args.ref}. Designing default filter 'butterworth,8,0.2,4'..."
         )
         default_design = ("butterworth", 8, 0.2, 4)
-        ref_data = compute_reference_data(default_design, args.samples, args.ref)
+        ref_data = compute_reference_data(
+            default_design, args.samples, args.ref, **reference_options
+        )
 
     generate_cpp_header(ref_data)
 
@@ -0,0 +1,202 @@
+"""
+Fast counterparts of the filters in `signal_mp.py`, used to compute the reference data of
+`run_tests.py`.
+
+- `*_np` filters run `scipy.signal` on `np.float64` or `np.longdouble` arrays.
+- `*_dd` filters run in double-double arithmetic (about 32 decimal digits). FIR parts are
+  vectorized over samples. Only the recursive part of IIR loops over samples.
+
+Coefficients are given as `mpmath` numbers, and normalized by `a[0]` in `mpmath`
+before conversion. Signals are given as `(hi, lo)` pairs of `np.float64` arrays. The
+value is `hi + lo`.
+"""
+
+import mpmath
+import numpy as np
+from scipy import signal
+
+# Unit roundoff of double-double arithmetic.
+EPS_DD = 2.0**-104
+
+
+def to_dd(values):
+    """List of `mpmath` numbers to `(hi, lo)`. Call under enough `mp.dps` (>= 35)."""
+    hi = np.array([float(v) for v in values], dtype=np.float64)
+    lo = np.array([float(v - h) for v, h in zip(values, hi)], dtype=np.float64)
+    return hi, lo
+
+
+def from_dd(hi, lo):
+    """`(hi, lo)` to list of `mpmath.mpf`. Call under enough `mp.dps` (>= 35)."""
+    return [mpmath.mpf(float(h)) + mpmath.mpf(float(l)) for h, l in zip(hi, lo)]
+
+
+def longdouble_to_dd(x):
+    hi = x.astype(np.float64)
+    lo = (x - hi).astype(np.float64)
+    return hi, lo
+
+
+def dd_to_longdouble(hi, lo):
+    return np.asarray(hi, dtype=np.longdouble) + np.asarray(lo, dtype=np.longdouble)
+
+
+def normalize_ba(b, a):
+    """Returns `(b / a[0], a / a[0])` as lists of `mpmath` numbers."""
+    return [v / a[0] for v in b], [v / a[0] for v in a]
+
+
+# --- Double-double arithmetic ---
+#
+# These functions work on both `np.ndarray` and Python `float`. The recursive part of
+# filters calls them with `float`, because the overhead of NumPy scalars dominates.
+
+
+def _two_sum(a, b):
+    s = a + b
+    bb = s - a
+    return s, (a - (s - bb)) + (b - bb)
+
+
+def _quick_two_sum(a, b):
+    s = a + b
+    return s, b - (s - a)
+
+
+def _split(a):
+    c = 134217729.0 * a  # 2**27 + 1
+    hi = c - (c - a)
+    return hi, a - hi
+
+
+def _two_prod(a, b):
+    p = a * b
+    ah, al = _split(a)
+    bh, bl = _split(b)
+    return p, ((ah * bh - p) + ah * bl + al * bh) + al * bl
+
+
+def dd_add(ah, al, bh, bl):
+    s, e = _two_sum(ah, bh)
+    t, f = _two_sum(al, bl)
+    s, e = _quick_two_sum(s, e + t)
+    return _quick_two_sum(s, e + f)
+
+
+def dd_mul(ah, al, bh, bl):
+    p, e = _two_prod(ah, bh)
+    return _quick_two_sum(p, e + (ah * bl + al * bh))
+
+
+# --- Double-double filters ---
+
+
+def fir_dd(b, x):
+    """`y[n] = sum_i b[i] * x[n - i]`. `b` is `(hi, lo)` arrays, `x` is `(hi, lo)`."""
+    b_hi, b_lo = b
+    x_hi, x_lo = x
+    y_hi = np.zeros_like(x_hi)
+    y_lo = np.zeros_like(x_lo)
+    for i in range(min(len(b_hi), len(x_hi))):
+        p_hi, p_lo = dd_mul(b_hi[i], b_lo[i], x_hi[: len(x_hi) - i], x_lo[: len(x_lo) - i])
+        y_hi[i:], y_lo[i:] = dd_add(y_hi[i:], y_lo[i:], p_hi, p_lo)
+    return y_hi, y_lo
+
+
+def allpole_dd(a, w):
+    """`y[n] = w[n] - sum_j a[j] * y[n - j]` for `j >= 1`. `a[0]` must be 1."""
+    a_hi = [float(v) for v in a[0][1:]]
+    a_lo = [float(v) for v in a[1][1:]]
+    w_hi = w[0].tolist()
+    w_lo = w[1].tolist()
+    y_hi = [0.0] * len(w_hi)
+    y_lo = [0.0] * len(w_lo)
+    for n in range(len(w_hi)):
+        acc_hi, acc_lo = w_hi[n], w_lo[n]
+        for j in range(min(len(a_hi), n)):
+            p_hi, p_lo = dd_mul(a_hi[j], a_lo[j], y_hi[n - 1 - j], y_lo[n - 1 - j])
+            acc_hi, acc_lo = dd_add(acc_hi, acc_lo, -p_hi, -p_lo)
+        y_hi[n] = acc_hi
+        y_lo[n] = acc_lo
+    return np.array(y_hi), np.array(y_lo)
+
+
+def lfilter_dd(b, a, x):
+    """Double-double version of `lfilter_mp`."""
+    b, a = normalize_ba(b, a)
+    w = fir_dd(to_dd(b), x)
+    if len(a) <= 1:
+        return w
+    return allpole_dd(to_dd(a), w)
+
+
+def sosfilt_dd(sos, x):
+    for section in sos:
+        x = lfilter_dd(section[0:3], section[3:6], x)
+    return x
+
+
+def filter_polyphase_hybrid_dd(q_polyphase, sos_sections, inputs):
+    """Double-double version of `filter_polyphase_hybrid_mp`. `inputs` are `(hi, lo)`."""
+    sum_hi = np.zeros_like(inputs[0][0])
+    sum_lo = np.zeros_like(inputs[0][1])
+    for q_k, x_k in zip(q_polyphase, inputs):
+        y_hi, y_lo = lfilter_dd(q_k, [mpmath.mpf(1.0)], x_k)
+        sum_hi, sum_lo = dd_add(sum_hi, sum_lo, y_hi, y_lo)
+
+    one = mpmath.mpf(1.0)
+    zero = mpmath.mpf(0.0)
+    sos = [[one, zero, zero, one, sec[0], sec[1]] for sec in sos_sections]
+    return sosfilt_dd(sos, (sum_hi, sum_lo))
+
+
+# --- NumPy filters (np.float64 or np.longdouble) ---
+
+
+def _to_np(values, dtype):
+    hi, lo = to_dd(values)
+    return dd_to_longdouble(hi, lo).astype(dtype)
+
+
+def sosfilt_np(sos, x, dtype):
+    rows = []
+    for section in sos:
+        b, a = normalize_ba(section[0:3], section[3:6])
+        rows.append(_to_np(b + a, dtype))
+    return signal.sosfilt(np.array(rows), np.asarray(x, dtype=dtype))
+
+
+def filter_polyphase_hybrid_np(q_polyphase, sos_sections, inputs, dtype):
+    """`inputs` are `(hi, lo)`. Returns an array of `dtype`."""
+    one = np.ones(1, dtype=dtype)
+    total = np.zeros(len(inputs[0][0]), dtype=dtype)
+    for q_k, x_k in zip(q_polyphase, inputs):
+        x = dd_to_longdouble(*x_k).astype(dtype)
+        total += signal.lfilter(_to_np(q_k, dtype), one, x)
+
+    sos = [[1, 0, 0, 1, sec[0], sec[1]] for sec in sos_sections]
+    return sosfilt_np(sos, total, dtype)
+
+
+# `np.longdouble` is the same as `np.float64` on MSVC and on Apple Silicon.
+LONGDOUBLE_IS_EXTENDED = bool(np.finfo(np.longdouble).eps < np.finfo(np.float64).eps)
+
+
+def estimate_gain(y64, y_ld):
+    """
+    Error amplification of a filter, estimated from the difference between the
+    `np.float64` and `np.longdouble` outputs. The error of another precision with unit
+    roundoff `u` is about `gain * u * max(abs(y))`.
+
+    The estimate is meaningful only when `gain * eps(float64)` is well below 1. Raises
+    `ValueError` when `np.longdouble` isn't more precise than `np.float64`, because the
+    difference is then always 0.
+    """
+    if not LONGDOUBLE_IS_EXTENDED:
+        raise ValueError("np.longdouble has the same precision as np.float64")
+    y_ld = np.asarray(y_ld, dtype=np.longdouble)
+    peak = float(np.max(np.abs(y_ld), initial=0.0))
+    if peak == 0:
+        return 1.0
+    diff = float(np.max(np.abs(np.asarray(y64, dtype=np.longdouble) - y_ld)))
+    return max(1.0, diff / (np.finfo(np.float64).eps * peak))
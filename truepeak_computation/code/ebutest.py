@@ -197,13 +197,14 @@ def test(name, filterFunc):
         print(Path(path).stem, dbtp, status)
     print()
 
-for func in [
-    ("Full Sinc", applyFullSinc),
-    ("Partial Sinc", applyPartialSinc),
-    ("Lagrange", applyLagrangeInterpolation),
-    ("BS.1770 FIR", applyBs1770Fir),
-    ("SOCP FIR", applySocpFir),
-    ("Bessel", applyBessel),
-    ("Thiran AP", applyThiran),
-]:
-    test(*func)
+if __name__ == "__main__":
+    for func in [
+        ("Full Sinc", applyFullSinc),
+        ("Partial Sinc", applyPartialSinc),
+        ("Lagrange", applyLagrangeInterpolation),
+        ("BS.1770 FIR", applyBs1770Fir),
+        ("SOCP FIR", applySocpFir),
+        ("Bessel", applyBessel),
+        ("Thiran AP", applyThiran),
+    ]:
+        test(*func)
@@ -1,55 +1,49 @@
 import json
 import numpy
+import os
+import sys
 
-from cvxopt import matrix, solvers
-
-def get_b(omega, delta):
-    H_d = numpy.exp(-1j * delta * omega)
-    return numpy.vstack((H_d.real, H_d.imag)).T
-
-def get_A_tilde(n_taps, omega):
-    index = numpy.arange(n_taps)
-    a = numpy.exp(-1j * index.reshape(1, -1) * omega.reshape(-1, 1))
-
-    A_tilde = []
-    for a_i in a:
-        a_i0 = numpy.append(a_i, 0)
-        A_tilde.append([a_i0.real, a_i0.imag])
-    return numpy.array(A_tilde)
-
-def solve(A, b):
-    c = numpy.zeros(A.shape[2])
-    c[-1] = 1
-
-    rhs = numpy.zeros_like(A[0][0])
-    rhs[-1] = 1
-
-    G = [matrix(-numpy.vstack((rhs.reshape(1, -1), A_i))) for A_i in A]
-    h = [matrix(numpy.append(0, b_i)) for b_i in b]
-
-    solvers.options["show_progress"] = False
-    sol = solvers.socp(matrix(c), Gq=G, hq=h)
-    return numpy.array(sol["x"]).flatten()
-
-def createTable(n_taps, n_fraction, delta_min=None, omega_max=0.9, omega_density=1):
-    omega = numpy.linspace(
-        0,
-        numpy.pi * omega_max,
-        omega_density * n_taps,
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        "../../fractional_delay_filter_socp/demo",
     )
+)
+from socptable import design_tables, get_omega
 
+def getSpec(n_taps, n_fraction, delta_min=None, omega_max=0.9, omega_density=1):
+    omega = get_omega(n_taps, omega_max, omega_density)
     if delta_min is None:
         delta_min = n_taps / 2 - 1
-
-    table = [
-        -solve(get_A_tilde(n_taps, omega), get_b(omega, delta))[0:-1]
-        for delta in numpy.linspace(delta_min, delta_min + 1, n_fraction)
+    deltas = numpy.linspace(delta_min, delta_min + 1, n_fraction)
+    return (n_taps, deltas, omega)
+
+def createTables(params, processes=None):
+    """
+    Designs tables of a parameter sweep at once. Solved tables are cached.
+
+    params: List of keyword arguments of `createTable`.
+    """
+    specs = [getSpec(**param) for param in params]
+    tables = design_tables(specs, processes)
+    return [
+        {
+            "delta_min": spec[1][0],
+            "omega_max": param.get("omega_max", 0.9),
+            "table": table,
+        }
+        for param, spec, table in zip(params, specs, tables)
     ]
-    return {
+
+def createTable(n_taps, n_fraction, delta_min=None, omega_max=0.9, omega_density=1):
+    param = {
+        "n_taps": n_taps,
+        "n_fraction": n_fraction,
         "delta_min": delta_min,
         "omega_max": omega_max,
-        "table": numpy.array(table),
+        "omega_density": omega_density,
     }
+    return createTables([param])[0]
 
 def printCpp():
     with open("socp.json", "r", encoding="utf-8") as fi:
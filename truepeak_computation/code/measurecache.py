@@ -0,0 +1,186 @@
+"""
+Incremental true-peak measurement over the files in `data` directory.
+
+Results are stored per file and per method in a JSON file. Keys are the hash of file
+content and the hash of method parameter (e.g. FIR table), so only new or modified files
+and methods with changed parameters are measured again.
+
+Store layout:
+
+```
+{
+    "files": {path: {"size": int, "mtime": int, "hash": str}, ...},
+    "results": {fileHash: {methodName: {"key": str, "True-peak": float, "dBTP": float}}},
+}
+```
+"""
+
+import hashlib
+import json
+import numpy as np
+import os
+import soundfile
+from multiprocessing import Pool
+from pathlib import Path
+
+from truepeakmeter import TruePeakMeter
+
+def fileHash(path, blockSize=2**20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fi:
+        while chunk := fi.read(blockSize):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def methodHash(parameter):
+    """
+    `parameter` is FIR table (2D array), or a dictionary that can be dumped to JSON.
+    """
+    digest = hashlib.sha256()
+    if isinstance(parameter, dict):
+        digest.update(json.dumps(parameter, sort_keys=True).encode("utf-8"))
+    else:
+        table = np.asarray(parameter, dtype=np.float64)
+        digest.update(str(table.shape).encode("utf-8"))
+        digest.update(table.tobytes())
+    return digest.hexdigest()
+
+def toResult(truepeak):
+    truepeak = float(truepeak)
+    return {"True-peak": truepeak, "dBTP": float(20 * np.log10(truepeak))}
+
+def measureFirTables(path, tables, blockSize=65536):
+    """
+    Measures all FIR tables in one pass over the file. Only the first channel is used,
+    as in `measuresocp.py`. Sample peak is included, as in `applySocpFir`.
+
+    tables = {"methodName": [[b00, b01, ...], [b10, b11, ...], ...], ...}
+    """
+    meters = {name: TruePeakMeter(table) for name, table in tables.items()}
+    samplePeak = 0.0
+    for block in soundfile.blocks(str(path), blocksize=blockSize, always_2d=True):
+        sig = block[:, 0]
+        samplePeak = max(samplePeak, np.max(np.abs(sig), initial=0.0))
+        for meter in meters.values():
+            meter.process(sig)
+    return {name: toResult(max(m.flush(), samplePeak)) for name, m in meters.items()}
+
+def _hashJob(path):
+    try:
+        return (path, fileHash(path))
+    except OSError:
+        return (path, None)
+
+def _measureJob(args):
+    path, digest, methods, measure = args
+    try:
+        result = measure(path, methods)
+    except RuntimeError:
+        # `soundfile` can't read the file.
+        return (path, digest, None)
+    return (path, digest, result)
+
+class MeasureStore:
+    def __init__(self, storePath):
+        self.storePath = Path(storePath)
+        self.data = {"files": {}, "results": {}}
+        if self.storePath.exists():
+            with open(self.storePath, "r", encoding="utf-8") as fi:
+                self.data = json.load(fi)
+
+    def save(self):
+        tmpPath = self.storePath.with_suffix(".tmp")
+        with open(tmpPath, "w", encoding="utf-8") as fi:
+            json.dump(self.data, fi)
+        os.replace(tmpPath, self.storePath)
+
+    def cachedHash(self, path):
+        """Returns `None` when the file is new or modified since the last hashing."""
+        entry = self.data["files"].get(str(path.as_posix()))
+        stat = path.stat()
+        if entry is None:
+            return None
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns:
+            return None
+        return entry["hash"]
+
+    def setHash(self, path, digest):
+        stat = path.stat()
+        self.data["files"][str(path.as_posix())] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": digest,
+        }
+
+    def get(self, digest, name, key):
+        result = self.data["results"].get(digest, {}).get(name)
+        if result is None or result["key"] != key:
+            return None
+        return {"True-peak": result["True-peak"], "dBTP": result["dBTP"]}
+
+    def put(self, digest, name, key, result):
+        self.data["results"].setdefault(digest, {})[name] = {"key": key, **result}
+
+def runMeasurement(
+    paths,
+    methods,
+    storePath,
+    measure=measureFirTables,
+    processes=None,
+    chunksize=4,
+    saveInterval=64,
+):
+    """
+    paths: Paths of audio files. Directories and unreadable files are skipped.
+    methods: `{"methodName": parameter, ...}`. `parameter` is passed to `measure`.
+    measure: `measure(path, methods)` returns `{"methodName": result, ...}`. It runs on
+        worker processes, so it must be a module level function.
+
+    Returns `{path: {"methodName": {"True-peak": float, "dBTP": float}, ...}, ...}`.
+    """
+    store = MeasureStore(storePath)
+    keys = {name: methodHash(parameter) for name, parameter in methods.items()}
+    paths = [p for p in map(Path, paths) if p.is_file()]
+
+    with Pool(processes) as pool:
+        digests = {p: store.cachedHash(p) for p in paths}
+        toHash = [p for p, digest in digests.items() if digest is None]
+        for path, digest in pool.imap_unordered(_hashJob, toHash, chunksize):
+            if digest is not None:
+                store.setHash(path, digest)
+            digests[path] = digest
+
+        output = {}
+        tasks = []
+        for path in paths:
+            digest = digests[path]
+            if digest is None:
+                continue
+            result = {}
+            stale = {}
+            for name, parameter in methods.items():
+                cached = store.get(digest, name, keys[name])
+                if cached is None:
+                    stale[name] = parameter
+                else:
+                    result[name] = cached
+            output[str(path.as_posix())] = result
+            if len(stale) > 0:
+                tasks.append((path, digest, stale, measure))
+
+        print(f"Measuring {len(tasks)} of {len(paths)} files.")
+        for index, (path, digest, result) in enumerate(
+            pool.imap_unordered(_measureJob, tasks, chunksize)
+        ):
+            if result is None:
+                print(f"Skipping: {path}")
+                output.pop(str(path.as_posix()))
+                continue
+            for name, value in result.items():
+                store.put(digest, name, keys[name], value)
+            output[str(path.as_posix())].update(result)
+            if index % saveInterval == saveInterval - 1:
+                store.save()
+
+    store.save()
+    return output
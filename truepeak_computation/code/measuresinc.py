@@ -9,9 +9,10 @@ import numpy as np
 import scipy.signal as signal
 import soundfile
 import json
-from multiprocessing import Pool
 from pathlib import Path
 
+from measurecache import runMeasurement, toResult
+
 def getSincTruePeak(sig, oversample=32):
     out = []
     index = np.arange(-len(sig), len(sig))
@@ -22,31 +23,23 @@ def getSincTruePeak(sig, oversample=32):
         out.append(np.max(np.abs(sig)))
     return np.max(out)
 
-def job(path):
-    if not path.is_file():
-        return None
-
-    try:
-        data, samplerate = soundfile.read(str(path), always_2d=True)
-    except:
-        print(f"Skipping: {path}")
-        return None
-
+def measureSinc(path, methods):
+    """
+    `measure` function for `runMeasurement`. Whole file is read, because the length of
+    sinc kernel is twice the length of input.
+    """
+    data, samplerate = soundfile.read(str(path), always_2d=True)
     data = data.T[0]
-    truepeak = getSincTruePeak(data)
-    dbtp = 20 * np.log10(truepeak)
-    print(f"{path}: {truepeak}, {dbtp}[dBTP]")
-
-    return (str(path.as_posix()), {"True-peak": truepeak, "dBTP": dbtp})
+    return {
+        name: toResult(getSincTruePeak(data, param["oversample"]))
+        for name, param in methods.items()
+    }
 
 if __name__ == "__main__":
-    result = {}
+    methods = {"Sinc": {"oversample": 32}}
     paths = [p for p in Path("data").glob("**/*")]
-    with Pool() as pool:
-        for data in pool.imap_unordered(job, paths):
-            if data is None:
-                continue
-            result[data[0]] = data[1]
+    measured = runMeasurement(paths, methods, "measure_cache.json", measure=measureSinc)
+    result = {path: data["Sinc"] for path, data in measured.items()}
 
     with open("measure_sinc.json", "w", encoding="utf-8") as fi:
         json.dump(result, fi)
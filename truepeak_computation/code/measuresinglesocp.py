@@ -7,46 +7,10 @@ import numpy as np
 import scipy.signal as signal
 import soundfile
 import json
-from multiprocessing import Pool
 from pathlib import Path
 
 from fractionaldelaysocp import *
-
-def applySocpFir(sig, table):
-    """FIR fractional delay filter designed by solving second order cone problem."""
-    out = [np.max(np.abs(sig))]
-    for fir in table:
-        socp = signal.convolve(sig, fir, mode="same")
-        out.append(np.max(np.abs(socp)))
-    return np.max(out)
-
-def job(args):
-    """
-    args = (path, table)
-    tables = [
-        [b00, b01, ...], # FIR 0
-        [b10, b11, ...], # FIR 1
-        ...
-    ]
-    """
-    path = args[0]
-
-    if not path.is_file():
-        return None
-
-    try:
-        data, samplerate = soundfile.read(str(path), always_2d=True)
-    except:
-        # print(f"Skipping: {path}")
-        return None
-    # print(f"Processing: {path}")
-
-    data = data.T[0]
-    truepeak = applySocpFir(data, args[1])
-    dbtp = 20 * np.log10(truepeak)
-    result = {"True-peak": truepeak, "dBTP": dbtp}
-
-    return (str(path.as_posix()), result)
+from measurecache import runMeasurement
 
 def getTruepeak(data):
     return (data["True-peak"], data["dBTP"])
@@ -54,13 +18,10 @@ def getTruepeak(data):
 def measureSocp(length=7, oversample=4, omega_max=0.65):
     table = createTable(length, oversample + 1, omega_max=omega_max)["table"][:-1]
 
-    dataSocp = {}
-    paths = [(p, table) for p in Path("data").glob("**/*")]
-    with Pool() as pool:
-        for data in pool.imap_unordered(job, paths):
-            if data is None:
-                continue
-            dataSocp[data[0]] = data[1]
+    paths = [p for p in Path("data").glob("**/*")]
+    name = f"SOCP_{length}_{oversample}_{omega_max:.3f}"
+    measured = runMeasurement(paths, {name: table}, "measure_cache.json")
+    dataSocp = {path: data[name] for path, data in measured.items()}
 
     with open("measure_single_socp.json", "w", encoding="utf-8") as fi:
         json.dump(dataSocp, fi)
@@ -92,6 +53,15 @@ def measureSocp(length=7, oversample=4, omega_max=0.65):
 def measureSocpVaryingOmegaMax():
     oversample = 4
 
+    # Design all tables in parallel beforehand. `measureSocp` reads them from cache.
+    createTables(
+        [
+            {"n_taps": length, "n_fraction": oversample + 1, "omega_max": omega_max}
+            for length in np.arange(3, 17)
+            for omega_max in np.arange(0.5, 0.91, 0.025)
+        ]
+    )
+
     result = {}
     for length in np.arange(3, 17):
         resultLength = {}
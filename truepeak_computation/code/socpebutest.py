@@ -69,12 +69,19 @@ def test(name, table):
 def testRange(arrLength, arrOmegaMax):
     oversample = 4
 
+    params = [
+        {"n_taps": length, "n_fraction": oversample + 1, "omega_max": omega_max}
+        for length in arrLength
+        for omega_max in arrOmegaMax
+    ]
+    tables = iter(createTables(params))
+
     data = {}
     for length in arrLength:
         statusList = {}
         for omega_max in arrOmegaMax:
             name = f"FIR Length={length}, omega_max={omega_max:.3f}"
-            table = createTable(length, oversample + 1, omega_max=omega_max)["table"]
+            table = next(tables)["table"]
             statusList[f"{omega_max:.3f}"] = test(name, table)
         data[str(length)] = statusList
     with open("socp_ebutest_status.json", "w", encoding="utf-8") as fi:
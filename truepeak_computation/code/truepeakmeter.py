@@ -0,0 +1,132 @@
+"""
+Streaming true-peak meter with precomputed polyphase FIR bank.
+
+The `apply*` functions in `ebutest.py` build each fractional delay FIR in a loop and call
+`signal.convolve` for every phase. `TruePeakMeter` takes the bank of FIR as a 2D array of
+shape `(phase, tap)`, and computes all phases of a block with a single matrix product.
+Only the running maximum is kept, so memory usage doesn't depend on the input length.
+
+Output of `TruePeakMeter` is same as taking `np.max(np.abs(out))` of the `apply*`
+functions in `ebutest.py` up to float rounding, as long as the FIR bank is the same.
+"""
+
+import numpy as np
+import scipy.signal as signal
+import soundfile
+
+from ebutest import iturBs1770Fir, socpFir
+
+def sincBank(half=9, oversample=32):
+    """
+    Bank of `applyPartialSinc`. Set large `half` to approximate `applyFullSinc`, which
+    uses a kernel twice as long as the input.
+    """
+    index = np.arange(-half, half + 1)
+    fraction = np.linspace(0, 1, oversample, endpoint=False)
+    return np.sinc(index[np.newaxis, :] + fraction[:, np.newaxis])
+
+def bs1770Bank():
+    return np.array(iturBs1770Fir())
+
+def socpBank():
+    return np.array(socpFir())
+
+class TruePeakMeter:
+    def __init__(self, bank):
+        """
+        bank: FIR filter bank. Shape is `(oversample, nTap)`.
+        """
+        self.bank = np.asarray(bank, dtype=np.float64)
+        self.nTap = self.bank.shape[1]
+
+        # Same alignment as `signal.convolve(..., mode="same")`.
+        self.delay = (self.nTap - 1) // 2
+
+        # Reversed and transposed for `windows @ self.kernel`.
+        self.kernel = self.bank[:, ::-1].T
+        self.reset()
+
+    def reset(self):
+        self.buffer = None
+        self.toSkip = self.delay
+        self.peak = 0.0
+
+    def process(self, block):
+        """
+        block: 1D array, or 2D array of shape `(frame, channel)`.
+        Returns the running true-peak in amplitude.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if self.buffer is None:
+            self.buffer = np.zeros((self.nTap - 1,) + block.shape[1:])
+        self._filter(block)
+        return self.peak
+
+    def flush(self):
+        """
+        Processes the tail which is included in `mode="same"`, and returns the true-peak
+        of whole input. Call `reset()` before measuring next input.
+        """
+        if self.buffer is not None:
+            self._filter(np.zeros((self.delay,) + self.buffer.shape[1:]))
+            self.buffer = None
+        return self.peak
+
+    def dbtp(self):
+        return 20 * np.log10(self.peak)
+
+    def oversample(self, block):
+        """
+        Returns interleaved oversampled signal of `block`, which is aligned to the
+        output of `apply*` functions in `ebutest.py`. The running peak is not updated.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        padded = np.concatenate((np.zeros(self.nTap - 1), block, np.zeros(self.delay)))
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.nTap)
+        return np.ravel(windows[self.delay : self.delay + len(block)] @ self.kernel)
+
+    def _filter(self, block):
+        padded = np.concatenate((self.buffer, block))
+        self.buffer = padded[len(padded) - (self.nTap - 1) :]
+
+        # First `delay` outputs are discarded by `mode="same"`.
+        skip = min(self.toSkip, len(block))
+        self.toSkip -= skip
+        if skip >= len(block):
+            return
+
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.nTap, axis=0)
+        out = windows[skip:] @ self.kernel
+        self.peak = max(self.peak, np.max(np.abs(out)))
+
+def measureFile(path, bank, blockSize=65536):
+    """
+    Returns true-peak of all channels in dBTP. The file is read in blocks.
+    """
+    meter = TruePeakMeter(bank)
+    for block in soundfile.blocks(str(path), blocksize=blockSize, always_2d=True):
+        meter.process(block)
+    meter.flush()
+    return meter.dbtp()
+
+def testTruePeakMeter(nTest=32):
+    rng = np.random.default_rng(0)
+    banks = [sincBank(), sincBank(half=64), bs1770Bank()]
+    for _ in range(nTest):
+        sig = rng.uniform(-1, 1, int(rng.integers(1, 4096)))
+        for bank in banks:
+            target = max(
+                np.max(np.abs(signal.convolve(sig, fir, mode="same"))) for fir in bank
+            )
+
+            meter = TruePeakMeter(bank)
+            boundaries = np.sort(rng.integers(0, len(sig), 4))
+            for block in np.split(sig, boundaries):
+                meter.process(block)
+            peak = meter.flush()
+
+            if not np.isclose(peak, target, rtol=1e-12, atol=0):
+                print(f"Test failed: length={len(sig)}, nTap={bank.shape[1]}")
+
+if __name__ == "__main__":
+    testTruePeakMeter()
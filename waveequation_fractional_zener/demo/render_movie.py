@@ -1,16 +1,22 @@
+import os
 import sys
 import math
 import random
 import pathlib
+from multiprocessing import Pool
 
+import numpy
 from PyQt5.QtCore import (QSize, QPointF, Qt)
 from PyQt5.QtGui import (QGuiApplication, QPainter, QPainterPath, QBrush,
                          QColor, QPen, QImage, QFont, QFontMetrics)
 
 from wave import *
 
+# Frames are rendered without display.
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
 
-def draw(image, wave1d, font):
+
+def draw(image, wav, pickY, alpha, beta, tau_epsilon, font):
     size = image.size()
     centerY = math.floor(size.height() / 2)
 
@@ -22,7 +28,6 @@ def draw(image, wave1d, font):
     qp.setPen(color)
     qp.setBrush(color)
 
-    wav = wave1d.value()
     path = QPainterPath()
     path.moveTo(0, centerY)
     denom = len(wav) - 1
@@ -35,7 +40,7 @@ def draw(image, wave1d, font):
     path.lineTo(0, size.height())
     qp.drawPath(path)
 
-    if wave1d.pickY != 0:
+    if pickY != 0:
         pen = QPen(QColor(0xe0, 0x20, 0x10))
         pen.setWidthF(2.0)
         pen.setCapStyle(Qt.RoundCap)
@@ -43,7 +48,7 @@ def draw(image, wave1d, font):
         w = 8
         h = 16
         centerX = size.width() / 2 - 0.5
-        depth = centerY + wave1d.pickY
+        depth = centerY + pickY
         qp.drawLine(QPointF(centerX, centerY - h), QPointF(centerX, centerY))
         qp.drawLine(
             QPointF(centerX - w / 2, centerY - h / 4),
@@ -57,9 +62,9 @@ def draw(image, wave1d, font):
     qp.setPen(Qt.black)
     qp.setFont(font)
     line_space = QFontMetrics(font).lineSpacing()
-    qp.drawText(4, 1 * line_space, "  α={:0.3}".format(wave1d.alpha))
-    qp.drawText(4, 2 * line_space, "  β={:0.3}".format(wave1d.beta))
-    qp.drawText(4, 3 * line_space, "τ_ε={:0.8}".format(wave1d.tau_epsilon))
+    qp.drawText(4, 1 * line_space, "  α={:0.3}".format(alpha))
+    qp.drawText(4, 2 * line_space, "  β={:0.3}".format(beta))
+    qp.drawText(4, 3 * line_space, "τ_ε={:0.8}".format(tau_epsilon))
 
     qp.setPen(QColor(0x30, 0x30, 0x30))
     qp.setBrush(Qt.transparent)
@@ -78,60 +83,118 @@ def compose(target, images, grid, gridWidth, gridHeight):
             )
 
 
-if __name__ == '__main__':
-    app = QGuiApplication(sys.argv)
+def scenes(iMax=3, jMax=5):
+    """Returns `(tau_epsilon, beta)` of each scene."""
+    return [(0.1**(i + 1), j * 2 / (jMax - 1)) for i in range(iMax)
+            for j in range(jMax)]
+
+
+def simulate(args):
+    """
+    Writes the state of `waveIndex`-th wave to `statesPath`, which is a `.npy` file of
+    shape `(number of waves, number of scenes * numFrame, length)`. The file is memory
+    mapped, so a long movie doesn't have to fit in memory.
+    """
+    statesPath, waveIndex, parameters, numFrame, releaseFrame, pickY = args
+    states = numpy.load(statesPath, mmap_mode="r+")
+
+    wave = ZenerWave1D(*parameters)
+    for index, (tau_epsilon, beta) in enumerate(scenes()):
+        # Only the labels are changed, as `setParameters` is not called.
+        wave.reset()
+        wave.tau_epsilon = tau_epsilon
+        wave.beta = beta
+
+        start = index * numFrame
+        wave.pick(0.5, pickY)
+        wave.advance(releaseFrame, states[waveIndex, start:start + releaseFrame])
+        wave.pick(0.5, 0)
+        wave.advance(
+            numFrame - releaseFrame,
+            states[waveIndex, start + releaseFrame:start + numFrame],
+        )
+    states.flush()
+    return waveIndex
 
-    grid = 4
-    length = grid * grid
-    denom = length - 1
 
-    width = int(1280 / grid)
-    height = int(720 / grid)
+def initRenderer():
+    # QGuiApplication is created in each worker process, not in the parent.
+    global app
+    app = QGuiApplication([])
 
-    wave1d = [
-        ZenerWave1D(
-            width,
-            16,
-            0.1 * width / 512,
-            1 / 60,
-            1,
-            1,
-            1,
-            2 * i / denom,
-            2 * i / denom,
-        ) for i in range(length)
-    ]
 
-    pathlib.Path('img').mkdir(parents=True, exist_ok=True)
+def render(args):
+    statesPath, frames, alphas, numFrame, releaseFrame, pickY, grid, width, height = args
+    states = numpy.load(statesPath, mmap_mode="r")
+    sceneParameters = scenes()
 
     images = [
-        QImage(width, height, QImage.Format_RGB888) for _ in range(length)
+        QImage(width, height, QImage.Format_RGB888) for _ in range(len(states))
     ]
     composed_image = QImage(width * grid, height * grid, QImage.Format_RGB888)
 
     font = QFont("Dejavu Sans Mono", 12)
 
-    current_frame = 0
-    jMax = 5
-    for i in range(3):
-        for j in range(jMax):
-            for wave in wave1d:
-                wave.reset()
-                wave.tau_epsilon = 0.1**(i + 1)
-                wave.beta = j * 2 / (jMax - 1)
-                wave.pick(0.5, height / 6)
-            num_frame = 1200
-            for time in range(num_frame):
-                if time == num_frame / 6:
-                    for wave in wave1d:
-                        wave.pick(0.5, 0)
-                for k in range(length):
-                    wave1d[k].step()
-                    draw(images[k], wave1d[k], font)
-                compose(composed_image, images, grid, width, height)
-                composed_image.save("img/out{:08d}.png".format(current_frame))
-                sys.stdout.write(
-                    "\rScene: {:2}.{:2}, Frame: {:4} / {:4}".format(
-                        i, j, time, num_frame))
-                current_frame += 1
+    for current_frame in frames:
+        tau_epsilon, beta = sceneParameters[current_frame // numFrame]
+        time = current_frame % numFrame
+        picking = pickY if time < releaseFrame else 0
+        for k in range(len(states)):
+            draw(images[k], states[k, current_frame], picking, alphas[k], beta,
+                 tau_epsilon, font)
+        compose(composed_image, images, grid, width, height)
+        composed_image.save("img/out{:08d}.png".format(current_frame))
+    return len(frames)
+
+
+if __name__ == '__main__':
+    grid = 4
+    length = grid * grid
+    denom = length - 1
+
+    width = int(1280 / grid)
+    height = int(720 / grid)
+
+    parameters = [(
+        width,
+        16,
+        0.1 * width / 512,
+        1 / 60,
+        1,
+        1,
+        1,
+        2 * i / denom,
+        2 * i / denom,
+    ) for i in range(length)]
+    alphas = [p[7] for p in parameters]
+
+    pathlib.Path('img').mkdir(parents=True, exist_ok=True)
+
+    num_frame = 1200
+    release_frame = num_frame // 6
+    pick_y = height / 6
+    total_frame = len(scenes()) * num_frame
+
+    # Simulation and rendering both run in parallel. The states are passed through a
+    # memory mapped file.
+    states_path = "img/states.npy"
+    numpy.lib.format.open_memmap(
+        states_path, mode="w+", shape=(length, total_frame, width)).flush()
+
+    tasks = [(states_path, index, p, num_frame, release_frame, pick_y)
+             for index, p in enumerate(parameters)]
+    with Pool() as pool:
+        for done, _ in enumerate(pool.imap_unordered(simulate, tasks)):
+            sys.stdout.write("\rSimulation: {:2} / {:2}".format(done + 1, length))
+    print()
+
+    chunk = 60
+    tasks = [(states_path, range(start, min(start + chunk, total_frame)), alphas,
+              num_frame, release_frame, pick_y, grid, width, height)
+             for start in range(0, total_frame, chunk)]
+    with Pool(initializer=initRenderer) as pool:
+        done = 0
+        for n in pool.imap_unordered(render, tasks):
+            done += n
+            sys.stdout.write("\rFrame: {:5} / {:5}".format(done, total_frame))
     print("\n")
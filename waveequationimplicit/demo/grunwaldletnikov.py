@@ -0,0 +1,158 @@
+"""
+Fast Grünwald-Letnikov fractional difference with sum of exponentials.
+
+The exact fractional difference in `wave.py` sums `c[m] * wave[m]` over the whole
+stored history, so the cost of a step grows with the depth of history. Here the
+coefficients of long lags are approximated by `K` exponentials:
+
+```
+c[m] ≈ sum_k weights[k] * poles[k]**(m - shortDepth),  m >= shortDepth
+```
+
+Then the long lags can be summed with `K` recursive states. Cost of a step is
+O(length * (shortDepth + K)), and it doesn't depend on the memory length.
+
+- Lags shorter than `shortDepth` are summed exactly from `TimeHistory`.
+- Poles are log-spaced in decay rate, from `1 / memoryLength` to 4 per step. They don't
+  depend on the coefficients, so the states stay valid when parameters are changed.
+- Weights are fitted by least squares on the coefficients up to `memoryLength`.
+"""
+
+import collections
+import numpy
+import time
+
+from timehistory import TimeHistory
+
+ExponentialFit = collections.namedtuple("ExponentialFit",
+                                        ["short", "weights", "error"])
+
+
+def grunwaldLetnikovCoefficients(order, length):
+    """
+    `(-1)**m * binom(order, m)` for `m` in `[0, length)`. Same as the list comprehension
+    with `scipy.special.binom` in `wave.py` up to rounding.
+    """
+    m = numpy.arange(1, length)
+    return numpy.concatenate(([1.0], numpy.cumprod((m - 1 - order) / m)))
+
+
+class GrunwaldLetnikovSum():
+    def __init__(self, length, memoryLength, nExponentials=24, shortDepth=16):
+        """
+        :param length: Length of the field.
+        :param memoryLength: Number of lags approximated by the fit.
+        :param nExponentials: Number of recursive states. Larger is more accurate. The
+            error is returned by `fit()`.
+        :param shortDepth: Lags shorter than this are summed exactly.
+        """
+        self.memoryLength = max(memoryLength, shortDepth + 1)
+        self.shortDepth = shortDepth
+
+        decay = numpy.geomspace(1 / self.memoryLength, 4, nExponentials)
+        self.poles = numpy.exp(-decay)
+        self.states = numpy.zeros((nExponentials, length))
+        self.work = numpy.zeros(length)
+
+        # Lags relative to `shortDepth` used for the fit. Dense at short lags, and
+        # log-spaced at long lags. `width` is the number of lags each sample stands for.
+        nLag = self.memoryLength - shortDepth
+        lag = numpy.unique(
+            numpy.concatenate((
+                numpy.arange(min(64, nLag)),
+                numpy.geomspace(1, nLag, 2048).astype(int) - 1,
+            )))
+        self.fitLag = lag
+        self.fitWidth = numpy.diff(numpy.append(lag, nLag)).astype(numpy.float64)
+
+    def depth(self):
+        """Depth of `TimeHistory` required by `push()` and `sum()`."""
+        return self.shortDepth + 1
+
+    def fit(self, coefficients):
+        """
+        :param coefficients: `c[m]` for `m` in `[0, memoryLength)`.
+        :return: `ExponentialFit`. `error` is the L1 error of the fitted coefficients
+            relative to the L1 norm of `coefficients[1:]`. It bounds the relative error
+            of the sum.
+        """
+        coefficients = numpy.asarray(coefficients, dtype=numpy.float64)
+        target = coefficients[self.shortDepth + self.fitLag]
+        basis = self.poles[numpy.newaxis, :]**self.fitLag[:, numpy.newaxis]
+
+        # Weighted by `sqrt(width)` to approximate the L2 error over all lags.
+        scale = numpy.sqrt(self.fitWidth)
+        weights, *_ = numpy.linalg.lstsq(basis * scale[:, numpy.newaxis],
+                                         target * scale,
+                                         rcond=None)
+
+        norm = numpy.sum(numpy.abs(coefficients[1:self.memoryLength]))
+        residual = numpy.sum(self.fitWidth * numpy.abs(basis @ weights - target))
+        error = residual / norm if norm > 0 else 0.0
+        return ExponentialFit(coefficients[:self.shortDepth].copy(), weights, error)
+
+    def reset(self):
+        self.states.fill(0)
+
+    def push(self, history):
+        """
+        Feeds `history[shortDepth]` to the states. Call once per step after
+        `history.rotate()`.
+        """
+        self.states *= self.poles[:, numpy.newaxis]
+        self.states += history[self.shortDepth]
+
+    def sum(self, history, fit, out):
+        """
+        Writes `sum_m c[m] * history[m]` for `m >= 1` to `out`, and returns `out`.
+        """
+        numpy.dot(fit.weights, self.states, out=out)
+        for m in range(1, self.shortDepth):
+            numpy.multiply(history[m], fit.short[m], out=self.work)
+            out += self.work
+        return out
+
+
+def benchmark(order=1.5, length=512, nSteps=2048, nExponentials=(8, 16, 24)):
+    """
+    Compares the fast sum against the exact sum over the whole elapsed history, which
+    is what `fracDiffDepth = nSteps + 1` in `wave.py` computes.
+    """
+    rng = numpy.random.default_rng(0)
+    signal = rng.uniform(-1, 1, (nSteps, length))
+    coefficients = grunwaldLetnikovCoefficients(order, nSteps + 1)
+
+    history = TimeHistory(nSteps + 1, length)
+    exact = numpy.zeros(length)
+    work = numpy.zeros(length)
+    start = time.perf_counter()
+    for row in signal:
+        history.rotate()
+        history[0] = row
+        exact.fill(0)
+        for m in range(1, len(history)):
+            numpy.multiply(history[m], coefficients[m], out=work)
+            exact += work
+    elapsed = time.perf_counter() - start
+    print(f"Exact: {elapsed / nSteps * 1e6:10.1f} µs/step, depth {nSteps + 1}")
+
+    for K in nExponentials:
+        glSum = GrunwaldLetnikovSum(length, nSteps + 1, K)
+        fit = glSum.fit(coefficients)
+        history = TimeHistory(glSum.depth(), length)
+        fast = numpy.zeros(length)
+        start = time.perf_counter()
+        for row in signal:
+            history.rotate()
+            history[0] = row
+            glSum.push(history)
+            glSum.sum(history, fit, fast)
+        elapsed = time.perf_counter() - start
+
+        relative = numpy.max(numpy.abs(fast - exact)) / numpy.max(numpy.abs(exact))
+        print(f"K={K:2}: {elapsed / nSteps * 1e6:10.1f} µs/step, "
+              f"fit error {fit.error:.1e}, output error {relative:.1e}")
+
+
+if __name__ == "__main__":
+    benchmark()
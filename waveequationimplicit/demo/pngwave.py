@@ -1,12 +1,16 @@
 import numpy
 import imageio
 
+from timehistory import TimeHistory
+from tridiagonal import boundaryTridiagonal
+
 
 class Wave1D():
     def __init__(self, length, c, dx, dt, attenuation):
         # u(x, t) -> self.wave[t][x]
         self.length = length
-        self.wave = numpy.zeros((3, self.length))
+        self.wave = TimeHistory(3, self.length)
+        self.rhs = numpy.zeros(self.length)
 
         self.c = c
         self.dx = dx
@@ -31,31 +35,36 @@ class Wave1D():
         self.R = 1.0
 
     def initMatrix(self):
-        mat = numpy.zeros((self.length, self.length))
-
-        mat[0][0] = self.beta
-        mat[0][1] = self.alpha * (1 + self.L)
-
-        last = self.length - 1
-        for i in range(1, last):
-            mat[i][i - 1] = self.alpha
-            mat[i][i] = self.beta
-            mat[i][i + 1] = self.alpha
-
-        mat[last][last - 1] = self.alpha * (1 + self.R)
-        mat[last][last] = self.beta
-
-        self.a = mat
+        self.solver = boundaryTridiagonal(
+            self.length, self.alpha, self.beta, self.L, self.R)
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.wave[1] - 0.5 * self.wave[2],
+
+        # rhs = wave[1] - 0.5 * wave[2]
+        numpy.multiply(self.wave[2], -0.5, out=self.rhs)
+        self.rhs += self.wave[1]
+        numpy.multiply(
+            self.solver.solve(self.rhs, overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
+    def advance(self, nSteps, out=None):
+        """
+        Runs `nSteps` steps without drawing. The state after each step is written to
+        `out[i]`. `out` can be a preallocated array or a `numpy.memmap` of shape
+        `(nSteps, length)`. Returns `out`.
+        """
+        if out is None:
+            out = numpy.empty((nSteps, self.length))
+        for index in range(nSteps):
+            self.step()
+            out[index] = self.wave[0]
+        return out
+
     def reset(self):
         self.wave.fill(0)
 
@@ -68,10 +77,7 @@ if __name__ == "__main__":
     length = 512
     wave1d = Wave1D(length, 64, 0.1, 0.01, 1)
 
-    result = []
     wave1d.pick(0.5, 1)
-    for t in range(0, length):
-        wave1d.step()
-        result.append(wave1d.value())
+    result = wave1d.advance(length)
 
-    imageio.imwrite("wave1d.png", numpy.array(result))
+    imageio.imwrite("wave1d.png", result)
@@ -0,0 +1,97 @@
+"""
+Ring buffer of the time history of a 1D field.
+
+The simulators used to start a step with `self.wave = numpy.roll(self.wave, 1, axis=0)`,
+which copies all rows of the history. `TimeHistory.rotate()` only moves the index, so
+the cost of a step doesn't grow with the depth of history.
+
+`history[m]` is the field `m` steps before, the same as `wave[m]` after the roll. The
+rows and the neighbour views are allocated once in the constructor.
+
+The simulators in `heat_wave_equation/demo`, `waveequation_fractional_zener/demo` and
+`burgers_godunov/demo/python3` also use this module.
+"""
+
+import numpy
+
+
+class TimeHistory():
+    def __init__(self, depth, length):
+        """
+        :param depth: Number of time steps to keep.
+        :param length: Length of the field.
+        """
+        self.shape = (depth, length)
+        self.head = 0
+
+        # 1 zero is padded at both ends for the neighbour views. The padding is never
+        # written, so the neighbour outside of the field is always 0.
+        self.padded = numpy.zeros((depth, length + 2))
+        self.rows = [row[1:-1] for row in self.padded]
+        self.backwards = [row[:-2] for row in self.padded]
+        self.forwards = [row[2:] for row in self.padded]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, m):
+        return self.rows[(self.head + m) % self.shape[0]]
+
+    def __setitem__(self, m, value):
+        self.rows[(self.head + m) % self.shape[0]][:] = value
+
+    def rotate(self):
+        """
+        Same as `numpy.roll(wave, 1, axis=0)`. The oldest row becomes `history[0]`, and
+        it holds the old values until overwritten.
+        """
+        self.head = (self.head - 1) % self.shape[0]
+
+    def backward(self, m):
+        """
+        `u[x - 1]` of `u = history[m]`. Same as `numpy.roll(u, 1)` with 0 at index 0.
+        """
+        return self.backwards[(self.head + m) % self.shape[0]]
+
+    def forward(self, m):
+        """
+        `u[x + 1]` of `u = history[m]`. Same as `numpy.roll(u, -1)` with 0 at the last
+        index.
+        """
+        return self.forwards[(self.head + m) % self.shape[0]]
+
+    def fill(self, value):
+        for row in self.rows:
+            row.fill(value)
+
+
+def testTimeHistory(nTest=16):
+    rng = numpy.random.default_rng(0)
+    for _ in range(nTest):
+        depth = int(rng.integers(1, 16))
+        length = int(rng.integers(2, 64))
+
+        target = numpy.zeros((depth, length))
+        history = TimeHistory(depth, length)
+        for _ in range(3 * depth):
+            target = numpy.roll(target, 1, axis=0)
+            history.rotate()
+
+            new = rng.uniform(-1, 1, length)
+            target[0] = new
+            history[0] = new
+
+            for m in range(depth):
+                backward = numpy.roll(target[m], 1)
+                backward[0] = 0
+                forward = numpy.roll(target[m], -1)
+                forward[-1] = 0
+                if not (numpy.array_equal(history[m], target[m])
+                        and numpy.array_equal(history.backward(m), backward)
+                        and numpy.array_equal(history.forward(m), forward)):
+                    print(f"Test failed: depth={depth}, length={length}")
+                    return
+
+
+if __name__ == "__main__":
+    testTimeHistory()
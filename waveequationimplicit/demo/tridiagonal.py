@@ -0,0 +1,77 @@
+"""
+Tridiagonal solver for the implicit finite difference methods in `wave.py`.
+
+The matrix of the implicit method only changes when the parameters are changed. It is
+factorized once by LAPACK `gttrf` (LU decomposition with partial pivoting), and each
+step only calls `gttrs` with the cached factors. Cost of a step is O(n) instead of the
+O(n^3) of `numpy.linalg.solve` on a dense matrix.
+
+The simulators in `heat_wave_equation/demo` and `waveequation_fractional_zener/demo`
+also use this module.
+"""
+
+import numpy
+from scipy.linalg import lapack
+
+
+class TridiagonalSolver():
+    def __init__(self, lower, diagonal, upper):
+        """
+        :param lower: Sub-diagonal. Length is `n - 1`.
+        :param diagonal: Main diagonal. Length is `n`.
+        :param upper: Super-diagonal. Length is `n - 1`.
+        """
+        self.lower = numpy.array(lower, dtype=numpy.float64)
+        self.diagonal = numpy.array(diagonal, dtype=numpy.float64)
+        self.upper = numpy.array(upper, dtype=numpy.float64)
+
+        *self.factor, info = lapack.dgttrf(self.lower, self.diagonal, self.upper)
+        if info > 0:
+            raise numpy.linalg.LinAlgError("Singular matrix")
+
+    def solve(self, rhs, overwrite=False):
+        """
+        When `overwrite` is `True`, `rhs` is used as a work area to avoid allocation.
+        The solution is written to `rhs` if it's a contiguous float64 array.
+        """
+        x, info = lapack.dgttrs(*self.factor, rhs, overwrite_b=overwrite)
+        if info != 0:
+            raise ValueError(f"dgttrs failed with info={info}")
+        return x
+
+    def toDense(self):
+        return (numpy.diag(self.lower, -1) + numpy.diag(self.diagonal) +
+                numpy.diag(self.upper, 1))
+
+
+def boundaryTridiagonal(length, offDiagonal, diagonal, L, R):
+    """
+    Matrix of `initMatrix` in `wave.py`. Interior rows are
+    `[offDiagonal, diagonal, offDiagonal]`. `L` and `R` are boundary conditions, 0 for
+    fixed end and 1 for free end.
+    """
+    lower = numpy.full(length - 1, offDiagonal, dtype=numpy.float64)
+    upper = numpy.full(length - 1, offDiagonal, dtype=numpy.float64)
+    upper[0] *= 1 + L
+    lower[-1] *= 1 + R
+    return TridiagonalSolver(lower, numpy.full(length, diagonal), upper)
+
+
+def testTridiagonalSolver(nTest=64):
+    rng = numpy.random.default_rng(0)
+    for _ in range(nTest):
+        length = int(rng.integers(2, 256))
+        offDiagonal = rng.uniform(-1, 1)
+        # Diagonally dominant, as the matrices of the implicit methods in `wave.py`.
+        diagonal = rng.choice([-1, 1]) * (2 * abs(offDiagonal) + rng.uniform(0.1, 4))
+        L, R = rng.integers(0, 2, 2)
+        solver = boundaryTridiagonal(length, offDiagonal, diagonal, L, R)
+
+        rhs = rng.uniform(-1, 1, length)
+        target = numpy.linalg.solve(solver.toDense(), rhs)
+        if not numpy.allclose(solver.solve(rhs), target, rtol=1e-9, atol=1e-9):
+            print(f"Test failed: length={length}")
+
+
+if __name__ == "__main__":
+    testTridiagonalSolver()
@@ -1,12 +1,16 @@
 import math
 import numpy
 
+from timehistory import TimeHistory
+from tridiagonal import boundaryTridiagonal
+
 
 class Wave1D():
     def __init__(self, length, c, dx, dt, attenuation):
         # u(x, t) -> self.wave[t][x]
         self.length = length
-        self.wave = numpy.zeros((3, self.length))
+        self.wave = TimeHistory(3, self.length)
+        self.rhs = numpy.zeros(self.length)
 
         self.c = c
         self.dx = dx
@@ -28,34 +32,39 @@ class Wave1D():
         self.R = 1.0
 
     def initMatrix(self):
-        mat = numpy.zeros((self.length, self.length))
-
-        mat[0][0] = self.beta
-        mat[0][1] = self.alpha * (1 + self.L)
-
-        last = self.length - 1
-        for i in range(1, last):
-            mat[i][i - 1] = self.alpha
-            mat[i][i] = self.beta
-            mat[i][i + 1] = self.alpha
-
-        mat[last][last - 1] = self.alpha * (1 + self.R)
-        mat[last][last] = self.beta
-
-        self.a = mat
+        self.solver = boundaryTridiagonal(
+            self.length, self.alpha, self.beta, self.L, self.R)
 
     def value(self):
         return self.wave[0]
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
+        self.wave.rotate()
         if self.pickY != 0:
             self.wave[1][self.pickX] = self.pickY
-        self.wave[0] = self.attenuation * numpy.linalg.solve(
-            self.a,
-            self.wave[1] - 0.5 * self.wave[2],
+
+        # rhs = wave[1] - 0.5 * wave[2]
+        numpy.multiply(self.wave[2], -0.5, out=self.rhs)
+        self.rhs += self.wave[1]
+        numpy.multiply(
+            self.solver.solve(self.rhs, overwrite=True),
+            self.attenuation,
+            out=self.wave[0],
         )
 
+    def advance(self, nSteps, out=None):
+        """
+        Runs `nSteps` steps without drawing. The state after each step is written to
+        `out[i]`. `out` can be a preallocated array or a `numpy.memmap` of shape
+        `(nSteps, length)`. Returns `out`.
+        """
+        if out is None:
+            out = numpy.empty((nSteps, self.length))
+        for index in range(nSteps):
+            self.step()
+            out[index] = self.wave[0]
+        return out
+
     def reset(self):
         self.wave.fill(0)
 
@@ -77,7 +86,7 @@ class Wave1D():
 class Wave1DExplicit(Wave1D):
     def __init__(self, length, c, dx, dt, attenuation):
         self.length = length
-        self.wave = numpy.zeros((3, self.length))
+        self.wave = TimeHistory(3, self.length)
 
         self.c = c
         self.dt = dt
@@ -93,24 +102,25 @@ class Wave1DExplicit(Wave1D):
         self.beta = 2 * (1 - self.alpha)
 
     def step(self):
-        self.wave = numpy.roll(self.wave, 1, axis=0)
-        self.wave[0][0] = 0
-        last = len(self.wave[0]) - 1
+        self.wave.rotate()
+        wave0, wave1, wave2 = self.wave[0], self.wave[1], self.wave[2]
+        wave0[0] = 0
+        last = len(wave0) - 1
 
         if self.boundaryCondition == 1:
-            self.wave[0][last] = self.attenuation * (
-                self.alpha * (self.wave[1][last - 1] + self.wave[1][last - 1])
-                + self.beta * self.wave[1][last] - self.wave[2][last])
+            wave0[last] = self.attenuation * (
+                self.alpha * (wave1[last - 1] + wave1[last - 1])
+                + self.beta * wave1[last] - wave2[last])
         else:
-            self.wave[0][last] = 0
+            wave0[last] = 0
 
         for x in range(1, last):
-            self.wave[0][x] = self.attenuation * (
-                self.alpha * (self.wave[1][x + 1] + self.wave[1][x - 1]) +
-                self.beta * self.wave[1][x] - self.wave[2][x])
+            wave0[x] = self.attenuation * (
+                self.alpha * (wave1[x + 1] + wave1[x - 1]) +
+                self.beta * wave1[x] - wave2[x])
 
         if self.pickY != 0:
-            self.wave[0][self.pickX] = self.pickY
+            wave0[self.pickX] = self.pickY
 
 
 wave1d = Wave1D(512, 40, 0.1, 1 / 60, 1)